@@ -0,0 +1,121 @@
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+import atexit
+import logging
+import logging.config
+import queue
+import threading
+import time
+from constants import LOGGING_CONFIG, LOG_RATE_LIMIT_INTERVAL, LOG_RATE_LIMIT_BURST
+
+# Frequent data source events are counted instead of logged one by one. Summary is logged periodically
+event_counters: Counter[str] = Counter()
+
+
+def count_event(name: str):
+    event_counters[name] += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+        Passes at most burst records with the same message template per interval.
+        Number of suppressed records is added to the first record passed in the next interval
+        or reported by flush_expired when the message does not come again
+    """
+
+    def __init__(self, interval: float = LOG_RATE_LIMIT_INTERVAL, burst: int = LOG_RATE_LIMIT_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.windows: dict[tuple[str, int, Any], tuple[float, int, int]] = {} # Window start, passed, suppressed
+        self.lock = threading.Lock() # Records are filtered in threads which log them
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window_start, passed, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, passed = now, 0
+            if passed >= self.burst:
+                self.windows[key] = (window_start, passed, suppressed + 1)
+                return False
+            self.windows[key] = (window_start, passed + 1, 0)
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        return True
+
+    def flush_expired(self) -> tuple[int, Counter[str]]:
+        """
+            Removes windows which have ended. Messages formatted before logging create new window per value,
+            so windows are not kept until the same message comes again.
+            Returns the highest level and counts of messages suppressed in removed windows
+        """
+        now = time.monotonic()
+        level = logging.NOTSET
+        suppressed_counts: Counter[str] = Counter()
+        with self.lock:
+            for key, (window_start, _, suppressed) in list(self.windows.items()):
+                if now - window_start < self.interval:
+                    continue
+                del self.windows[key]
+                if suppressed:
+                    level = max(level, key[1])
+                    suppressed_counts[str(key[2])] += suppressed
+        return level, suppressed_counts
+
+
+rate_limit_filter = RateLimitFilter()
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+        Standard QueueHandler formats message in the calling thread.
+        Queue is read in the same process, so record is passed as is and formatted by listener thread
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging():
+    """
+        Handlers from LOGGING_CONFIG write in the logging thread until start_log_listener is called
+    """
+    logging.config.dictConfig(LOGGING_CONFIG)
+
+
+def start_log_listener() -> QueueListener:
+    """
+        Handlers are moved to listener thread, so writes to SD card never block event loop.
+        Fork copies locks of running thread, but not the thread, so process must not be forked after this call.
+        Forked process starts its own listener
+    """
+    global rate_limit_filter
+    logger = logging.getLogger('greybike')
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *logger.handlers, respect_handler_level=True)
+    queue_handler = LazyQueueHandler(log_queue)
+    rate_limit_filter = RateLimitFilter()
+    queue_handler.addFilter(rate_limit_filter)
+    logger.handlers = [queue_handler]
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def log_event_counters():
+    """
+        Logs events counted since previous call and messages suppressed by rate limit
+    """
+    logger = logging.getLogger('greybike')
+    level, suppressed_counts = rate_limit_filter.flush_expired()
+    if suppressed_counts:
+        summary = ', '.join(f'"{message}" {count}' for message, count in sorted(suppressed_counts.items()))
+        logger.log(level, 'Suppressed log messages: %s', summary)
+    if not event_counters:
+        return
+    summary = ', '.join(f'{name} {count}' for name, count in sorted(event_counters.items()))
+    event_counters.clear()
+    logger.info('Data source events: %s', summary)
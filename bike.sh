@@ -12,5 +12,5 @@ elif [ $1 = "restart" ]; then
 elif [ $1 = "stop" ]; then
     sudo systemctl stop greybike.service
 else
-    /home/greyone/greybike/.venv/bin/python /home/greyone/greybike/cli.py $1
+    /home/greyone/greybike/.venv/bin/python /home/greyone/greybike/cli.py "$@"
 fi
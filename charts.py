@@ -0,0 +1,97 @@
+from array import array
+from typing import Any
+import json
+import logging
+import math
+from constants import CHART_MAX_POINTS, CHART_MAX_DURATION
+from data_types import AppState, ChartRequest, DecimationMethod, MessageType
+from decimation import lttb, min_max_decimate
+from ingest import get_stream_buffer
+
+DERIVED_FIELDS = {MessageType.CA: ('power', 'regen'), MessageType.ELECTRIC: ('power',)}
+
+
+def parse_chart_channel(state: AppState, stream: str, field: str) -> tuple[MessageType, str]:
+    """
+        Only buffered streams and their numeric or derived fields can be charted
+    """
+    message_type = MessageType(stream)
+    buffer = get_stream_buffer(state, message_type)
+    if field not in buffer.columns and field not in DERIVED_FIELDS.get(message_type, ()):
+        raise ValueError(f'Unknown chart field {message_type}.{field}')
+    return message_type, field
+
+
+def parse_chart_request(state: AppState, data: dict[str, Any]) -> ChartRequest:
+    """
+        Chart request from dashboard client:
+        {"points": 200, "duration": 400, "method": "lttb", "channels": [["ca", "speed"], ["electric", "power"]]}
+    """
+    points = int(data['points'])
+    if points < 2:
+        raise ValueError(f'Chart needs at least 2 points, {points} requested')
+    return ChartRequest(
+        points=min(points, CHART_MAX_POINTS),
+        duration=min(float(data['duration']), CHART_MAX_DURATION),
+        method=DecimationMethod(data.get('method', DecimationMethod.LTTB)),
+        channels=tuple(parse_chart_channel(state, str(stream), str(field)) for stream, field in data['channels'])
+    )
+
+
+def get_channel_values(state: AppState, message_type: MessageType, field: str, index_range: slice) -> memoryview | array[float]:
+    """
+        Values of record field or power derived from voltage and current
+    """
+    buffer = get_stream_buffer(state, message_type)
+    if field in buffer.columns:
+        return buffer.column(field, index_range)
+    voltages = buffer.column('voltage', index_range)
+    currents = buffer.column('current', index_range)
+    if field == 'power' and message_type == MessageType.CA:
+        return array('d', (max(voltage * current, 0) for voltage, current in zip(voltages, currents)))
+    if field == 'power' and message_type == MessageType.ELECTRIC:
+        return array('d', (voltage * current for voltage, current in zip(voltages, currents)))
+    if field == 'regen' and message_type == MessageType.CA:
+        return array('d', (max(-voltage * current, 0) for voltage, current in zip(voltages, currents)))
+    raise ValueError(f'Unknown chart field {field}')
+
+
+def get_chart_data(state: AppState, request: ChartRequest) -> dict[str, Any]:
+    """
+        Full rate data from stream buffers decimated to requested number of points.
+        Every channel is a pair of timestamp and value lists
+    """
+    result: dict[str, dict[str, list[list[float | None]]]] = {}
+    for message_type, field in request.channels:
+        buffer = get_stream_buffer(state, message_type)
+        last_timestamp = buffer.latest('timestamp')
+        if last_timestamp is None:
+            continue
+        index_range = buffer.window(last_timestamp - request.duration)
+        timestamps = buffer.column('timestamp', index_range)
+        values = get_channel_values(state, message_type, field, index_range)
+        if request.method == DecimationMethod.MIN_MAX:
+            indexes = min_max_decimate(values, request.points)
+        else:
+            indexes = lttb(timestamps, values, request.points)
+        result.setdefault(message_type, {})[field] = [
+            [timestamps[index] for index in indexes],
+            [None if math.isnan(values[index]) else values[index] for index in indexes],
+        ]
+    return result
+
+
+async def chart_send_task(state: AppState):
+    logger = logging.getLogger('greybike')
+    # Clients with identical requests share one encoded message
+    messages: dict[ChartRequest, str] = {}
+    for ws, request in list(state.chart_requests.items()):
+        if request not in messages:
+            messages[request] = json.dumps({
+                'type': MessageType.CHART,
+                'data': get_chart_data(state, request)
+            })
+        try:
+            await ws.send_str(messages[request])
+        except ConnectionResetError as e:
+            logger.error('Error sending chart message: %s', e)
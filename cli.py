@@ -1,21 +1,32 @@
+import importlib
 import sys
-from commands.test_ads import test_ads_sensor
-from commands.test_gnss import test_gnss_sensor
-from commands.test_log_agregation import test_calculate_log_agregates
-from commands.test_software_serial import test_software_serial
-from commands.test_ca import test_ca_telemetry
-from commands.test_ina228 import test_ina228
 
+# Commands are imported only when called, hardware drivers are not loaded for unrelated commands
 COMMANDS = {
-    'test_ads': test_ads_sensor,
-    'test_gnss': test_gnss_sensor,
-    'test_ca': test_ca_telemetry,
-    'test_ina228': test_ina228,
-    'test_log_agregation': test_calculate_log_agregates,
-    'test_software_serial': test_software_serial
+    'test_ads': ('commands.test_ads', 'test_ads_sensor'),
+    'test_gnss': ('commands.test_gnss', 'test_gnss_sensor'),
+    'test_ca': ('commands.test_ca', 'test_ca_telemetry'),
+    'test_ina228': ('commands.test_ina228', 'test_ina228'),
+    'test_log_agregation': ('commands.test_log_agregation', 'test_calculate_log_agregates'),
+    'test_software_serial': ('commands.test_software_serial', 'test_software_serial'),
+    'stats': ('commands.stats', 'show_stats'),
+    'export': ('commands.export', 'export_log_file'),
+    'memprofile': ('commands.memprofile', 'show_memory_profile'),
+    'startup-profile': ('commands.startup_profile', 'show_startup_profile'),
+    'simulate': ('commands.simulate', 'run_simulation_command'),
+    'benchmark-serializers': ('commands.benchmark_serializers', 'benchmark_serializers'),
 }
 
-if len(sys.argv) == 2 and sys.argv[1] in COMMANDS:
-    COMMANDS[sys.argv[1]]()
-else:
-    print('Avaliable commands: ', ' '.join(COMMANDS.keys()))
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] in COMMANDS:
+        module_name, function_name = COMMANDS[sys.argv[1]]
+        command = getattr(importlib.import_module(module_name), function_name)
+        command(*sys.argv[2:])
+    else:
+        print('Avaliable commands: ', ' '.join(COMMANDS.keys()))
+
+
+# Worker processes of log queries import main module again
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+from datetime import datetime
+import asyncio
+import time
+
+
+class Clock:
+    """
+        Wall and monotonic time used by records, log rotation and stream timing
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+
+class VirtualClock(Clock):
+    """
+        Time of event loop with virtual time. Wall time starts at start timestamp and
+        moves only when loop skips to its next timer
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, start: float):
+        self.loop = loop
+        self.offset = start - loop.time()
+
+    def time(self) -> float:
+        return self.offset + self.loop.time()
+
+    def monotonic(self) -> float:
+        return self.loop.time()
+
+
+current_clock = Clock()
+
+
+def set_clock(clock: Clock):
+    global current_clock
+    current_clock = clock
+
+
+def get_time() -> float:
+    return current_clock.time()
+
+
+def get_monotonic() -> float:
+    return current_clock.monotonic()
+
+
+def get_now() -> datetime:
+    return datetime.fromtimestamp(current_clock.time())
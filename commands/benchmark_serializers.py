@@ -0,0 +1,71 @@
+from dataclasses import asdict, fields
+from typing import Any, Callable
+import argparse
+import json
+import marshal
+import timeit
+from data_types import CATelemetryRecord, GNSSRecord, SystemTelemetryRecord
+from data_sources.cycle_analyst import ca_record_from_random
+from data_sources.gnss import gnss_from_random
+from data_sources.ads import electric_record_from_random
+from serializers import get_serializer
+from telemetry_logs import encode_ca_log_line, get_log_fields
+
+
+def get_sample_records() -> list[Any]:
+    gnss = gnss_from_random(None) or GNSSRecord(latitude=44.8, longitude=20.4)
+    # Fixed record with every field set, sampler would keep its files and gc callback open
+    system = SystemTelemetryRecord(
+        cpu_temp=52.1, memory_usage=41.7, cpu_usage=23.4, rss=87.2, open_fds=42, loop_lag=3.1,
+        gc_collections=2, gc_pause=1.4, load_level=0
+    )
+    return [ca_record_from_random(None), gnss, electric_record_from_random(None), system]
+
+
+def encode_ca_log_line_with_asdict(record: CATelemetryRecord) -> bytes:
+    data = asdict(record)
+    data['timestamp'] = "%.2f" % record.timestamp
+    return (','.join(str(data[field]) for field in get_log_fields()) + '\n').encode()
+
+
+def get_encoders(record: Any) -> list[tuple[str, Callable[[Any], Any], Callable[[Any], Any]]]:
+    """
+        Format name, previous encoder and precompiled encoder
+    """
+    serializer = get_serializer(type(record))
+    names = [field.name for field in fields(record)]
+    if isinstance(record, CATelemetryRecord):
+        csv_encoder = ('csv', encode_ca_log_line_with_asdict, encode_ca_log_line)
+    else:
+        csv_encoder = (
+            'csv',
+            lambda record: (','.join(str(getattr(record, name)) for name in names) + '\n').encode(),
+            serializer.get_csv_encoder(names),
+        )
+    return [
+        ('dict', asdict, serializer.to_dict),
+        ('json', lambda record: json.dumps(asdict(record)).encode(), serializer.to_json),
+        csv_encoder,
+        ('binary', lambda record: marshal.dumps(tuple(getattr(record, name) for name in names)), serializer.pack),
+    ]
+
+
+def get_encode_time(encoder: Callable[[Any], Any], record: Any, number: int) -> float:
+    return min(timeit.repeat(lambda: encoder(record), number=number, repeat=5)) / number
+
+
+def benchmark_serializers(*args: str):
+    parser = argparse.ArgumentParser(
+        prog='bike benchmark-serializers', description='Encode time of record serializers compared to dataclasses.asdict'
+    )
+    parser.add_argument('--number', type=int, default=20000, help='Encodes per measurement')
+    options = parser.parse_args(args)
+    print(f'{"record":>22} {"format":>7} {"previous us":>12} {"compiled us":>12} {"speedup":>8}')
+    for record in get_sample_records():
+        for name, previous, compiled in get_encoders(record):
+            previous_time = get_encode_time(previous, record, options.number)
+            compiled_time = get_encode_time(compiled, record, options.number)
+            print(
+                f'{type(record).__name__:>22} {name:>7} {previous_time * 1e6:12.2f} {compiled_time * 1e6:12.2f}'
+                f' {previous_time / compiled_time:7.1f}x'
+            )
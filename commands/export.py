@@ -0,0 +1,26 @@
+import argparse
+import math
+import sys
+from log_export import EXPORT_CONTENT_TYPES, export_log
+from storage import open_storage
+
+
+def export_log_file(*args: str):
+    parser = argparse.ArgumentParser(prog='bike export', description='Export telemetry log file')
+    parser.add_argument('name', help='Log file name, for example 2025-06-01T10:00:00.000000.log')
+    parser.add_argument('--format', choices=list(EXPORT_CONTENT_TYPES), default='csv')
+    parser.add_argument('--from', dest='start', type=float, default=0, help='Unix timestamp')
+    parser.add_argument('--to', dest='end', type=float, default=math.inf, help='Unix timestamp')
+    parser.add_argument('--output', help='Output file. Export is written to stdout without it')
+    options = parser.parse_args(args)
+    storage = open_storage()
+    if options.name not in storage.list_logs():
+        parser.error(f'Log {options.name} not found')
+    chunks = export_log(storage, options.name, options.format, options.start, options.end)
+    if options.output is None:
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        return
+    with open(options.output, 'wb') as output_file:
+        for chunk in chunks:
+            output_file.write(chunk)
@@ -0,0 +1,59 @@
+from typing import Any
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from constants import SERVER_PORT
+
+BYTES_IN_KB = 1024
+
+
+def format_size(size: int) -> str:
+    return f'{size / BYTES_IN_KB:10.1f} KB'
+
+
+def print_report(report: dict[str, Any]):
+    print(f'TRACED {format_size(report["traced"])}, peak {format_size(report["peak"])}')
+    print('By module, size, growth since previous and since first report')
+    for group in report['groups']:
+        print(f'{format_size(group["size"])} {format_size(group["growth"])} {format_size(group["total_growth"])}  {group["name"]}')
+    print('Top allocations')
+    for allocation in report['top']:
+        print(f'{format_size(allocation["size"])} {allocation["count"]:8}  {allocation["location"]}')
+    if report['top_growth']:
+        print('Top growth since previous report')
+        for allocation in report['top_growth']:
+            print(f'{format_size(allocation["size_diff"])} {allocation["count_diff"]:8}  {allocation["location"]}')
+    print()
+
+
+def show_memory_profile(*args: str):
+    parser = argparse.ArgumentParser(
+        prog='bike memprofile',
+        description='Memory usage of running service by module. Service must run with MEMORY_PROFILING=true'
+    )
+    parser.add_argument('--url', default=f'http://localhost:{SERVER_PORT}/debug/memory')
+    parser.add_argument('--interval', type=float, default=60, help='Seconds between reports')
+    parser.add_argument('--count', type=int, default=1, help='Number of reports')
+    parser.add_argument('--json', action='store_true', help='Output JSON instead of table')
+    options = parser.parse_args(args)
+    for i in range(options.count):
+        if i > 0:
+            time.sleep(options.interval)
+        try:
+            with urllib.request.urlopen(options.url) as response:
+                report = json.load(response)
+        except urllib.error.HTTPError as e:
+            print(f'Memory profiling is not available: {e.code} {e.reason}. Start service with MEMORY_PROFILING=true')
+            return
+        except urllib.error.URLError as e:
+            print(f'Could not connect to service: {e.reason}')
+            return
+        if options.json:
+            print(json.dumps(report, indent=2))
+            continue
+        print_report(report)
+        if report.get('acquisition') is not None:
+            print('Acquisition process')
+            print_report(report['acquisition'])
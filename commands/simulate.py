@@ -0,0 +1,53 @@
+from dataclasses import asdict, fields
+import argparse
+import json
+import os
+import tempfile
+
+DRIFT_FIELDS = [
+    'total_records', 'total_distance', 'total_motor_watt_hours', 'total_regen_watt_hours', 'total_human_watt_hours',
+    'max_speed', 'max_motor_watts',
+]
+
+
+def run_simulation_command(*args: str):
+    parser = argparse.ArgumentParser(
+        prog='bike simulate',
+        description='Runs service tasks in virtual time with random sensors or replayed log, much faster than real time'
+    )
+    parser.add_argument('--duration', type=float, default=3600, help='Simulated seconds')
+    parser.add_argument('--sample-interval', type=float, default=300, help='Simulated seconds between samples')
+    parser.add_argument('--replay', help='Path of log file to replay instead of random sensors')
+    parser.add_argument('--log-dir', help='Directory for simulated logs. New temporary directory by default')
+    parser.add_argument('--json', action='store_true', help='Output JSON instead of table')
+    options = parser.parse_args(args)
+    replay_log_file = None
+    if options.replay is not None:
+        replay_log_file = os.path.abspath(options.replay)
+        if not os.path.exists(replay_log_file):
+            parser.error(f'Log file {options.replay} not found')
+    log_dir = options.log_dir or tempfile.mkdtemp(prefix='greybike-simulation-')
+    os.makedirs(log_dir, exist_ok=True)
+    # Constants are read on import, so app modules are imported after environment is set.
+    # Development mode provides random sensors and keeps real logs untouched
+    os.environ['TELEMETRY_LOG_DIRECTORY'] = log_dir
+    os.environ['DEV_MODE'] = 'true'
+    from simulation import SimulationSample, run_simulation
+
+    report = run_simulation(options.duration, options.sample_interval, replay_log_file)
+    if options.json:
+        print(json.dumps(asdict(report), indent=2))
+        return
+    print(f'Simulated {report.duration:.0f} s in {report.real_duration:.1f} s, '
+          f'{report.duration / report.real_duration:.0f}x real time')
+    print(f'{len(report.log_files)} log files in {log_dir}')
+    columns = [field.name for field in fields(SimulationSample)]
+    print('  '.join(column.rjust(16) for column in columns))
+    for sample in report.samples:
+        print('  '.join(f'{getattr(sample, column):16.1f}' for column in columns))
+    print()
+    print(f'{"aggregate":>24}  {"trip":>12}  {"logged":>12}  {"drift":>12}')
+    for name in DRIFT_FIELDS:
+        trip = getattr(report.trip, name)
+        logged = getattr(report.logged, name)
+        print(f'{name:>24}  {trip:12.2f}  {logged:12.2f}  {trip - logged:12.2f}')
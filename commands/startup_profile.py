@@ -0,0 +1,79 @@
+from datetime import datetime
+import argparse
+import subprocess
+import sys
+from constants import SOURCE_DIR
+from startup_profile import load_startup_profile
+
+IMPORT_TIME_PREFIX = 'import time:'
+
+
+def get_import_times(module: str) -> list[tuple[str, int, int]]:
+    """
+        Runs python -X importtime in fresh interpreter.
+        Returns module name, self and cumulative import time in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SOURCE_DIR, capture_output=True, text=True
+    )
+    import_times: list[tuple[str, int, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        self_time, cumulative_time, name = line.removeprefix(IMPORT_TIME_PREFIX).split('|')
+        if not self_time.strip().isdigit():
+            continue # Header line
+        import_times.append((name.strip(), int(self_time), int(cumulative_time)))
+    return import_times
+
+
+def get_package_times(import_times: list[tuple[str, int, int]]) -> list[tuple[str, int, int]]:
+    """
+        Self import time summed per top level package with number of imported modules
+    """
+    packages: dict[str, tuple[int, int]] = {}
+    for name, self_time, _ in import_times:
+        package = name.split('.')[0]
+        total, count = packages.get(package, (0, 0))
+        packages[package] = (total + self_time, count + 1)
+    return sorted(
+        ((package, total, count) for package, (total, count) in packages.items()),
+        key=lambda item: item[1], reverse=True
+    )
+
+
+def print_service_profile():
+    profile = load_startup_profile()
+    if profile is None:
+        print('No service startup recorded yet. It is saved when the first websocket frame is sent\n')
+        return
+    print(f'SERVICE STARTUP {datetime.fromtimestamp(profile.process_start).isoformat(timespec="seconds")}')
+    for name, duration in profile.phases.items():
+        print(f'{duration * 1000:10.1f} ms  {name}')
+    if profile.first_frame is not None:
+        print(f'{profile.first_frame * 1000:10.1f} ms  first websocket frame after process start')
+    print()
+
+
+def show_startup_profile(*args: str):
+    parser = argparse.ArgumentParser(
+        prog='bike startup-profile',
+        description='Import time per module and init time per phase of the last service start'
+    )
+    parser.add_argument('--top', type=int, default=20, help='Number of packages and modules to show')
+    parser.add_argument('--module', default='main', help='Module to profile imports of')
+    options = parser.parse_args(args)
+    print_service_profile()
+    import_times = get_import_times(options.module)
+    if not import_times:
+        print(f'Could not import {options.module}')
+        return
+    total_time = sum(self_time for _, self_time, _ in import_times)
+    print(f'IMPORT {options.module} {total_time / 1000:.1f} ms, {len(import_times)} modules')
+    print('By package, self time')
+    for package, package_time, count in get_package_times(import_times)[:options.top]:
+        print(f'{package_time / 1000:10.1f} ms  {package} ({count})')
+    print('By module, cumulative time')
+    for name, _, cumulative_time in sorted(import_times, key=lambda item: item[2], reverse=True)[:options.top]:
+        print(f'{cumulative_time / 1000:10.1f} ms  {name}')
@@ -0,0 +1,41 @@
+from dataclasses import asdict, fields
+import argparse
+import json
+from log_stats import PeriodStats, calculate_stats
+from storage import open_storage
+
+PERIOD_TYPES = ['ride', 'day', 'week', 'month']
+
+
+def format_value(value: str | float | None) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return value
+
+
+def print_table(title: str, rows: list[PeriodStats]):
+    columns = [field.name for field in fields(PeriodStats)]
+    table = [columns] + [[format_value(getattr(row, column)) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    print(title.upper())
+    for line in table:
+        print('  '.join(value.rjust(widths[i]) for i, value in enumerate(line)))
+    print()
+
+
+def show_stats(*args: str):
+    parser = argparse.ArgumentParser(prog='bike stats', description='Summary of all telemetry logs')
+    parser.add_argument('--json', action='store_true', help='Output JSON instead of table')
+    parser.add_argument('--period', choices=PERIOD_TYPES, action='append', help='Period types to show')
+    options = parser.parse_args(args)
+    period_types = options.period or PERIOD_TYPES
+    stats = calculate_stats(open_storage())
+    if options.json:
+        print(json.dumps({
+            period_type: [asdict(row) for row in stats[period_type]] for period_type in period_types
+        }, indent=2))
+        return
+    for period_type in period_types:
+        print_table(period_type, stats[period_type])
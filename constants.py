@@ -5,6 +5,11 @@ from logging import LogRecord
 
 DEV_MODE = os.environ.get('DEV_MODE', 'false').lower() == 'true'
 SERVER_PORT = int(os.environ.get('PORT', 8080))
+# Allocations are traced and /debug/memory endpoint is enabled. Tracing slows the app down
+MEMORY_PROFILING = os.environ.get('MEMORY_PROFILING', 'false').lower() == 'true'
+# Sensors are read and logged in separate acquisition process, web process only serves clients
+MULTIPROCESS_MODE = os.environ.get('MULTIPROCESS_MODE', 'false').lower() == 'true'
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'text') # text or sqlite
 
 SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(SOURCE_DIR, 'public')
@@ -12,17 +17,43 @@ SPA_DIST_DIR = os.path.join(SOURCE_DIR, 'spa/dist')
 MANIFEST_FILE = os.path.join(SPA_DIST_DIR, 'manifest.json')
 SPA_HTML_FILE = os.path.join(SPA_DIST_DIR, 'index.html')
 SPA_ASSETS_DIR = os.path.join(SPA_DIST_DIR, 'assets')
-TELEMETRY_LOG_DIRECTORY = os.path.join(SOURCE_DIR, 'telemetry_logs')
+TELEMETRY_LOG_DIRECTORY = os.environ.get('TELEMETRY_LOG_DIRECTORY', os.path.join(SOURCE_DIR, 'telemetry_logs'))
 APP_LOG_DIRECTORY = os.path.join(SOURCE_DIR, 'app_logs')
 FAVICON_DIRECTORY = os.path.join(SPA_DIST_DIR, 'icons')
 APP_LOG_FILE = os.path.join(APP_LOG_DIRECTORY, 'app.log')
+STARTUP_PROFILE_FILE = os.path.join(APP_LOG_DIRECTORY, 'startup_profile.json')
+ACQUISITION_MEMORY_REPORT_FILE = os.path.join(APP_LOG_DIRECTORY, 'acquisition_memory.json')
+TRIP_CHECKPOINT_FILE = os.path.join(TELEMETRY_LOG_DIRECTORY, 'trip.json')
+STATS_CACHE_FILE = os.path.join(TELEMETRY_LOG_DIRECTORY, 'stats_cache.json')
+GEO_INDEX_FILE = os.path.join(TELEMETRY_LOG_DIRECTORY, 'gnss_index.json')
+SQLITE_DATABASE_FILE = os.path.join(TELEMETRY_LOG_DIRECTORY, 'telemetry.sqlite3')
 
-LOG_VERSION = '1'
-LOG_RECORD_COUNT_LIMIT = 36000 # One hour at 10 record/s rate
-CA_TELEMETRY_BUFFER_SIZE = 10
-SYSTEM_TELEMETRY_BUFFER_SIZE = 10
-ELECTRIC_RECORD_BUFFER_SIZE = 10
-GNSS_BUFFER_SIZE = 10
+LOG_VERSION = '2'
+LOG_RECORD_COUNT_LIMIT = int(os.environ.get('LOG_RECORD_COUNT_LIMIT', 36000)) # One hour at 10 record/s rate
+LOG_QUERY_WORKERS = os.cpu_count()
+LOG_BLOCK_RECORDS = 50 # Five seconds at 10 record/s rate. Maximum data loss on power cut
+LOG_BLOCK_INTERVAL = 5 # Partially filled block is written after this time. In seconds
+LOG_FLUSH_INTERVAL = 1
+SQLITE_RETRY_BATCH_LIMIT = 1000 # Batches kept while database writes fail. About 20 minutes of records
+ROLLUP_LEVELS = (1, 10, 60, 600) # Bucket sizes of min, max and mean rollups written with each log. In seconds
+GEO_GRID_SIZE = 0.01 # Spatial index cell size in degrees. About 1.1 km of latitude
+GEO_INDEX_GAP = 60 # Longer pause inside one cell starts new visit. In seconds
+GEO_INDEX_SAVE_INTERVAL = 60
+FUSION_TOLERANCE = 1 # Maximum age of GNSS or electrical record joined to telemetry record. In seconds
+SEGMENT_DISTANCE = 1 # Length of ride segments for energy analysis. In km
+ROUTE_TOLERANCE = 5 # Maximum deviation of simplified route from GNSS track. In meters
+ROUTE_MAX_WINDOW = 600 # Limits simplification work per GNSS fix
+RIDE_GAP = 1800 # Log files with shorter pause between them are counted as one ride, longer pause starts new trip. In seconds
+EXPORT_CHUNK_SIZE = 64 * 1024 # Export is streamed in chunks of about this size, in bytes
+EXPORT_ROW_GROUP_SIZE = 4096 # Records per row group in columnar export
+# In memory buffers keep one hour of records at read rate
+CA_TELEMETRY_BUFFER_SIZE = 14400
+SYSTEM_TELEMETRY_BUFFER_SIZE = 7200
+ELECTRIC_RECORD_BUFFER_SIZE = 36000
+GNSS_BUFFER_SIZE = 7200
+HISTORY_DURATION = 400 # Same as LOGS_DURATION * CHART_INTERVAL in spa
+HISTORY_INTERVAL = 2 # Same as CHART_INTERVAL in spa
+HISTORY_BUFFER_SIZE = HISTORY_DURATION // HISTORY_INTERVAL
 
 # All intervals are in seconds
 CA_TELEMETRY_READ_INTERVAL = 0.25
@@ -37,8 +68,53 @@ GNSS_SERIAL_INTERFACE = os.environ.get('GNSS_SERIAL', '/dev/ttyS0')
 GNSS_READ_INTERVAL = 0.5
 GNSS_SEND_INTERVAL = 1
 GNSS_BAUD_RATE = 115200
+GNSS_SOURCE = os.environ.get('GNSS_SOURCE', 'serial') # serial or gpsd
+GPSD_HOST = os.environ.get('GPSD_HOST', 'router.grey')
+GPSD_PORT = int(os.environ.get('GPSD_PORT', 2947))
+GPSD_TIMEOUT = 5 # Connection is restarted if gpsd sends nothing for this time
+GPSD_MIN_BACKOFF = 1
+GPSD_MAX_BACKOFF = 60
 SYSTEM_PARAMS_READ_INTERVAL = 0.5
 SYSTEM_PARAMS_SEND_INTERVAL = 0.5
+LOOP_LAG_INTERVAL = 0.1
+TELEMETRY_BUS_READ_INTERVAL = 0.05
+TELEMETRY_BUS_SLOTS = 512 # About 30 seconds of records at all read rates
+TELEMETRY_BUS_SLOT_SIZE = 256 # In bytes, packed CA record takes 153
+ACQUISITION_STOP_TIMEOUT = 5
+MEMORY_TRACE_FRAMES = 10 # Stack depth of traced allocations, needed to find greybike caller of library code
+MEMORY_TOP_ALLOCATIONS = 15
+MEMORY_REPORT_TIMEOUT = 10 # Web process waits this long for report of acquisition process. In seconds
+MEMORY_REPORT_POLL_INTERVAL = 0.2
+# Load governor. Thresholds are for reduced and shedding levels
+LOAD_LAG_THRESHOLDS = (50, 150) # Event loop lag in ms
+LOAD_LAG_EXIT_THRESHOLDS = (20, 80)
+LOAD_TEMP_THRESHOLDS = (72, 78) # CPU temperature in Celsius. Pi starts throttling at 80
+LOAD_TEMP_EXIT_THRESHOLDS = (67, 74)
+LOAD_RECOVERY_TIME = 30 # Values must stay below exit thresholds this long before load level goes down
+LOAD_REDUCED_INTERVAL_FACTOR = 4
+ROLLING_STATS_SEND_INTERVAL = 1
+TRIP_SEND_INTERVAL = 1
+TRIP_CHECKPOINT_INTERVAL = 5
+CHART_SEND_INTERVAL = 2
+ROUTE_SEND_INTERVAL = 2
+CHART_MAX_POINTS = 1000
+CHART_MAX_DURATION = 3600
+SUBSCRIPTION_MAX_RATE = 50 # Messages per second
+SUBSCRIPTION_RATE_TOLERANCE = 0.05 # In seconds
+DELTA_KEYFRAME_INTERVAL = 5 # Full record is sent this often in delta streams, in seconds
+# Changes smaller than epsilon are not sent in delta streams. Other fields are sent on any change
+DELTA_EPSILONS = {
+    'ca': {
+        'voltage': 0.05, 'current': 0.05, 'speed': 0.05, 'amper_hours': 0.001, 'trip_distance': 0.001,
+        'motor_temp': 0.5, 'pedal_rpm': 1, 'human_watts': 2, 'human_torque': 0.5,
+        'throttle_input': 0.01, 'throttle_output': 0.01, 'aux_a': 0.01, 'aux_d': 0.01,
+    },
+    'electric': {'voltage': 0.05, 'current': 0.05, 'temp': 0.5},
+    'gnss': {'altitude': 0.5, 'speed': 0.1, 'hdop': 0.1},
+    'system': {'cpu_temp': 0.5, 'cpu_usage': 1, 'memory_usage': 0.5, 'rss': 0.1, 'loop_lag': 1, 'gc_pause': 0.1},
+}
+ROLLING_STATS_WINDOWS = (1, 10, 60)
+MAX_SAMPLE_DURATION = 1 # Longer gaps between samples are not counted in energy integrals
 PING_INTERVAL = 5
 
 SERIAL_TIMEOUT = 0.05 # In seconds
@@ -47,6 +123,9 @@ PING_TIMEOUT = 1 # In seconds
 ROUTER_HOSTNAME = os.environ.get('ROUTER_HOSTNAME', 'router.grey')
 
 LOGGING_TEMPLATE = '%(asctime)s %(message)s'
+LOG_RATE_LIMIT_INTERVAL = 60 # Same message is logged at most LOG_RATE_LIMIT_BURST times per interval
+LOG_RATE_LIMIT_BURST = 5
+LOG_COUNTERS_INTERVAL = 60 # Data source event counters are logged this often
 
 class ColoredFormatter(logging.Formatter):
 
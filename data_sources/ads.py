@@ -1,15 +1,14 @@
-try:
-    import board # type: ignore Library does not have proper typing
-except:
-    board = None
-import busio # type: ignore Library does not have proper typing
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+from typing import TYPE_CHECKING
 from data_types import ElectricalRecord
 from utils import get_random_value
+from app_logging import count_event
 import logging
 import math
 
+if TYPE_CHECKING:
+    import busio # type: ignore Library does not have proper typing
+    import adafruit_ads1x15.ads1115 as ADS
+
 
 AMP_CONVERSION_CF = 0.185 # ACS712 5A coefficient (185mv/A)
 
@@ -29,30 +28,27 @@ def calculate_temp_from_voltage(thermistor_voltage: float, reference_voltage: fl
     temp = 1 / (math.log(thermistor_resistance/THERMISTOR_R) / THERMISTOR_CF + 1 / (NOMINAL_TEMP + TEMP_CF)) - TEMP_CF
     return temp
 
-def sf(value: float) -> str:
-    return "{:.4f}".format(value)
-
-def debug_voltages(cur: float, vol: float, therm: float):
-    print("Cur:", sf(cur), "V:", sf(vol), "Therm:", sf(therm))
-
-
-def electric_record_from_ads(ads: ADS.ADS1115) -> ElectricalRecord:
+def electric_record_from_ads(ads: 'ADS.ADS1115') -> ElectricalRecord:
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
     logger = logging.getLogger('greybike')
     current_channel = AnalogIn(ads, ADS.P0) # ACS712 20A sensor connected to A0. Measures current flowing to the bike's electronics
     thermistor_channel = AnalogIn(ads, ADS.P1) # 10K Thermistor with 10K resistor
     voltage_channel = AnalogIn(ads, ADS.P2, ADS.P3)
     #voltage_channel = AnalogIn(ads, ADS.P1) # Voltage divider connected to A1. Measures battery voltage
     #reference_voltage_channel = AnalogIn(ads, ADS.P2) # Voltage divider connected to A2. Should have halved main voltage
+    # Every voltage property access is I2C conversion, so each channel is read once
+    current_voltage = current_channel.voltage
+    thermistor_voltage = thermistor_channel.voltage
+    divider_voltage = voltage_channel.voltage
     try:
-        temp = calculate_temp_from_voltage(thermistor_channel.voltage, BASE_VOLTAGE)
+        temp = calculate_temp_from_voltage(thermistor_voltage, BASE_VOLTAGE)
     except ValueError:
-        logger.error('Error calculating temp')
+        count_event('ads_temp_error')
         temp = None
-
-    debug_voltages(current_channel.voltage, voltage_channel.voltage, thermistor_channel.voltage)
-
-    amps = (BASE_VOLTAGE - current_channel.voltage) / AMP_CONVERSION_CF
-    battery_voltage = voltage_channel.voltage * VOLTAGE_DIVIDER_CF
+    logger.debug('Cur: %.4f V: %.4f Therm: %.4f', current_voltage, divider_voltage, thermistor_voltage)
+    amps = (BASE_VOLTAGE - current_voltage) / AMP_CONVERSION_CF
+    battery_voltage = divider_voltage * VOLTAGE_DIVIDER_CF
     return ElectricalRecord(
         temp=temp,
         current=amps,
@@ -66,15 +62,19 @@ def electric_record_from_random(previous: ElectricalRecord | None) -> Electrical
         temp=get_random_value(20, 50, 1, previous and previous.temp)
     )
 
-def get_i2c_interface() -> busio.I2C | None:
+def get_i2c_interface() -> 'busio.I2C | None':
     logger = logging.getLogger('greybike')
-    if board is None:
+    try:
+        import board # type: ignore Library does not have proper typing
+        import busio # type: ignore Library does not have proper typing
+    except Exception:
         logger.error("Board not available")
         return None
     i2c = busio.I2C(board.SCL, board.SDA) # type: ignore
     return i2c
 
-def get_ads_interface(i2c: busio.I2C) -> ADS.ADS1115 | None:
+def get_ads_interface(i2c: 'busio.I2C') -> 'ADS.ADS1115 | None':
+    import adafruit_ads1x15.ads1115 as ADS
     ads = ADS.ADS1115(i2c)
     ads.gain = 1 # maximum measuring range of 6.144V
     return ads
@@ -1,24 +1,25 @@
-import serial
+from typing import TYPE_CHECKING
 import logging
-from datetime import datetime
-from serial.serialutil import SerialException
 from utils import get_random_value
-from data_types import CATelemetryRecord, SoftwareSerial
+from app_logging import count_event
+from data_types import CATelemetryRecord, SoftwareSerial, get_current_timestamp
 from constants import SERIAL_TIMEOUT, CA_SERIAL_BAUD_RATE, CA_HARDWARE_SERIAL, CA_SOFTWARE_SERIAL_PIN
 from data_sources.software_serial import readlines_from_software_serial, init_software_serial
 
+if TYPE_CHECKING:
+    import serial
+
 CA_LINE_VALUES_COUNT = 14
 
 def parse_telemetry_line(line: str) -> CATelemetryRecord | None:
-    logger = logging.getLogger('greybike')
     values = line.replace('\r', '').replace('\n', '').split('\t')
     if len(values) != CA_LINE_VALUES_COUNT:
-        logger.debug(f'Incorrect number of values in serial line: {len(values)} expected {CA_LINE_VALUES_COUNT}. Line {values}')
+        count_event('ca_bad_line')
         return None
     flags = values[13]
     try:
         return CATelemetryRecord(
-            timestamp=datetime.timestamp(datetime.now()),
+            timestamp=get_current_timestamp(),
             amper_hours=float(values[0]),
             voltage=float(values[1]),
             current=float(values[2]),
@@ -37,17 +38,16 @@ def parse_telemetry_line(line: str) -> CATelemetryRecord | None:
             is_brake_pressed='B' in flags
         )
     except ValueError:
-        logger.debug(f'Incorrect data in serial line: {len(values)} expected {CA_LINE_VALUES_COUNT}. Line {values}')
+        count_event('ca_bad_value')
         return None
 
 
-def ca_record_from_hardware_serial(ser: serial.Serial) -> CATelemetryRecord | None:
-    logger = logging.getLogger('greybike')
+def ca_record_from_hardware_serial(ser: 'serial.Serial') -> CATelemetryRecord | None:
     line = ser.readline()
     try:
         line = line.decode("utf-8")
-    except Exception as e:
-        logger.debug(f'Error decoding serial line: {e}') # Sometimes serial return corrupted data
+    except Exception:
+        count_event('ca_decode_error') # Sometimes serial return corrupted data
         return None
     return parse_telemetry_line(line)
 
@@ -84,17 +84,19 @@ def ca_record_from_random(previous: CATelemetryRecord | None) -> CATelemetryReco
     )
     return record
 
-def get_ca_hardware_serial() -> serial.Serial | None:
+def get_ca_hardware_serial() -> 'serial.Serial | None':
     logger = logging.getLogger('greybike')
     if CA_HARDWARE_SERIAL is None:
         logger.info('CA_HARDWARE_SERIAL is not set using software serial')
         return None
+    import serial
+    from serial.serialutil import SerialException
     try:
         ser = serial.Serial(CA_HARDWARE_SERIAL, CA_SERIAL_BAUD_RATE, timeout=SERIAL_TIMEOUT)
-        logger.info(f'Using hardware serial interface for CA {CA_HARDWARE_SERIAL}')
+        logger.info('Using hardware serial interface for CA %s', CA_HARDWARE_SERIAL)
         return ser
     except SerialException:
-        logger.error(f'Could not open serial interface {CA_HARDWARE_SERIAL}')
+        logger.error('Could not open serial interface %s', CA_HARDWARE_SERIAL)
 
 
 def get_ca_software_serial() -> SoftwareSerial | None:
@@ -104,7 +106,7 @@ def get_ca_software_serial() -> SoftwareSerial | None:
         return None
     try:
         ser = init_software_serial(CA_SOFTWARE_SERIAL_PIN, CA_SERIAL_BAUD_RATE)
-        logger.info(f'Using software serial interface on GPIO {CA_SOFTWARE_SERIAL_PIN}')
+        logger.info('Using software serial interface on GPIO %s', CA_SOFTWARE_SERIAL_PIN)
         return ser
     except Exception as e:
-        logger.error(f'Could not open software serial interface on GPIO {CA_SOFTWARE_SERIAL_PIN}: {e}')
+        logger.error('Could not open software serial interface on GPIO %s: %s', CA_SOFTWARE_SERIAL_PIN, e)
@@ -1,10 +1,14 @@
-import serial
+from typing import TYPE_CHECKING
 import logging
 
 from utils import get_random_value
+from app_logging import count_event
 from data_types import GNSSRecord
 from constants import GNSS_BAUD_RATE, GNSS_SERIAL_INTERFACE
 
+if TYPE_CHECKING:
+    import serial
+
 GNSS_SERIAL_TIMEOUT = 1
 
 KNOTS_TO_KMH = 1.852
@@ -16,50 +20,61 @@ GGA = ['GPGGA', 'GNGGA'] # Global positioning system fix data
 RMC = ['GNRMC','GPRMC', 'GGNRMC'] # Recommended Minimum data
 VTG = ['GNVTG'] # Course over ground and Groundspeed
 
-def get_gnss_serial() -> serial.Serial:
+def get_gnss_serial() -> 'serial.Serial':
+    import serial
     return serial.Serial(
         port=GNSS_SERIAL_INTERFACE,
         baudrate=GNSS_BAUD_RATE,
         timeout=GNSS_SERIAL_TIMEOUT
     )
 
+def nmea_to_degrees(value: str, hemisphere: str) -> float:
+    """
+        Converts NMEA ddmm.mmmm (dddmm.mmmm for longitude) to signed decimal degrees
+    """
+    dot_position = value.index('.')
+    degrees = float(value[:dot_position - 2]) + float(value[dot_position - 2:]) / 60
+    if hemisphere in ('S', 'W'):
+        return -degrees
+    return degrees
+
 def parse_GGA(values: list[str]) -> GNSSRecord | None:
-    logger = logging.getLogger('greybike')
     try:
         return GNSSRecord(
-            latitude=float(values[2]),
-            longitude=float(values[4]),
+            latitude=nmea_to_degrees(values[2], values[3]),
+            longitude=nmea_to_degrees(values[4], values[5]),
             sat_num=int(values[7]),
             hdop=float(values[8]),
             altitude=float(values[9])
         )
     except (ValueError, IndexError):
-        logger.debug(f'Error parsing GGA: {values}') # This happens when GPS signal is absent
+        count_event('gnss_no_fix') # This happens when GPS signal is absent
 
 def parse_RMC(values: list[str]) -> GNSSRecord | None:
-    logger = logging.getLogger('greybike')
     try:
         return GNSSRecord(
-            latitude=float(values[3]),
-            longitude=float(values[5]),
+            latitude=nmea_to_degrees(values[3], values[4]),
+            longitude=nmea_to_degrees(values[5], values[6]),
             speed=float(values[7]) * KNOTS_TO_KMH
         )
     except (ValueError, IndexError):
-        logger.debug(f'Error parsing RMC: {values}') # This happens when GPS signal is absent
+        count_event('gnss_no_fix') # This happens when GPS signal is absent
 
 def parse_GLL(values: list[str]) -> GNSSRecord | None:
-    logger = logging.getLogger('greybike')
     try:
         return GNSSRecord(
-            latitude=float(values[1]),
-            longitude=float(values[3]),
+            latitude=nmea_to_degrees(values[1], values[2]),
+            longitude=nmea_to_degrees(values[3], values[4]),
         )
     except (ValueError, IndexError):
-        logger.debug(f'Error parsing GGA: {values}') # This happens when GPS signal is absent
+        count_event('gnss_no_fix') # This happens when GPS signal is absent
 
 def process_nmea_line(line: bytes) -> GNSSRecord | None:
-    logger = logging.getLogger('greybike')
-    nmea_values = line.decode("utf-8").replace('\r\n', '').split(',')
+    try:
+        nmea_values = line.decode("utf-8").replace('\r\n', '').split(',')
+    except UnicodeDecodeError:
+        count_event('gnss_decode_error')
+        return None
     msgID = nmea_values[0].replace('$', '') 
     if msgID in GGA:
         return parse_GGA(nmea_values)
@@ -69,23 +84,24 @@ def process_nmea_line(line: bytes) -> GNSSRecord | None:
         return parse_GLL(nmea_values)
     if msgID in GSA + GSV + VTG:
         return None
-    logger.error(f'Unknown message {msgID}')
+    count_event('gnss_unknown_sentence')
     return None
 
-def gnss_from_serial(ser: serial.Serial) -> GNSSRecord | None:
+def gnss_from_serial(ser: 'serial.Serial') -> GNSSRecord | None:
+    import serial
     logger = logging.getLogger('greybike')
     try:
         line = ser.readline()
         return process_nmea_line(line)
     except serial.SerialException as e:
-        logger.error('GNSS Serial error: {}'.format(e))
+        logger.error('GNSS Serial error: %s', e)
         return None
 
 
 def gnss_from_random(previous: GNSSRecord | None ) -> GNSSRecord | None:
     return GNSSRecord(
-        latitude=get_random_value(99, 100, 0.001, previous and previous.latitude),
-        longitude=get_random_value(99, 100, 0.001, previous and previous.longitude),
+        latitude=get_random_value(44.7, 44.9, 0.001, previous and previous.latitude),
+        longitude=get_random_value(20.3, 20.6, 0.001, previous and previous.longitude),
         speed=get_random_value(10, 40, 0.5, previous and previous.speed),
         altitude=get_random_value(800, 1000, 1, previous and previous.altitude),
         sat_num=int(get_random_value(0, 20, 1, previous and previous.sat_num)),
@@ -0,0 +1,65 @@
+from typing import Any, AsyncIterator
+import asyncio
+import logging
+
+from data_types import GNSSRecord
+from data_sources.gpsd_client import GpsdClient, GpsdClientError, Mode
+from constants import GPSD_TIMEOUT, GPSD_MIN_BACKOFF, GPSD_MAX_BACKOFF
+
+MS_TO_KMH = 3.6
+
+
+def gnss_from_tpv(tpv: dict[str, Any], sky: dict[str, Any] | None) -> GNSSRecord | None:
+    """
+        Maps gpsd TPV message to GNSS record. hdop and satellite count are taken from the last SKY message
+    """
+    if tpv.get('mode', Mode.unknown) < Mode.two_d_fix or 'lat' not in tpv or 'lon' not in tpv:
+        return None
+    speed = tpv.get('speed')
+    return GNSSRecord(
+        latitude=tpv['lat'],
+        longitude=tpv['lon'],
+        altitude=tpv.get('altMSL', tpv.get('alt')),
+        speed=None if speed is None else speed * MS_TO_KMH,
+        hdop=None if sky is None else sky.get('hdop'),
+        sat_num=None if sky is None else sky.get('uSat'),
+    )
+
+
+async def close_client(client: GpsdClient):
+    if not hasattr(client, 'writer'):
+        return
+    try:
+        await client.close()
+    except OSError:
+        pass # Connection is already broken
+
+
+async def gnss_from_gpsd(host: str, port: int) -> AsyncIterator[GNSSRecord]:
+    """
+        GNSS records from gpsd over TCP. Connection is restarted with exponential backoff
+        when gpsd is unreachable, closes connection or stops sending data
+    """
+    logger = logging.getLogger('greybike')
+    backoff = GPSD_MIN_BACKOFF
+    while True:
+        client = GpsdClient(host=host, port=port)
+        try:
+            await asyncio.wait_for(client.connect(), GPSD_TIMEOUT)
+            logger.info('Connected to gpsd %s:%s', host, port)
+            backoff = GPSD_MIN_BACKOFF
+            sky = None
+            while True:
+                message = await asyncio.wait_for(client.get_message(), GPSD_TIMEOUT)
+                if message['class'] == 'SKY':
+                    sky = message
+                    continue
+                record = gnss_from_tpv(message, sky)
+                if record is not None:
+                    yield record
+        except (OSError, TimeoutError, GpsdClientError, ValueError, KeyError, TypeError) as e:
+            logger.error('gpsd connection error: %r. Reconnecting in %s seconds', e, backoff)
+        finally:
+            await close_client(client)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, GPSD_MAX_BACKOFF)
@@ -10,7 +10,7 @@ from enum import IntEnum
 from datetime import datetime
 from typing import Type
 from types import TracebackType
-import logging
+from app_logging import count_event
 
 
 
@@ -124,6 +124,12 @@ type Response = Poll | Sky | TPV | list[Device] | Version | Watch
 POLL = "?POLL;\r\n"
 WATCH = "?WATCH={}\r\n"
 
+
+def get_class_marker(message_class: str) -> bytes:
+    # gpsd writes compact JSON with class as the first key, so substring check is enough
+    return f'"class":"{message_class}"'.encode()
+
+
 class GpsdClientError(Exception):
     pass
 
@@ -136,11 +142,20 @@ class GpsdClient:
     watch: Watch
     sky: Sky
 
-    def __init__(self, host: str = "127.0.0.1", port: int = 2947, watch_config: Watch = Watch()):
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 2947,
+        watch_config: Watch = Watch(),
+        classes: tuple[str, ...] = ("TPV", "SKY"),
+        parse_satellites: bool = False,
+    ):
         self.host = host
         self.port = port
 
         self.watch_config = watch_config
+        self.class_markers = [get_class_marker(message_class) for message_class in classes]
+        self.parse_satellites = parse_satellites
 
     async def read_connect_lines(self):
         line_data = await self.get_line_data()
@@ -169,25 +184,38 @@ class GpsdClient:
         self.writer.close()
         await self.writer.wait_closed()
 
-    async def get_line_data(self):
+    async def read_line(self) -> bytes:
         line = await self.reader.readline()
-        line = json.loads(line.decode("utf-8").replace("\r\n", ""))
+        if not line:
+            raise GpsdClientError('Connection closed by gpsd')
         return line
 
+    async def get_line_data(self):
+        return json.loads(await self.read_line())
+
+    async def get_message(self) -> dict:
+        """
+            Next message of subscribed classes.
+            Other classes are skipped before JSON decoding
+        """
+        while True:
+            line = await self.read_line()
+            if any(marker in line for marker in self.class_markers):
+                return json.loads(line)
+
     async def get_result(self) -> TPV | Sky | None:
-        logger = logging.getLogger('greybike')
-        data = await self.get_line_data()
+        data = await self.get_message()
         result_class = data.pop("class")
         result = None
         try:
             if result_class == "TPV":
                 result = TPV(**data)
             elif result_class == "SKY":
-                prns = [PRN(**prn) for prn in data.pop('satellites')]
-                data['satellites'] = prns
+                satellites = data.pop('satellites', [])
+                data['satellites'] = [PRN(**prn) for prn in satellites] if self.parse_satellites else []
                 result = Sky(**data)
-        except TypeError as e:
-            logger.debug(e)
+        except TypeError:
+            count_event('gpsd_decode_error') # Fields added in newer gpsd versions
         return result
 
     async def poll(self):
@@ -205,10 +233,10 @@ class GpsdClient:
     def __aiter__(self):
         return self
 
-    async def __anext__(self) -> TPV | Sky | None: 
-        result = await self.get_result()
-        if isinstance(result, TPV):
-            return result
-        if isinstance(result, Sky):
-            self.sky = result
-        return await anext(self)
+    async def __anext__(self) -> TPV:
+        while True:
+            result = await self.get_result()
+            if isinstance(result, TPV):
+                return result
+            if isinstance(result, Sky):
+                self.sky = result
@@ -0,0 +1,69 @@
+from dataclasses import replace
+from typing import AsyncIterator, Iterator
+import asyncio
+import heapq
+import logging
+
+from data_types import BaseRecord, CATelemetryRecord, MessageType, get_current_timestamp
+from telemetry_logs import LogRecord, read_log_file, read_gnss_log_file, read_electric_log_file
+
+
+def ca_record_from_log_record(record: LogRecord) -> CATelemetryRecord:
+    """
+        Fields which are not logged get neutral values
+    """
+    return CATelemetryRecord(
+        timestamp=record.timestamp,
+        amper_hours=record.amper_hours or 0,
+        voltage=record.voltage or 0,
+        current=record.current or 0,
+        speed=record.speed or 0,
+        trip_distance=record.trip_distance or 0,
+        motor_temp=record.motor_temp or 0,
+        pedal_rpm=record.pedal_rpm or 0,
+        human_watts=record.human_watts or 0,
+        human_torque=record.human_torque or 0,
+        throttle_input=record.throttle_input or 0,
+        throttle_output=record.throttle_output or 0,
+        aux_a=0,
+        aux_d=0,
+        mode=int(record.mode or 0),
+        flags='',
+        is_brake_pressed=False,
+    )
+
+
+def read_ca_replay_records(log_file_name: str) -> Iterator[tuple[float, MessageType, BaseRecord]]:
+    # Log task writes the last read record at log rate, so one read can be logged more than once
+    previous_timestamp = None
+    for record in read_log_file(log_file_name):
+        if record.timestamp != previous_timestamp:
+            previous_timestamp = record.timestamp
+            yield record.timestamp, MessageType.CA, ca_record_from_log_record(record)
+
+
+def read_replay_records(log_file_name: str) -> Iterator[tuple[float, MessageType, BaseRecord]]:
+    """
+        Records of telemetry log and its companion logs in time order
+    """
+    gnss = ((record.timestamp, MessageType.GNSS, record) for record in read_gnss_log_file(log_file_name))
+    electric = ((record.timestamp, MessageType.ELECTRIC, record) for record in read_electric_log_file(log_file_name))
+    return heapq.merge(read_ca_replay_records(log_file_name), gnss, electric, key=lambda item: item[0])
+
+
+async def records_from_replay(log_file_name: str) -> AsyncIterator[tuple[MessageType, BaseRecord]]:
+    """
+        Records of existing log at their original offsets from the first record, timestamped with current time.
+        Used as data source of simulation
+    """
+    logger = logging.getLogger('greybike')
+    logger.info('Replaying log %s', log_file_name)
+    offset = None
+    for timestamp, message_type, record in read_replay_records(log_file_name):
+        if offset is None:
+            offset = get_current_timestamp() - timestamp
+        delay = timestamp + offset - get_current_timestamp()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield message_type, replace(record, timestamp=get_current_timestamp())
+    logger.info('Replay of log %s finished', log_file_name)
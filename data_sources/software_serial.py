@@ -1,4 +1,3 @@
-import pigpio # type: ignore No types for pigpio
 from data_types import SoftwareSerial
 
 
@@ -21,6 +20,7 @@ def close_software_serial(serial: SoftwareSerial):
     serial.interface.stop()
 
 def init_software_serial(pin_number: int, baud_rate: int) -> SoftwareSerial | None:
+    import pigpio # type: ignore No types for pigpio
     pi = None
     try:
         pi = pigpio.pi()
@@ -0,0 +1,129 @@
+import gc
+import os
+import time
+import psutil
+from data_types import SystemTelemetryRecord
+
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+PROC_SELF_STATM = '/proc/self/statm'
+PROC_SELF_FD = '/proc/self/fd'
+CPU_TEMP_FILE = '/sys/class/thermal/thermal_zone0/temp' # Same file is read by gpiozero CPUTemperature
+READ_SIZE = 4096
+BYTES_IN_MB = 1024 * 1024
+
+
+def open_if_exists(path: str, flags: int = 0) -> int | None:
+    try:
+        return os.open(path, os.O_RDONLY | flags)
+    except OSError:
+        return None
+
+
+def read_fd(fd: int) -> bytes:
+    # procfs and sysfs files are generated on read from offset 0, so one pread returns fresh data
+    return os.pread(fd, READ_SIZE, 0)
+
+
+class SystemSampler:
+    """
+        Host and process metrics with low overhead.
+        /proc and /sys files are opened once and read with single pread call.
+        psutil is used where /proc is not available, for example in development on macOS.
+        Event loop lag and garbage collector pauses are accumulated between samples
+    """
+
+    def __init__(self):
+        self.stat_fd = open_if_exists(PROC_STAT)
+        self.meminfo_fd = open_if_exists(PROC_MEMINFO)
+        self.statm_fd = open_if_exists(PROC_SELF_STATM)
+        self.cpu_temp_fd = open_if_exists(CPU_TEMP_FILE)
+        self.fd_dir_fd = open_if_exists(PROC_SELF_FD, os.O_DIRECTORY)
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.previous_cpu_times: tuple[int, int] | None = None
+        self.loop_lag = 0.0
+        self.last_wakeup: float | None = None
+        self.gc_collections = 0
+        self.gc_pause = 0.0
+        self.gc_start: float | None = None
+        gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase: str, info: dict[str, int]):
+        if phase == 'start':
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            self.gc_pause += time.perf_counter() - self.gc_start
+            self.gc_collections += 1
+            self.gc_start = None
+
+    def add_loop_wakeup(self, now: float, interval: float):
+        """
+            Lag is difference between expected and actual wakeup of periodic task. Maximum is kept until next sample
+        """
+        if self.last_wakeup is not None:
+            self.loop_lag = max(self.loop_lag, now - self.last_wakeup - interval)
+        self.last_wakeup = now
+
+    def get_cpu_usage(self) -> float:
+        if self.stat_fd is None:
+            return psutil.cpu_percent()
+        values = [int(value) for value in read_fd(self.stat_fd).split(b'\n', 1)[0].split()[1:]]
+        idle = values[3] + values[4] # idle and iowait
+        total = sum(values[:8]) # Guest time is already included in user time
+        previous = self.previous_cpu_times
+        self.previous_cpu_times = (idle, total)
+        if previous is None or total == previous[1]:
+            return 0.0
+        return 100 * (1 - (idle - previous[0]) / (total - previous[1]))
+
+    def get_memory_usage(self) -> float:
+        if self.meminfo_fd is None:
+            return psutil.virtual_memory().percent
+        meminfo: dict[bytes, int] = {}
+        for line in read_fd(self.meminfo_fd).splitlines():
+            name, value = line.split(b':', 1)
+            if name in (b'MemTotal', b'MemAvailable'):
+                meminfo[name] = int(value.split()[0])
+        return 100 * (1 - meminfo[b'MemAvailable'] / meminfo[b'MemTotal'])
+
+    def get_rss(self) -> float:
+        if self.statm_fd is None:
+            return psutil.Process().memory_info().rss / BYTES_IN_MB
+        return int(read_fd(self.statm_fd).split()[1]) * self.page_size / BYTES_IN_MB
+
+    def get_cpu_temp(self) -> float | None:
+        if self.cpu_temp_fd is None:
+            return None
+        return int(read_fd(self.cpu_temp_fd)) / 1000
+
+    def get_open_fds(self) -> int | None:
+        """
+            Entries are counted without building list of names. Directory is read from the start on every scan
+        """
+        if self.fd_dir_fd is None:
+            return None
+        with os.scandir(self.fd_dir_fd) as entries:
+            return sum(1 for _ in entries)
+
+    def sample(self) -> SystemTelemetryRecord:
+        record = SystemTelemetryRecord(
+            cpu_temp=self.get_cpu_temp(),
+            cpu_usage=self.get_cpu_usage(),
+            memory_usage=self.get_memory_usage(),
+            rss=self.get_rss(),
+            open_fds=self.get_open_fds(),
+            loop_lag=self.loop_lag * 1000,
+            gc_collections=self.gc_collections,
+            gc_pause=self.gc_pause * 1000,
+        )
+        self.loop_lag = 0.0
+        self.gc_collections = 0
+        self.gc_pause = 0.0
+        return record
+
+    def close(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+        for fd in (self.stat_fd, self.meminfo_fd, self.statm_fd, self.cpu_temp_fd, self.fd_dir_fd):
+            if fd is not None:
+                os.close(fd)
@@ -1,21 +1,37 @@
 from dataclasses import dataclass, field
-from collections import deque
-from typing import TextIO
+from typing import Any, TYPE_CHECKING
 from aiohttp import web
 from enum import StrEnum
 from datetime import datetime
-import adafruit_ads1x15.ads1115 as ADS
-import busio # type: ignore
-import pigpio # type: ignore
 import asyncio
-from serial import Serial
+from clock import get_time
+from ring_buffer import RecordRingBuffer
+from geo_index import GeoIndex
+from rolling_stats import RollingStats
+from route_simplify import StreamingSimplifier
+from startup_profile import StartupProfile
+from load_governor import LoadGovernor, TaskPriority
 from constants import (
     CA_TELEMETRY_BUFFER_SIZE, GNSS_BUFFER_SIZE, SYSTEM_TELEMETRY_BUFFER_SIZE,
-    ELECTRIC_RECORD_BUFFER_SIZE
+    ELECTRIC_RECORD_BUFFER_SIZE, HISTORY_BUFFER_SIZE, ROUTE_TOLERANCE, ROUTE_MAX_WINDOW
 )
 
+if TYPE_CHECKING:
+    # Hardware drivers are imported only by enabled data sources
+    import adafruit_ads1x15.ads1115 as ADS
+    import busio # type: ignore
+    import pigpio # type: ignore
+    from data_sources.system import SystemSampler
+    from serial import Serial
+    from subscriptions import StreamGroup
+    from telemetry_bus import TelemetryBus
+    from multiprocessing.process import BaseProcess
+    from memory_profile import MemoryProfiler
+    from storage import TelemetryStorage
+
+
 def get_current_timestamp() -> float:
-    return datetime.timestamp(datetime.now())
+    return get_time()
 
 class MessageType(StrEnum):
     SYSTEM = 'system'
@@ -23,6 +39,13 @@ class MessageType(StrEnum):
     GNSS = 'gnss'
     EVENT = 'event'
     ELECTRIC = 'electric'
+    HISTORY = 'history'
+    STATS = 'stats'
+    TRIP = 'trip'
+    CHART = 'chart'
+    ROUTE = 'route'
+    FUSED = 'fused'
+    SUBSCRIBE = 'subscribe'
 
 @dataclass(kw_only=True, slots=True, frozen=True)
 class BaseRecord:
@@ -61,8 +84,8 @@ class GNSSRecord(BaseRecord):
 
         Attributes:
             timestamp (float): Unix timestamp.
-            latitude (float): Latitude in minutes.
-            longitude (float): Longitude in minutes.
+            latitude (float): Latitude in decimal degrees. Negative for southern hemisphere.
+            longitude (float): Longitude in decimal degrees. Negative for western hemisphere.
             altitude (float): Altitude above sea level in meters.
             hdop (float): Horizontal Dilution of Precision. Lower is better accuracy.
             sat_num (int): Number of satellites used in fix.
@@ -84,10 +107,22 @@ class SystemTelemetryRecord(BaseRecord):
             cpu_temp (float): CPU temperature in Celsius.
             memory_usage (float): Memory usage percentage.
             cpu_usage (float): CPU usage percentage.
+            rss (float): Resident memory of greybike process in MB.
+            open_fds (int): Open file descriptors of greybike process.
+            loop_lag (float): Maximum event loop wakeup delay since previous record in ms.
+            gc_collections (int): Garbage collections since previous record.
+            gc_pause (float): Total garbage collection pause since previous record in ms.
+            load_level (int): Load governor level. 0 normal, 1 reduced send rates, 2 non-essential work paused.
     """
     cpu_temp: float | None = None
     memory_usage: float
     cpu_usage: float
+    rss: float | None = None
+    open_fds: int | None = None
+    loop_lag: float | None = None
+    gc_collections: int | None = None
+    gc_pause: float | None = None
+    load_level: int | None = None
 
 
 @dataclass(kw_only=True, slots=True, frozen=True)
@@ -101,44 +136,168 @@ class ElectricalRecord(BaseRecord):
     timestamp: float = field(default_factory=get_current_timestamp)
 
 
+@dataclass(kw_only=True, slots=True, frozen=True)
+class FusedRecord(BaseRecord):
+    """
+        Cycle Analyst record joined with the latest GNSS and electrical records.
+        Position and electrical fields are None when there was no record within join tolerance
+
+        Attributes:
+            electric_voltage (float): Voltage measured by onboard electronics, not by Cycle Analyst.
+            electric_current (float): Current measured by onboard electronics.
+            gnss_speed (float): Speed over ground from GNSS in km/h.
+    """
+    speed: float | None = None
+    voltage: float | None = None
+    current: float | None = None
+    trip_distance: float | None = None
+    human_watts: float | None = None
+    pedal_rpm: float | None = None
+    throttle_output: float | None = None
+    motor_temp: float | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    altitude: float | None = None
+    gnss_speed: float | None = None
+    electric_voltage: float | None = None
+    electric_current: float | None = None
+    electric_temp: float | None = None
+
+
+@dataclass
+class AggregatedLogData:
+    """
+        Ride totals. Calculated from log files or updated live for current trip
+    """
+    max_speed: float = 0
+    max_regen_watts: float = 0
+    max_motor_watts: float = 0
+    max_human_watts: float = 0
+    total_human_watt_hours: float = 0
+    total_regen_watt_hours: float = 0
+    total_motor_watt_hours: float = 0
+    total_distance: float = 0
+    total_records: int = 0
+    first_timestamp: float | None = None
+    first_distance: float | None = None
+    last_timestamp: float | None = None
+    last_distance: float | None = None
+
+
+class DecimationMethod(StrEnum):
+    LTTB = 'lttb'
+    MIN_MAX = 'minmax'
+
+
+@dataclass(kw_only=True, slots=True, frozen=True)
+class ChartRequest:
+    """
+        Decimated chart stream requested by websocket client
+
+        Attributes:
+            points (int): Maximum number of points per channel.
+            duration (float): Chart time range in seconds.
+            method (DecimationMethod): Point selection algorithm.
+            channels (tuple): Pairs of stream type and field name.
+    """
+    points: int
+    duration: float
+    method: DecimationMethod = DecimationMethod.LTTB
+    channels: tuple[tuple[MessageType, str], ...]
+
+
+@dataclass(kw_only=True, slots=True, frozen=True)
+class StreamSubscription:
+    """
+        Part of stream requested by websocket client
+
+        Attributes:
+            fields (tuple): Sorted record fields to send. None means all fields.
+            interval (float): Minimal time between messages in seconds. 0 means every message.
+            delta (bool): Send only fields changed since previous message between keyframes.
+    """
+    fields: tuple[str, ...] | None = None
+    interval: float = 0
+    delta: bool = False
+
+
 @dataclass(kw_only=True, slots=True, frozen=True)
 class TaskData:
     """
-        Periodic task metadata
+        Background task metadata. Interval is None for tasks which run continuously
     """
     name: str
     task: asyncio.Task[None]
-    interval: float
+    interval: float | None
+    priority: TaskPriority = TaskPriority.CRITICAL
 
 
 @dataclass
 class SoftwareSerial:
-    interface: pigpio.pi
+    interface: 'pigpio.pi'
     pin_number: int
 
 
 @dataclass
 class AppState:
-    log_file: TextIO | None = None
+    storage: 'TelemetryStorage | None' = None
     log_start_time: datetime | None = None
     log_record_count: int = 0
     log_files: list[str] = field(default_factory=lambda: [])
     tasks: list[TaskData] = field(default_factory=lambda: [])
     websockets: list[web.WebSocketResponse] = field(default_factory=lambda: [])
-    ca_hardware_serial: Serial | None = None
+    ca_hardware_serial: 'Serial | None' = None
     ca_software_serial: SoftwareSerial | None = None
-    gnss_serial: Serial | None = None
-    ads: ADS.ADS1115 | None = None
-    i2c: busio.I2C | None = None
-    ca_telemetry_records: deque[CATelemetryRecord] = field(
-        default_factory=lambda: deque(maxlen=CA_TELEMETRY_BUFFER_SIZE)
+    gnss_serial: 'Serial | None' = None
+    ads: 'ADS.ADS1115 | None' = None
+    i2c: 'busio.I2C | None' = None
+    system_sampler: 'SystemSampler | None' = None
+    replay_log_file: str | None = None # Simulation replays records of this log instead of reading sensors
+    load_governor: LoadGovernor = field(default_factory=LoadGovernor)
+    startup_profile: StartupProfile | None = None
+    # Multi-process mode. Acquisition process publishes records to bus writer, web process reads them
+    bus_writer: 'TelemetryBus | None' = None
+    bus_reader: 'TelemetryBus | None' = None
+    acquisition_process: 'BaseProcess | None' = None
+    exit_code: int = 0 # Non-zero exit code after shutdown makes systemd restart the service
+    memory_profiler: 'MemoryProfiler | None' = None
+    ca_telemetry_records: RecordRingBuffer[CATelemetryRecord] = field(
+        default_factory=lambda: RecordRingBuffer(CATelemetryRecord, CA_TELEMETRY_BUFFER_SIZE)
+    )
+    gnss_records: RecordRingBuffer[GNSSRecord] = field(
+        default_factory=lambda: RecordRingBuffer(GNSSRecord, GNSS_BUFFER_SIZE)
+    )
+    electric_records: RecordRingBuffer[ElectricalRecord] = field(
+        default_factory=lambda: RecordRingBuffer(ElectricalRecord, ELECTRIC_RECORD_BUFFER_SIZE)
+    )
+    system_telemetry_records: RecordRingBuffer[SystemTelemetryRecord] = field(
+        default_factory=lambda: RecordRingBuffer(SystemTelemetryRecord, SYSTEM_TELEMETRY_BUFFER_SIZE)
+    )
+    fused_records: RecordRingBuffer[FusedRecord] = field(
+        default_factory=lambda: RecordRingBuffer(FusedRecord, CA_TELEMETRY_BUFFER_SIZE)
+    )
+    history: dict[MessageType, RecordRingBuffer[Any]] = field(
+        default_factory=lambda: {
+            MessageType.CA: RecordRingBuffer(CATelemetryRecord, HISTORY_BUFFER_SIZE),
+            MessageType.GNSS: RecordRingBuffer(GNSSRecord, HISTORY_BUFFER_SIZE),
+            MessageType.ELECTRIC: RecordRingBuffer(ElectricalRecord, HISTORY_BUFFER_SIZE),
+            MessageType.SYSTEM: RecordRingBuffer(SystemTelemetryRecord, HISTORY_BUFFER_SIZE),
+        }
+    )
+    rolling_stats: RollingStats = field(
+        default_factory=lambda: RollingStats(energy_channels=('motor', 'regen', 'human'))
+    )
+    trip: AggregatedLogData = field(default_factory=AggregatedLogData)
+    geo_index: GeoIndex = field(default_factory=GeoIndex)
+    route: StreamingSimplifier = field(
+        default_factory=lambda: StreamingSimplifier(ROUTE_TOLERANCE, ROUTE_MAX_WINDOW)
     )
-    gnss_records: deque[GNSSRecord] = field(
-        default_factory=lambda: deque(maxlen=GNSS_BUFFER_SIZE)
+    route_sent_count: int = 0
+    chart_requests: dict[web.WebSocketResponse, ChartRequest] = field(default_factory=lambda: {})
+    subscriptions: dict[web.WebSocketResponse, dict[MessageType, StreamSubscription]] = field(
+        default_factory=lambda: {}
     )
-    electric_records: deque[ElectricalRecord] = field(
-        default_factory=lambda: deque(maxlen=ELECTRIC_RECORD_BUFFER_SIZE)
+    stream_groups: dict[tuple[MessageType, StreamSubscription], 'StreamGroup'] = field(
+        default_factory=lambda: {}
     )
-    system_telemetry_records: deque[SystemTelemetryRecord] = field(
-        default_factory=lambda: deque(maxlen=SYSTEM_TELEMETRY_BUFFER_SIZE)
-    )
\ No newline at end of file
+    trip_checkpoint_records: int = 0
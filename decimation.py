@@ -0,0 +1,65 @@
+from typing import Sequence
+
+
+def lttb(timestamps: Sequence[float], values: Sequence[float], threshold: int) -> list[int]:
+    """
+        Largest-Triangle-Three-Buckets downsampling.
+        Returns indexes of selected points. First and last points are always selected,
+        from every other bucket the point forming the largest triangle with neighbours is taken,
+        so short peaks survive decimation
+    """
+    length = len(values)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+    result = [0]
+    bucket_size = (length - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+        next_start = bucket_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, length)
+        # Average point of the next bucket is the third triangle vertex
+        next_count = next_end - next_start
+        avg_x = sum(timestamps[next_start:next_end]) / next_count
+        avg_y = sum(values[next_start:next_end]) / next_count
+        selected_x = timestamps[selected]
+        selected_y = values[selected]
+        max_area = -1.0
+        max_index = bucket_start
+        for index in range(bucket_start, bucket_end):
+            area = abs(
+                (selected_x - avg_x) * (values[index] - selected_y) -
+                (selected_x - timestamps[index]) * (avg_y - selected_y)
+            )
+            if area > max_area:
+                max_area = area
+                max_index = index
+        result.append(max_index)
+        selected = max_index
+    result.append(length - 1)
+    return result
+
+
+def min_max_decimate(values: Sequence[float], threshold: int) -> list[int]:
+    """
+        Splits values into threshold / 2 buckets and keeps minimum and maximum of each one
+    """
+    length = len(values)
+    if threshold >= length or threshold < 2:
+        return list(range(length))
+    bucket_count = threshold // 2
+    bucket_size = length / bucket_count
+    result: list[int] = []
+    for bucket in range(bucket_count):
+        bucket_start = int(bucket * bucket_size)
+        bucket_end = int((bucket + 1) * bucket_size)
+        min_index = max_index = bucket_start
+        for index in range(bucket_start, bucket_end):
+            value = values[index]
+            if value < values[min_index]:
+                min_index = index
+            if value > values[max_index]:
+                max_index = index
+        result.extend(sorted({min_index, max_index}))
+    return result
@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+from typing import Generic, Iterable, Iterator, TypeVar
+from constants import FUSION_TOLERANCE, MAX_SAMPLE_DURATION
+from data_types import (
+    AppState, BaseRecord, CATelemetryRecord, ElectricalRecord, FusedRecord, GNSSRecord, MessageType
+)
+from log_query import select_range
+from ring_buffer import RecordRingBuffer
+from storage import TelemetryStorage
+from telemetry_logs import LogRecord
+
+JoinedRecord = TypeVar('JoinedRecord', bound=BaseRecord)
+
+
+@dataclass
+class EnergySegment:
+    """
+        Part of ride with fixed distance and battery energy used on it.
+        Regenerated energy is subtracted
+    """
+    start_timestamp: float
+    end_timestamp: float
+    start_latitude: float | None = None
+    start_longitude: float | None = None
+    end_latitude: float | None = None
+    end_longitude: float | None = None
+    distance: float = 0
+    watt_hours: float = 0
+    watt_hours_per_km: float | None = None
+
+
+class AsOfCursor(Generic[JoinedRecord]):
+    """
+        Latest record of time sorted stream at or before given time.
+        Requested timestamps must not decrease, so every stream is read once like in sorted merge
+    """
+
+    def __init__(self, records: Iterable[JoinedRecord], tolerance: float):
+        self.records = iter(records)
+        self.tolerance = tolerance
+        self.current: JoinedRecord | None = None
+        self.upcoming: JoinedRecord | None = next(self.records, None)
+
+    def get(self, timestamp: float) -> JoinedRecord | None:
+        while self.upcoming is not None and self.upcoming.timestamp <= timestamp:
+            self.current = self.upcoming
+            self.upcoming = next(self.records, None)
+        if self.current is None or timestamp - self.current.timestamp > self.tolerance:
+            return None
+        return self.current
+
+
+def fuse_record(
+    telemetry: CATelemetryRecord | LogRecord, gnss: GNSSRecord | None, electric: ElectricalRecord | None
+) -> FusedRecord:
+    return FusedRecord(
+        timestamp=telemetry.timestamp,
+        speed=telemetry.speed,
+        voltage=telemetry.voltage,
+        current=telemetry.current,
+        trip_distance=telemetry.trip_distance,
+        human_watts=telemetry.human_watts,
+        pedal_rpm=telemetry.pedal_rpm,
+        throttle_output=telemetry.throttle_output,
+        motor_temp=telemetry.motor_temp,
+        latitude=None if gnss is None else gnss.latitude,
+        longitude=None if gnss is None else gnss.longitude,
+        altitude=None if gnss is None else gnss.altitude,
+        gnss_speed=None if gnss is None else gnss.speed,
+        electric_voltage=None if electric is None else electric.voltage,
+        electric_current=None if electric is None else electric.current,
+        electric_temp=None if electric is None else electric.temp,
+    )
+
+
+def get_latest_record(
+    buffer: RecordRingBuffer[JoinedRecord], timestamp: float, tolerance: float
+) -> JoinedRecord | None:
+    if len(buffer) == 0:
+        return None
+    record = buffer[-1]
+    if not 0 <= timestamp - record.timestamp <= tolerance:
+        return None
+    return record
+
+
+def add_fused_record(state: AppState, telemetry: CATelemetryRecord):
+    """
+        Live join. Other streams arrive in time order, so their latest records are the as-of matches
+    """
+    gnss = get_latest_record(state.gnss_records, telemetry.timestamp, FUSION_TOLERANCE)
+    electric = get_latest_record(state.electric_records, telemetry.timestamp, FUSION_TOLERANCE)
+    state.fused_records.append(fuse_record(telemetry, gnss, electric))
+
+
+def fuse_streams(
+    telemetry_records: Iterable[LogRecord],
+    gnss_records: Iterable[GNSSRecord],
+    electric_records: Iterable[ElectricalRecord],
+    tolerance: float = FUSION_TOLERANCE,
+) -> Iterator[FusedRecord]:
+    """
+        Batch as-of join of time sorted streams. Works in one pass with one record per stream in memory
+    """
+    gnss_cursor = AsOfCursor(gnss_records, tolerance)
+    electric_cursor = AsOfCursor(electric_records, tolerance)
+    for telemetry in telemetry_records:
+        yield fuse_record(telemetry, gnss_cursor.get(telemetry.timestamp), electric_cursor.get(telemetry.timestamp))
+
+
+def read_fused_log(
+    storage: TelemetryStorage, log_name: str, tolerance: float = FUSION_TOLERANCE
+) -> Iterator[FusedRecord]:
+    return fuse_streams(
+        storage.read_log(MessageType.CA, log_name),
+        storage.read_log(MessageType.GNSS, log_name),
+        storage.read_log(MessageType.ELECTRIC, log_name),
+        tolerance
+    )
+
+
+def read_fused_range(
+    storage: TelemetryStorage, start: float, end: float, tolerance: float = FUSION_TOLERANCE
+) -> Iterator[FusedRecord]:
+    for log_name in storage.find_logs(start, end):
+        yield from fuse_streams(
+            select_range(storage.read_log(MessageType.CA, log_name), start, end),
+            storage.read_log(MessageType.GNSS, log_name),
+            storage.read_log(MessageType.ELECTRIC, log_name),
+            tolerance
+        )
+
+
+def finish_segment(segment: EnergySegment) -> EnergySegment:
+    if segment.distance > 0:
+        segment.watt_hours_per_km = segment.watt_hours / segment.distance
+    return segment
+
+
+def calculate_segments(records: Iterable[FusedRecord], segment_distance: float) -> list[EnergySegment]:
+    """
+        Splits ride into segments of segment_distance km using Cycle Analyst trip distance.
+        Last segment can be shorter
+    """
+    segments: list[EnergySegment] = []
+    segment: EnergySegment | None = None
+    previous: FusedRecord | None = None
+    for record in records:
+        if segment is None:
+            segment = EnergySegment(start_timestamp=record.timestamp, end_timestamp=record.timestamp)
+        if previous is not None:
+            duration = record.timestamp - previous.timestamp
+            if 0 < duration <= MAX_SAMPLE_DURATION and record.voltage is not None and record.current is not None:
+                segment.watt_hours += record.voltage * record.current * duration / 3600
+            if (
+                record.trip_distance is not None and previous.trip_distance is not None
+                and record.trip_distance > previous.trip_distance
+            ):
+                segment.distance += record.trip_distance - previous.trip_distance
+        segment.end_timestamp = record.timestamp
+        if record.latitude is not None and record.longitude is not None:
+            if segment.start_latitude is None:
+                segment.start_latitude = record.latitude
+                segment.start_longitude = record.longitude
+            segment.end_latitude = record.latitude
+            segment.end_longitude = record.longitude
+        if segment.distance >= segment_distance:
+            segments.append(finish_segment(segment))
+            segment = EnergySegment(
+                start_timestamp=record.timestamp,
+                end_timestamp=record.timestamp,
+                start_latitude=segment.end_latitude,
+                start_longitude=segment.end_longitude,
+            )
+        previous = record
+    if segment is not None and segment.distance > 0:
+        segments.append(finish_segment(segment))
+    return segments
@@ -0,0 +1,60 @@
+from dataclasses import dataclass, field
+import math
+from constants import GEO_GRID_SIZE, GEO_INDEX_GAP
+
+BoundingBox = tuple[float, float, float, float] # Min latitude, min longitude, max latitude, max longitude
+
+
+def get_cell(latitude: float, longitude: float) -> tuple[int, int]:
+    return math.floor(latitude / GEO_GRID_SIZE), math.floor(longitude / GEO_GRID_SIZE)
+
+
+def get_cell_key(cell: tuple[int, int]) -> str:
+    return f'{cell[0]}:{cell[1]}'
+
+
+def get_bbox_cells(bbox: BoundingBox) -> list[tuple[int, int]]:
+    min_lat, min_lon = get_cell(bbox[0], bbox[1])
+    max_lat, max_lon = get_cell(bbox[2], bbox[3])
+    return [(lat, lon) for lat in range(min_lat, max_lat + 1) for lon in range(min_lon, max_lon + 1)]
+
+
+@dataclass
+class GeoIndex:
+    """
+        Coarse spatial grid over GNSS fixes of logs. Every cell has list of [log name, start, end] visits,
+        so area queries read only log parts which passed through the area
+    """
+    cells: dict[str, list[list]] = field(default_factory=lambda: {})
+    logs: dict[str, float | None] = field(default_factory=lambda: {}) # Indexed logs with their storage revision
+    is_changed: bool = False
+
+    def add_fix(self, log_name: str, timestamp: float, latitude: float, longitude: float):
+        visits = self.cells.setdefault(get_cell_key(get_cell(latitude, longitude)), [])
+        if visits and visits[-1][0] == log_name and timestamp - visits[-1][2] <= GEO_INDEX_GAP:
+            visits[-1][2] = timestamp
+        else:
+            visits.append([log_name, timestamp, timestamp])
+        self.logs[log_name] = None
+        self.is_changed = True
+
+    def remove_log(self, log_name: str):
+        for key in list(self.cells):
+            self.cells[key] = [visit for visit in self.cells[key] if visit[0] != log_name]
+            if not self.cells[key]:
+                del self.cells[key]
+        self.logs.pop(log_name, None)
+        self.is_changed = True
+
+    def find_visits(self, bbox: BoundingBox) -> list[tuple[str, float, float]]:
+        """
+            Log time ranges in grid cells overlapping bounding box, sorted by time
+        """
+        visits: list[tuple[str, float, float]] = []
+        for cell in get_bbox_cells(bbox):
+            for log_name, start, end in self.cells.get(get_cell_key(cell), []):
+                visits.append((log_name, start, end))
+        return sorted(visits, key=lambda visit: visit[1])
+
+    def to_dict(self) -> dict:
+        return {'cells': self.cells, 'logs': self.logs}
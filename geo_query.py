@@ -0,0 +1,113 @@
+from typing import Iterator
+import json
+import logging
+import os
+from constants import GEO_INDEX_FILE
+from data_types import MessageType
+from geo_index import GeoIndex, BoundingBox
+from log_query import select_range
+from storage import TelemetryStorage
+from telemetry_logs import LogRecord
+from utils import write_json_atomic
+
+
+def load_geo_index() -> GeoIndex:
+    """
+        Index of older version was keyed by GNSS log files, it is rebuilt on startup
+    """
+    logger = logging.getLogger('greybike')
+    if not os.path.exists(GEO_INDEX_FILE):
+        return GeoIndex()
+    try:
+        with open(GEO_INDEX_FILE) as index_file:
+            data = json.load(index_file)
+        return GeoIndex(cells=data['cells'], logs=data['logs'])
+    except (ValueError, KeyError) as e:
+        logger.error('Could not read GNSS index, rebuilding: %s', e)
+        return GeoIndex()
+
+
+def save_geo_index(storage: TelemetryStorage, index: GeoIndex):
+    """
+        Log revision is stored to detect fixes written after save, they are indexed again on startup
+    """
+    if index.is_changed:
+        for log_name in index.logs:
+            index.logs[log_name] = storage.get_log_revision(log_name)
+        write_json_atomic(GEO_INDEX_FILE, index.to_dict())
+        index.is_changed = False
+
+
+def update_geo_index(storage: TelemetryStorage, index: GeoIndex, log_names: list[str]):
+    """
+        Indexes logs which are new or were changed after last index save
+    """
+    logger = logging.getLogger('greybike')
+    for log_name in log_names:
+        revision = storage.get_log_revision(log_name)
+        if index.logs.get(log_name) == revision:
+            continue
+        logger.info('Indexing GNSS fixes of %s', log_name)
+        index.remove_log(log_name)
+        index.logs[log_name] = None # Logs without fixes are not indexed again on every startup
+        for record in storage.read_log(MessageType.GNSS, log_name):
+            index.add_fix(log_name, record.timestamp, record.latitude, record.longitude)
+    save_geo_index(storage, index)
+
+
+def find_rides_in_area(index: GeoIndex, bbox: BoundingBox) -> list[dict[str, str | float]]:
+    """
+        Logs which passed through grid cells of bounding box with time of the first and last visit
+    """
+    rides: dict[str, dict[str, str | float]] = {}
+    for log_name, start, end in index.find_visits(bbox):
+        if log_name not in rides:
+            rides[log_name] = {'log': log_name, 'start': start, 'end': end}
+        else:
+            rides[log_name]['end'] = max(end, rides[log_name]['end']) # type: ignore
+    return list(rides.values())
+
+
+def is_in_bbox(latitude: float, longitude: float, bbox: BoundingBox) -> bool:
+    return bbox[0] <= latitude <= bbox[2] and bbox[1] <= longitude <= bbox[3]
+
+
+def get_bbox_intervals(
+    storage: TelemetryStorage, log_name: str, visits: list[tuple[float, float]], bbox: BoundingBox
+) -> list[tuple[float, float]]:
+    """
+        Time intervals when consecutive GNSS fixes were inside bounding box.
+        Only fixes from indexed visit time ranges are checked
+    """
+    intervals: list[tuple[float, float]] = []
+    interval_start = None
+    interval_end = None
+    for record in storage.read_log(MessageType.GNSS, log_name):
+        in_visit = any(start <= record.timestamp <= end for start, end in visits)
+        if in_visit and is_in_bbox(record.latitude, record.longitude, bbox):
+            if interval_start is None:
+                interval_start = record.timestamp
+            interval_end = record.timestamp
+        elif interval_start is not None and interval_end is not None:
+            intervals.append((interval_start, interval_end))
+            interval_start = interval_end = None
+    if interval_start is not None and interval_end is not None:
+        intervals.append((interval_start, interval_end))
+    return intervals
+
+
+def read_telemetry_in_bbox(storage: TelemetryStorage, index: GeoIndex, bbox: BoundingBox) -> Iterator[LogRecord]:
+    """
+        Telemetry records logged while bike was inside bounding box.
+        Logs without visits to the area are not read
+    """
+    visits_by_log: dict[str, list[tuple[float, float]]] = {}
+    for log_name, start, end in index.find_visits(bbox):
+        visits_by_log.setdefault(log_name, []).append((start, end))
+    for log_name in sorted(visits_by_log):
+        intervals = get_bbox_intervals(storage, log_name, visits_by_log[log_name], bbox)
+        if not intervals:
+            continue
+        for record in select_range(storage.read_log(MessageType.CA, log_name), intervals[0][0], intervals[-1][1]):
+            if any(start <= record.timestamp <= end for start, end in intervals):
+                yield record
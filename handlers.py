@@ -1,17 +1,186 @@
-from aiohttp import web
+from aiohttp import web, WSMsgType
+from typing import Any
 
-from telemetry_logs import reset_log
-from constants import WS_TIMEOUT, SPA_ASSETS_DIR, FAVICON_DIRECTORY
-from data_types import AppState
+from telemetry_logs import reset_log, get_storage
+from trip import reset_trip
+from constants import (
+    WS_TIMEOUT, SPA_ASSETS_DIR, FAVICON_DIRECTORY, ROUTE_TOLERANCE, SEGMENT_DISTANCE, CHART_MAX_POINTS,
+    ACQUISITION_MEMORY_REPORT_FILE, MEMORY_REPORT_TIMEOUT, MEMORY_REPORT_POLL_INTERVAL
+)
+from data_types import AppState, MessageType
+from history import get_history_snapshot
+from charts import parse_chart_request
+from subscriptions import parse_subscription, remove_client, set_subscription
+from geo_query import find_rides_in_area
+from route import get_route_message, get_log_route, reset_route
+from fusion import calculate_segments, read_fused_log
+from log_export import EXPORT_CONTENT_TYPES, export_log
+from rollup_query import get_range_chart
+from startup_profile import record_first_frame
+from storage import TelemetryStorage
+from dataclasses import asdict
+import asyncio
+import json
 import logging
+import math
 import os
 
 MAX_WEBSOCKET_CONNECTIONS = 3
 
 async def reset_log_handler(request: web.Request):
-    reset_log(request.app['state'])
+    state: AppState = request.app['state']
+    if state.bus_reader is not None:
+        state.bus_reader.request_log_reset() # Logs are owned by acquisition process
+    else:
+        reset_log(state)
     return web.Response(text='Log file reset')
 
+async def reset_trip_handler(request: web.Request):
+    reset_trip(request.app['state'])
+    reset_route(request.app['state'])
+    return web.Response(text='Trip reset')
+
+async def log_aggregates_handler(request: web.Request):
+    try:
+        start = float(request.query['from'])
+        end = float(request.query['to'])
+    except (KeyError, ValueError):
+        return web.Response(text='from and to timestamps are required', status=400)
+    storage = get_storage(request.app['state'])
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, storage.aggregate, start, end)
+    return web.json_response(asdict(result))
+
+async def range_chart_handler(request: web.Request):
+    """
+        Chart of logged channels for time range, for example
+        /api/chart?from=1717236000&to=1717246800&width=800&channels=ca.speed,electric.power
+    """
+    try:
+        start = float(request.query['from'])
+        end = float(request.query['to'])
+        width = min(int(request.query.get('width', CHART_MAX_POINTS)), CHART_MAX_POINTS)
+        channels = [
+            (MessageType(stream), field)
+            for stream, field in (channel.split('.') for channel in request.query['channels'].split(','))
+        ]
+    except (KeyError, ValueError):
+        return web.Response(text='from, to and channels=stream.field,... are required', status=400)
+    if width <= 0 or end <= start:
+        return web.Response(text='width and time range must be positive', status=400)
+    storage = get_storage(request.app['state'])
+    loop = asyncio.get_running_loop()
+    try:
+        chart = await loop.run_in_executor(None, get_range_chart, storage, start, end, width, channels)
+    except ValueError as e:
+        return web.Response(text=str(e), status=400)
+    return web.json_response(chart)
+
+async def rides_in_area_handler(request: web.Request):
+    state: AppState = request.app['state']
+    try:
+        min_lat, min_lon, max_lat, max_lon = (float(value) for value in request.query['bbox'].split(','))
+    except (KeyError, ValueError):
+        return web.Response(text='bbox=min_lat,min_lon,max_lat,max_lon is required', status=400)
+    return web.json_response(find_rides_in_area(state.geo_index, (min_lat, min_lon, max_lat, max_lon)))
+
+async def log_route_handler(request: web.Request):
+    storage = get_storage(request.app['state'])
+    log_name = request.match_info['name']
+    if log_name not in storage.list_logs():
+        return web.Response(text='Log not found', status=404)
+    try:
+        tolerance = float(request.query.get('tolerance', ROUTE_TOLERANCE))
+    except ValueError:
+        return web.Response(text='tolerance must be a number of meters', status=400)
+    loop = asyncio.get_running_loop()
+    route = await loop.run_in_executor(None, get_log_route, storage, log_name, tolerance)
+    return web.json_response(route)
+
+def get_log_segments(storage: TelemetryStorage, log_name: str, segment_distance: float) -> list[dict]:
+    return [asdict(segment) for segment in calculate_segments(read_fused_log(storage, log_name), segment_distance)]
+
+async def log_segments_handler(request: web.Request):
+    storage = get_storage(request.app['state'])
+    log_name = request.match_info['name']
+    if log_name not in storage.list_logs():
+        return web.Response(text='Log not found', status=404)
+    try:
+        segment_distance = float(request.query.get('length', SEGMENT_DISTANCE))
+    except ValueError:
+        return web.Response(text='length must be a number of km', status=400)
+    if segment_distance <= 0:
+        return web.Response(text='length must be positive', status=400)
+    loop = asyncio.get_running_loop()
+    segments = await loop.run_in_executor(None, get_log_segments, storage, log_name, segment_distance)
+    return web.json_response(segments)
+
+async def log_export_handler(request: web.Request):
+    """
+        Export is generated chunk by chunk in executor and sent with chunked transfer encoding
+    """
+    storage = get_storage(request.app['state'])
+    log_name = request.match_info['name']
+    if log_name not in storage.list_logs():
+        return web.Response(text='Log not found', status=404)
+    export_format = request.query.get('format', 'csv')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return web.Response(text=f'format must be one of {", ".join(EXPORT_CONTENT_TYPES)}', status=400)
+    try:
+        start = float(request.query.get('from', 0))
+        end = float(request.query.get('to', math.inf))
+    except ValueError:
+        return web.Response(text='from and to must be timestamps', status=400)
+    file_name = f'{log_name.removesuffix(".log")}.{export_format}'
+    response = web.StreamResponse(headers={
+        'Content-Type': EXPORT_CONTENT_TYPES[export_format],
+        'Content-Disposition': f'attachment; filename="{file_name}"',
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    chunks = export_log(storage, log_name, export_format, start, end)
+    loop = asyncio.get_running_loop()
+    while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+def read_acquisition_memory_report(request_number: int) -> dict[str, Any] | None:
+    try:
+        with open(ACQUISITION_MEMORY_REPORT_FILE) as report_file:
+            data = json.load(report_file)
+    except (OSError, ValueError):
+        return None
+    return data['report'] if data.get('request', 0) >= request_number else None
+
+
+async def get_acquisition_memory_report(state: AppState) -> dict[str, Any] | None:
+    """
+        Report of acquisition process is requested through bus and written to file by acquisition process
+    """
+    if state.bus_reader is None:
+        return None
+    request_number = state.bus_reader.request_memory_report()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MEMORY_REPORT_TIMEOUT
+    while loop.time() < deadline:
+        await asyncio.sleep(MEMORY_REPORT_POLL_INTERVAL)
+        report = read_acquisition_memory_report(request_number)
+        if report is not None:
+            return report
+    return None
+
+
+async def memory_handler(request: web.Request):
+    state: AppState = request.app['state']
+    if state.memory_profiler is None:
+        return web.Response(text='Memory profiling is disabled', status=404)
+    loop = asyncio.get_running_loop()
+    report = await loop.run_in_executor(None, state.memory_profiler.report)
+    if state.bus_reader is not None:
+        report['acquisition'] = await get_acquisition_memory_report(state)
+    return web.json_response(report)
+
 def file_response(file_path: str) -> web.FileResponse:
     # TODO add in memory cache. read file in memory and store it in dict or something
     response = web.FileResponse(file_path)
@@ -23,6 +192,18 @@ def get_file_serve_handler(file_path: str):
         return file_response(file_path)
     return file_serve_handler
 
+async def process_websocket_message(state: AppState, ws: web.WebSocketResponse, message: str):
+    logger = logging.getLogger('greybike')
+    try:
+        message_data = json.loads(message)
+        if message_data['type'] == MessageType.CHART:
+            state.chart_requests[ws] = parse_chart_request(state, message_data['data'])
+        elif message_data['type'] == MessageType.SUBSCRIBE:
+            await set_subscription(state, ws, parse_subscription(message_data['data']))
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning('Invalid websocket message %s: %s', message, e)
+
+
 async def websocket_handler(request: web.Request):
     logger = logging.getLogger('greybike')
     logger.info('New websocket connection')
@@ -33,13 +214,27 @@ async def websocket_handler(request: web.Request):
         return web.Response(text=msg, status=400)
     ws = web.WebSocketResponse(timeout=WS_TIMEOUT)
     await ws.prepare(request)
+    await ws.send_str(json.dumps({
+        'type': MessageType.HISTORY,
+        'data': get_history_snapshot(state)
+    }))
+    await ws.send_str(json.dumps({
+        'type': MessageType.ROUTE,
+        'data': get_route_message(state, 0)
+    }))
+    if state.startup_profile is not None:
+        record_first_frame(state.startup_profile)
     state.websockets.append(ws)
     try:
         async for msg in ws:
-            logger.debug(f'Websocket message {msg}')
+            logger.debug('Websocket message %s', msg)
+            if msg.type == WSMsgType.TEXT:
+                await process_websocket_message(state, ws, msg.data)
     finally:
         await ws.close()
         state.websockets.remove(ws)
+        state.chart_requests.pop(ws, None)
+        remove_client(state, ws)
         logger.info('Websocket connection closed')
     return ws
 
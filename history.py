@@ -0,0 +1,30 @@
+from typing import Any
+from data_types import AppState, BaseRecord, MessageType
+from constants import HISTORY_INTERVAL
+
+
+def add_history_record(state: AppState, message_type: MessageType, record: BaseRecord):
+    """
+        Stores record in downsampled stream history.
+        Only one record per HISTORY_INTERVAL is kept
+    """
+    history = state.history[message_type]
+    last_timestamp = history.latest('timestamp')
+    if last_timestamp is None or record.timestamp - last_timestamp >= HISTORY_INTERVAL:
+        history.append(record)
+
+
+def get_history_snapshot(state: AppState) -> dict[str, Any]:
+    """
+        Compact representation of all stream histories.
+        Field names are sent once per stream, records are sent as lists of values
+    """
+    snapshot: dict[str, Any] = {}
+    for message_type, history in state.history.items():
+        if len(history) == 0:
+            continue
+        snapshot[message_type] = {
+            'fields': history.fields,
+            'records': history.rows()
+        }
+    return snapshot
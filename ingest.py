@@ -0,0 +1,107 @@
+from typing import Any
+import logging
+import signal
+from data_types import (
+    AppState, BaseRecord, CATelemetryRecord, ElectricalRecord, GNSSRecord, SystemTelemetryRecord, MessageType
+)
+from fusion import add_fused_record
+from history import add_history_record
+from ring_buffer import RecordRingBuffer
+from route import add_route_point, reset_route
+from telemetry_logs import update_aggregates, write_gnss_to_log, write_electric_to_log, write_system_to_log
+from trip import is_new_ride, reset_trip
+from utils import split_power
+
+
+def get_stream_buffer(state: AppState, message_type: MessageType) -> RecordRingBuffer[Any]:
+    if message_type == MessageType.CA:
+        return state.ca_telemetry_records
+    if message_type == MessageType.GNSS:
+        return state.gnss_records
+    if message_type == MessageType.ELECTRIC:
+        return state.electric_records
+    if message_type == MessageType.SYSTEM:
+        return state.system_telemetry_records
+    if message_type == MessageType.FUSED:
+        return state.fused_records
+    raise ValueError(f'No buffer for {message_type} stream')
+
+
+def add_derived_stats(state: AppState, record: BaseRecord, duration: float):
+    """
+        Power values are calculated once on the server instead of every dashboard client
+    """
+    stats = state.rolling_stats
+    if isinstance(record, CATelemetryRecord):
+        motor_watts, regen_watts = split_power(record.voltage, record.current)
+        stats.add_value(MessageType.CA, 'power', record.timestamp, motor_watts)
+        stats.add_value(MessageType.CA, 'regen', record.timestamp, regen_watts)
+        stats.add_energy('motor', record.timestamp, motor_watts, duration)
+        stats.add_energy('regen', record.timestamp, regen_watts, duration)
+        stats.add_energy('human', record.timestamp, record.human_watts, duration)
+    if isinstance(record, ElectricalRecord):
+        stats.add_value(MessageType.ELECTRIC, 'power', record.timestamp, record.voltage * record.current)
+
+
+def log_record(state: AppState, record: BaseRecord):
+    if isinstance(record, ElectricalRecord):
+        write_electric_to_log(state, record)
+    if isinstance(record, GNSSRecord):
+        write_gnss_to_log(state, record)
+    if isinstance(record, SystemTelemetryRecord) and state.bus_reader is None:
+        # System is sampled by web process, logs are owned by acquisition process in multi-process mode
+        write_system_to_log(state, record)
+
+
+def process_record(state: AppState, message_type: MessageType, record: BaseRecord):
+    """
+        Derived state which is served to clients
+    """
+    get_stream_buffer(state, message_type).append(record)
+    add_history_record(state, message_type, record)
+    duration = state.rolling_stats.add_record(message_type, record)
+    add_derived_stats(state, record, duration)
+    if isinstance(record, CATelemetryRecord):
+        if is_new_ride(state.trip, record.timestamp):
+            reset_trip(state)
+            reset_route(state)
+        update_aggregates(state.trip, record)
+        add_fused_record(state, record)
+    if isinstance(record, GNSSRecord):
+        add_route_point(state, record)
+
+
+def ingest_record(state: AppState, message_type: MessageType, record: BaseRecord):
+    """
+        Single entry point for every new record from data sources.
+        Acquisition process only logs records and publishes them to web process
+    """
+    if state.bus_writer is not None:
+        get_stream_buffer(state, message_type).append(record)
+        log_record(state, record)
+        state.bus_writer.publish(message_type, record)
+        return
+    log_record(state, record)
+    process_record(state, message_type, record)
+
+
+async def telemetry_bus_read_task(state: AppState):
+    """
+        Web process part of multi-process mode. Records are already logged by acquisition process
+    """
+    logger = logging.getLogger('greybike')
+    if state.bus_reader is None:
+        return
+    process = state.acquisition_process
+    if process is not None and not process.is_alive():
+        # Sensors and logs are gone with acquisition process. Service exits with error, so systemd restarts it
+        logger.error('Acquisition process exited with code %s. Stopping service', process.exitcode)
+        state.acquisition_process = None
+        state.exit_code = 1
+        signal.raise_signal(signal.SIGTERM)
+        return
+    dropped = state.bus_reader.dropped
+    for message_type, record in state.bus_reader.read():
+        process_record(state, message_type, record)
+    if state.bus_reader.dropped > dropped:
+        logger.warning('Telemetry bus dropped %d records', state.bus_reader.dropped - dropped)
@@ -0,0 +1,92 @@
+from enum import IntEnum
+import logging
+from constants import (
+    LOAD_LAG_THRESHOLDS, LOAD_LAG_EXIT_THRESHOLDS, LOAD_TEMP_THRESHOLDS, LOAD_TEMP_EXIT_THRESHOLDS,
+    LOAD_RECOVERY_TIME, LOAD_REDUCED_INTERVAL_FACTOR
+)
+
+
+class LoadLevel(IntEnum):
+    NORMAL = 0
+    REDUCED = 1 # Non-critical streams are sent less often
+    SHEDDING = 2 # Non-essential work is paused
+
+
+class TaskPriority(IntEnum):
+    CRITICAL = 0 # Ingestion, logging and main dashboard streams. Always run at full rate
+    REDUCIBLE = 1 # Slowed down under load
+    OPTIONAL = 2 # Slowed down under load, paused under heavy load
+
+
+# Interval multiplier per load level and task priority. None means task is paused
+INTERVAL_FACTORS: dict[LoadLevel, dict[TaskPriority, float | None]] = {
+    LoadLevel.NORMAL: {
+        TaskPriority.CRITICAL: 1, TaskPriority.REDUCIBLE: 1, TaskPriority.OPTIONAL: 1,
+    },
+    LoadLevel.REDUCED: {
+        TaskPriority.CRITICAL: 1,
+        TaskPriority.REDUCIBLE: LOAD_REDUCED_INTERVAL_FACTOR,
+        TaskPriority.OPTIONAL: LOAD_REDUCED_INTERVAL_FACTOR,
+    },
+    LoadLevel.SHEDDING: {
+        TaskPriority.CRITICAL: 1, TaskPriority.REDUCIBLE: LOAD_REDUCED_INTERVAL_FACTOR, TaskPriority.OPTIONAL: None,
+    },
+}
+
+
+def is_above(loop_lag: float | None, cpu_temp: float | None, lag_threshold: float, temp_threshold: float) -> bool:
+    return (
+        (loop_lag is not None and loop_lag >= lag_threshold)
+        or (cpu_temp is not None and cpu_temp >= temp_threshold)
+    )
+
+
+class LoadGovernor:
+    """
+        Chooses load level from event loop lag and CPU temperature.
+        Level goes up as soon as enter threshold is crossed. It goes down one step at a time,
+        after both values stay below lower exit thresholds for LOAD_RECOVERY_TIME, so rates do not flap
+    """
+
+    def __init__(self):
+        self.level = LoadLevel.NORMAL
+        self.calm_since: float | None = None
+
+    def get_measured_level(self, loop_lag: float | None, cpu_temp: float | None) -> LoadLevel:
+        level = LoadLevel.NORMAL
+        for threshold_level, lag_threshold, temp_threshold in zip(
+            (LoadLevel.REDUCED, LoadLevel.SHEDDING), LOAD_LAG_THRESHOLDS, LOAD_TEMP_THRESHOLDS
+        ):
+            if is_above(loop_lag, cpu_temp, lag_threshold, temp_threshold):
+                level = threshold_level
+        return level
+
+    def is_calm(self, loop_lag: float | None, cpu_temp: float | None) -> bool:
+        lag_threshold = LOAD_LAG_EXIT_THRESHOLDS[self.level - 1]
+        temp_threshold = LOAD_TEMP_EXIT_THRESHOLDS[self.level - 1]
+        return not is_above(loop_lag, cpu_temp, lag_threshold, temp_threshold)
+
+    def set_level(self, level: LoadLevel, loop_lag: float | None, cpu_temp: float | None):
+        logger = logging.getLogger('greybike')
+        log_level = logging.WARNING if level > self.level else logging.INFO
+        logger.log(
+            log_level, 'Load level %s -> %s. Loop lag %s ms, CPU temp %s', self.level.name, level.name, loop_lag, cpu_temp
+        )
+        self.level = level
+        self.calm_since = None
+
+    def update(self, loop_lag: float | None, cpu_temp: float | None, now: float) -> LoadLevel:
+        measured_level = self.get_measured_level(loop_lag, cpu_temp)
+        if measured_level > self.level:
+            self.set_level(measured_level, loop_lag, cpu_temp)
+        elif self.level > LoadLevel.NORMAL:
+            if not self.is_calm(loop_lag, cpu_temp):
+                self.calm_since = None
+            elif self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= LOAD_RECOVERY_TIME:
+                self.set_level(LoadLevel(self.level - 1), loop_lag, cpu_temp)
+        return self.level
+
+    def get_interval_factor(self, priority: TaskPriority) -> float | None:
+        return INTERVAL_FACTORS[self.level][priority]
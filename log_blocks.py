@@ -0,0 +1,170 @@
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+import os
+import struct
+import zlib
+from clock import get_monotonic
+
+BLOCK_MAGIC = b'GBLK'
+BLOCK_HEADER = struct.Struct('<4sIII') # Magic, payload length, sequence number, CRC32
+MAX_BLOCK_SIZE = 1024 * 1024
+MAGIC_SEARCH_CHUNK_SIZE = 64 * 1024
+
+
+def get_block_crc(length: int, sequence: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(struct.pack('<II', length, sequence)))
+
+
+@dataclass(slots=True)
+class LogBlock:
+    offset: int
+    sequence: int
+    payload: bytes
+
+    @property
+    def end(self) -> int:
+        return self.offset + BLOCK_HEADER.size + len(self.payload)
+
+
+class LogBlockWriter:
+    """
+        Groups log lines into framed blocks with length, sequence number and CRC.
+        Block is written when it has block_records lines or on flush_expired call.
+        fsync is called per block, not per line
+    """
+
+    def __init__(self, file: BinaryIO, block_records: int):
+        self.file = file
+        self.block_records = block_records
+        self.lines: list[bytes] = []
+        self.sequence = 0
+        self.block_start_time = get_monotonic()
+        self.unsynced = False
+
+    @property
+    def name(self) -> str:
+        return self.file.name # type: ignore
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def write(self, line: bytes):
+        if not self.lines:
+            self.block_start_time = get_monotonic()
+        self.lines.append(line)
+        if len(self.lines) >= self.block_records:
+            self.write_block()
+
+    def write_block(self):
+        if not self.lines:
+            return
+        payload = b''.join(self.lines)
+        crc = get_block_crc(len(payload), self.sequence, payload)
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(payload), self.sequence, crc) + payload)
+        self.file.flush()
+        self.sequence += 1
+        self.lines = []
+        self.unsynced = True
+
+    def flush_expired(self, max_age: float):
+        if self.lines and get_monotonic() - self.block_start_time >= max_age:
+            self.write_block()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = False
+
+    def close(self):
+        self.write_block()
+        self.sync()
+        self.file.close()
+
+
+def read_block(file: BinaryIO, offset: int) -> tuple[LogBlock | None, bool]:
+    """
+        Returns valid block at offset or None.
+        Second value is True when block is cut by the end of file, which is expected after power loss
+    """
+    file.seek(offset)
+    header = file.read(BLOCK_HEADER.size)
+    if len(header) < BLOCK_HEADER.size:
+        return None, True
+    magic, length, sequence, crc = BLOCK_HEADER.unpack(header)
+    if magic != BLOCK_MAGIC or length > MAX_BLOCK_SIZE:
+        return None, False
+    payload = file.read(length)
+    if len(payload) < length:
+        return None, True
+    if get_block_crc(length, sequence, payload) != crc:
+        return None, False
+    return LogBlock(offset=offset, sequence=sequence, payload=payload), False
+
+
+def find_block_magic(file: BinaryIO, offset: int) -> int | None:
+    file.seek(offset)
+    tail = b''
+    position = offset
+    while True:
+        chunk = file.read(MAGIC_SEARCH_CHUNK_SIZE)
+        if not chunk:
+            return None
+        data = tail + chunk
+        index = data.find(BLOCK_MAGIC)
+        if index >= 0:
+            return position - len(tail) + index
+        tail = data[-(len(BLOCK_MAGIC) - 1):]
+        position += len(chunk)
+
+
+def iter_log_blocks(file: BinaryIO, offset: int) -> Iterator[LogBlock]:
+    """
+        All valid blocks starting from offset. Corrupted data is skipped
+        by searching for the next block magic
+    """
+    position = offset
+    while True:
+        block, is_truncated = read_block(file, position)
+        if block is not None:
+            yield block
+            position = block.end
+            continue
+        if is_truncated:
+            return
+        next_position = find_block_magic(file, position + 1)
+        if next_position is None:
+            return
+        position = next_position
+
+
+def find_last_valid_block(file: BinaryIO, offset: int) -> LogBlock | None:
+    """
+        Walks block headers without reading payloads, then checks CRC from the last block backwards.
+        Full scan is used only when corrupted data is found in the middle of the file
+    """
+    file_size = file.seek(0, os.SEEK_END)
+    positions: list[int] = []
+    position = offset
+    is_chain_complete = False
+    while True:
+        file.seek(position)
+        header = file.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            is_chain_complete = True
+            break
+        magic, length, _, _ = BLOCK_HEADER.unpack(header)
+        if magic != BLOCK_MAGIC or length > MAX_BLOCK_SIZE:
+            break
+        if position + BLOCK_HEADER.size + length > file_size:
+            is_chain_complete = True # Last block was cut by power loss
+            break
+        positions.append(position)
+        position += BLOCK_HEADER.size + length
+    if is_chain_complete:
+        for position in reversed(positions):
+            block, _ = read_block(file, position)
+            if block is not None:
+                return block
+    last_block = None
+    for block in iter_log_blocks(file, offset):
+        last_block = block
+    return last_block
@@ -0,0 +1,176 @@
+from array import array
+from dataclasses import fields
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator
+import json
+import math
+import struct
+import sys
+from constants import EXPORT_CHUNK_SIZE, EXPORT_ROW_GROUP_SIZE, FUSION_TOLERANCE
+from data_types import FusedRecord, MessageType
+from fusion import AsOfCursor, fuse_streams
+from log_query import select_range
+from storage import TelemetryStorage
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'gpx': 'application/gpx+xml',
+    'columnar': 'application/octet-stream',
+}
+FUSED_FIELDS = [field.name for field in fields(FusedRecord)]
+COLUMNAR_MAGIC = b'GBCOL1\n'
+COLUMNAR_LENGTH = struct.Struct('<I')
+GPX_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="greybike" xmlns="http://www.topografix.com/GPX/1/1"
+  xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v2">
+<trk><name>{name}</name><trkseg>
+"""
+GPX_FOOTER = '</trkseg></trk>\n</gpx>\n'
+
+
+def chunked(parts: Iterable[bytes], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+        Joins small parts into chunks of about chunk_size, so every write to socket or file is large enough
+    """
+    buffer: list[bytes] = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def read_fused_export(storage: TelemetryStorage, log_name: str, start: float, end: float) -> Iterator[FusedRecord]:
+    return fuse_streams(
+        select_range(storage.read_log(MessageType.CA, log_name), start, end),
+        storage.read_log(MessageType.GNSS, log_name),
+        storage.read_log(MessageType.ELECTRIC, log_name),
+    )
+
+
+def format_csv_value(value: float | None) -> str:
+    return '' if value is None else str(value)
+
+
+def iter_csv(records: Iterable[FusedRecord]) -> Iterator[bytes]:
+    yield (','.join(FUSED_FIELDS) + '\n').encode()
+    for record in records:
+        yield (','.join(format_csv_value(getattr(record, name)) for name in FUSED_FIELDS) + '\n').encode()
+
+
+def format_gpx_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def iter_gpx(storage: TelemetryStorage, log_name: str, start: float, end: float) -> Iterator[bytes]:
+    """
+        Track points are GNSS fixes joined with the latest telemetry and electrical records.
+        Power and cadence are written as Garmin track point extensions, speed is in m/s
+    """
+    telemetry_records = select_range(storage.read_log(MessageType.CA, log_name), start, end)
+    telemetry_cursor = AsOfCursor(telemetry_records, FUSION_TOLERANCE)
+    electric_cursor = AsOfCursor(storage.read_log(MessageType.ELECTRIC, log_name), FUSION_TOLERANCE)
+    yield GPX_HEADER.format(name=log_name.removesuffix('.log')).encode()
+    for fix in select_range(storage.read_log(MessageType.GNSS, log_name), start, end):
+        telemetry = telemetry_cursor.get(fix.timestamp)
+        electric = electric_cursor.get(fix.timestamp)
+        point = [f'<trkpt lat="{fix.latitude:.7f}" lon="{fix.longitude:.7f}">']
+        if fix.altitude is not None:
+            point.append(f'<ele>{fix.altitude:.1f}</ele>')
+        point.append(f'<time>{format_gpx_time(fix.timestamp)}</time>')
+        if fix.sat_num is not None:
+            point.append(f'<sat>{fix.sat_num}</sat>')
+        if fix.hdop is not None:
+            point.append(f'<hdop>{fix.hdop:.1f}</hdop>')
+        extensions: list[str] = []
+        if electric is not None:
+            extensions.append(f'<power>{electric.voltage * electric.current:.0f}</power>')
+        elif telemetry is not None and telemetry.voltage is not None and telemetry.current is not None:
+            extensions.append(f'<power>{telemetry.voltage * telemetry.current:.0f}</power>')
+        point_extensions: list[str] = []
+        if telemetry is not None and telemetry.pedal_rpm is not None:
+            point_extensions.append(f'<gpxtpx:cad>{telemetry.pedal_rpm:.0f}</gpxtpx:cad>')
+        if fix.speed is not None:
+            point_extensions.append(f'<gpxtpx:speed>{fix.speed / 3.6:.2f}</gpxtpx:speed>')
+        if point_extensions:
+            extensions.append(f'<gpxtpx:TrackPointExtension>{"".join(point_extensions)}</gpxtpx:TrackPointExtension>')
+        if extensions:
+            point.append(f'<extensions>{"".join(extensions)}</extensions>')
+        point.append('</trkpt>\n')
+        yield ''.join(point).encode()
+    yield GPX_FOOTER.encode()
+
+
+def iter_columnar(records: Iterable[FusedRecord], row_group_size: int = EXPORT_ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """
+        Parquet-like columnar file without extra dependencies.
+        Magic line, length prefixed JSON schema, then row groups and zero length end marker.
+        Row group is record count followed by one little endian float64 array per field, None is NaN.
+        Columns can be loaded directly with array('d').frombytes or numpy.frombuffer
+    """
+    schema = json.dumps({'fields': FUSED_FIELDS, 'type': 'float64', 'null': 'nan'}).encode()
+    yield COLUMNAR_MAGIC + COLUMNAR_LENGTH.pack(len(schema)) + schema
+    columns = {name: array('d') for name in FUSED_FIELDS}
+    for record in records:
+        for name, column in columns.items():
+            value = getattr(record, name)
+            column.append(math.nan if value is None else value)
+        if len(columns['timestamp']) >= row_group_size:
+            yield columnar_row_group(columns)
+    if len(columns['timestamp']) > 0:
+        yield columnar_row_group(columns)
+    yield COLUMNAR_LENGTH.pack(0)
+
+
+def columnar_row_group(columns: dict[str, array]) -> bytes:
+    count = len(columns['timestamp'])
+    parts = [COLUMNAR_LENGTH.pack(count)]
+    for column in columns.values():
+        if sys.byteorder == 'big':
+            column.byteswap()
+        parts.append(column.tobytes())
+        del column[:]
+    return b''.join(parts)
+
+
+def read_columnar_export(export_file: BinaryIO) -> Iterator[dict[str, array]]:
+    """
+        Row groups of columnar export as column arrays
+    """
+    if export_file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError('Invalid columnar export')
+    schema_length = COLUMNAR_LENGTH.unpack(export_file.read(COLUMNAR_LENGTH.size))[0]
+    field_names: list[str] = json.loads(export_file.read(schema_length))['fields']
+    while True:
+        count = COLUMNAR_LENGTH.unpack(export_file.read(COLUMNAR_LENGTH.size))[0]
+        if count == 0:
+            return
+        row_group: dict[str, array] = {}
+        for name in field_names:
+            column = array('d')
+            column.frombytes(export_file.read(count * 8))
+            if sys.byteorder == 'big':
+                column.byteswap()
+            row_group[name] = column
+        yield row_group
+
+
+def export_log(
+    storage: TelemetryStorage, log_name: str, export_format: str, start: float = 0, end: float = math.inf
+) -> Iterator[bytes]:
+    """
+        Export of one log as stream of chunks. Only one record per stream
+        and one chunk (or one row group for columnar format) are kept in memory
+    """
+    if export_format == 'csv':
+        return chunked(iter_csv(read_fused_export(storage, log_name, start, end)))
+    if export_format == 'gpx':
+        return chunked(iter_gpx(storage, log_name, start, end))
+    if export_format == 'columnar':
+        return chunked(iter_columnar(read_fused_export(storage, log_name, start, end)))
+    raise ValueError(f'Unknown export format {export_format}')
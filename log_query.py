@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import reduce
+from heapq import merge
+from typing import Any, Iterable, Iterator
+import multiprocessing
+import os
+import logging
+from constants import TELEMETRY_LOG_DIRECTORY, LOG_QUERY_WORKERS
+from data_types import AggregatedLogData
+from telemetry_logs import (
+    LogRecord, read_log_file, read_last_log_record, calculate_log_agregates, merge_aggregates
+)
+
+
+def get_log_start_time(file_name: str) -> float:
+    """
+        Log files are named after their creation time
+    """
+    return datetime.fromisoformat(file_name.removesuffix('.log')).timestamp()
+
+
+def get_log_end_time(file_name: str) -> float:
+    last_record = read_last_log_record(file_name)
+    if last_record is None:
+        return get_log_start_time(file_name)
+    return last_record.timestamp
+
+
+query_executor: ProcessPoolExecutor | None = None
+
+
+def get_query_executor() -> ProcessPoolExecutor:
+    """
+        One bounded pool of worker processes shared by all queries, so log parsing uses all cores.
+        Workers are started by forkserver, they do not copy threads, sockets and buffers of the service
+    """
+    global query_executor
+    if query_executor is None:
+        query_executor = ProcessPoolExecutor(
+            max_workers=LOG_QUERY_WORKERS, mp_context=multiprocessing.get_context('forkserver')
+        )
+    return query_executor
+
+
+def shutdown_query_executor():
+    global query_executor
+    if query_executor is not None:
+        query_executor.shutdown(cancel_futures=True)
+        query_executor = None
+
+
+def is_log_file_name(file_name: str) -> bool:
+    if not file_name.endswith('.log'):
+        return False
+    try:
+        get_log_start_time(file_name)
+    except ValueError:
+        return False
+    return True
+
+
+def get_all_log_files() -> list[str]:
+    """
+        Telemetry log file names sorted by creation time. Files not named after creation time are skipped
+    """
+    return sorted(file_name for file_name in os.listdir(TELEMETRY_LOG_DIRECTORY) if is_log_file_name(file_name))
+
+
+def find_logs_in_range(start: float, end: float) -> list[str]:
+    logger = logging.getLogger('greybike')
+    result: list[str] = []
+    for file_name in get_all_log_files():
+        if get_log_start_time(file_name) > end:
+            break
+        try:
+            end_time = get_log_end_time(file_name)
+        except ValueError as e:
+            logger.warning('Skipping log file %s: %s', file_name, e)
+            continue
+        if end_time >= start:
+            result.append(file_name)
+    return result
+
+
+def select_range(records: Iterable[Any], start: float, end: float) -> Iterator[Any]:
+    """
+        Records of time sorted stream in time range. Stream is not read past the end of range
+    """
+    for record in records:
+        if record.timestamp > end:
+            break
+        if record.timestamp >= start:
+            yield record
+
+
+def read_records_in_range(file_name: str, start: float, end: float) -> Iterator[LogRecord]:
+    return select_range(read_log_file(file_name), start, end)
+
+
+def read_logs_in_range(start: float, end: float) -> Iterator[LogRecord]:
+    """
+        Records from all log files overlapping time range, merged in timestamp order.
+        Files are streamed, only one record per file is kept in memory
+    """
+    readers = [read_records_in_range(file_name, start, end) for file_name in find_logs_in_range(start, end)]
+    return merge(*readers, key=lambda record: record.timestamp)
+
+
+def calculate_range_agregates(start: float, end: float) -> AggregatedLogData:
+    """
+        Every log file is aggregated separately, partial results are merged in time order
+    """
+    logger = logging.getLogger('greybike')
+    file_names = find_logs_in_range(start, end)
+    logger.debug('Aggregating %d log files', len(file_names))
+    if len(file_names) <= 1:
+        partials = [calculate_log_agregates(file_name, start, end) for file_name in file_names]
+    else:
+        partials = list(get_query_executor().map(
+            calculate_log_agregates, file_names, [start] * len(file_names), [end] * len(file_names)
+        ))
+    return reduce(merge_aggregates, partials, AggregatedLogData())
@@ -0,0 +1,167 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import date
+from functools import reduce
+from itertools import repeat
+import json
+import logging
+import os
+from constants import LOG_QUERY_WORKERS, STATS_CACHE_FILE, RIDE_GAP
+from data_types import AggregatedLogData, MessageType
+from storage import TelemetryStorage, open_storage
+from telemetry_logs import update_aggregates, merge_aggregates
+from utils import write_json_atomic
+
+
+@dataclass
+class PeriodStats:
+    """
+        Summary of one ride, day, week or month
+    """
+    period: str
+    distance: float
+    watt_hours_per_km: float | None
+    human_energy_share: float | None
+    max_motor_watts: float
+    max_speed: float
+    motor_watt_hours: float
+    human_watt_hours: float
+    regen_watt_hours: float
+
+
+def calculate_log_day_agregates(backend: str, log_name: str) -> dict[str, AggregatedLogData]:
+    """
+        Aggregates of one log split by calendar day. Rides can cross midnight.
+        Runs in worker process, so storage is opened by backend name
+    """
+    logger = logging.getLogger('greybike')
+    result: dict[str, AggregatedLogData] = {}
+    try:
+        for record in open_storage(backend).read_log(MessageType.CA, log_name):
+            day = date.fromtimestamp(record.timestamp).isoformat()
+            if day not in result:
+                result[day] = AggregatedLogData()
+            update_aggregates(result[day], record)
+    except ValueError as e:
+        logger.warning('Skipping log %s: %s', log_name, e)
+        return {}
+    return result
+
+
+def load_stats_cache() -> dict[str, dict]:
+    logger = logging.getLogger('greybike')
+    if not os.path.exists(STATS_CACHE_FILE):
+        return {}
+    try:
+        with open(STATS_CACHE_FILE) as cache_file:
+            return json.load(cache_file)
+    except ValueError:
+        logger.error('Stats cache is corrupted. Recalculating')
+        return {}
+
+
+def get_log_day_agregates(
+    storage: TelemetryStorage, workers: int | None = LOG_QUERY_WORKERS
+) -> dict[str, dict[str, AggregatedLogData]]:
+    """
+        Day aggregates for every log. Results are cached by log revision,
+        so only new or changed logs are processed
+    """
+    logger = logging.getLogger('greybike')
+    cache = load_stats_cache()
+    log_names = storage.list_logs()
+    revisions = {log_name: storage.get_log_revision(log_name) for log_name in log_names}
+    changed_logs = [
+        log_name for log_name in log_names
+        if log_name not in cache or cache[log_name].get('revision') != revisions[log_name]
+    ]
+    logger.info('Processing %d of %d logs', len(changed_logs), len(log_names))
+    if changed_logs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(calculate_log_day_agregates, repeat(storage.name), changed_logs)
+            for log_name, days in zip(changed_logs, results):
+                cache[log_name] = {
+                    'revision': revisions[log_name],
+                    'days': {day: asdict(aggregates) for day, aggregates in days.items()}
+                }
+    cache = {log_name: cache[log_name] for log_name in log_names} # Removed logs are dropped
+    if changed_logs or len(cache) != len(log_names):
+        write_json_atomic(STATS_CACHE_FILE, cache)
+    return {
+        log_name: {day: AggregatedLogData(**data) for day, data in entry['days'].items()}
+        for log_name, entry in cache.items()
+    }
+
+
+def get_period_stats(period: str, aggregates: AggregatedLogData) -> PeriodStats:
+    battery_watt_hours = aggregates.total_motor_watt_hours - aggregates.total_regen_watt_hours
+    total_watt_hours = aggregates.total_motor_watt_hours + aggregates.total_human_watt_hours
+    return PeriodStats(
+        period=period,
+        distance=aggregates.total_distance,
+        watt_hours_per_km=battery_watt_hours / aggregates.total_distance if aggregates.total_distance > 0 else None,
+        human_energy_share=aggregates.total_human_watt_hours / total_watt_hours if total_watt_hours > 0 else None,
+        max_motor_watts=aggregates.max_motor_watts,
+        max_speed=aggregates.max_speed,
+        motor_watt_hours=aggregates.total_motor_watt_hours,
+        human_watt_hours=aggregates.total_human_watt_hours,
+        regen_watt_hours=aggregates.total_regen_watt_hours,
+    )
+
+
+def group_rides(file_aggregates: list[tuple[str, AggregatedLogData]]) -> list[tuple[str, AggregatedLogData]]:
+    """
+        Consecutive log files without long pause between them belong to one ride
+    """
+    rides: list[tuple[str, AggregatedLogData]] = []
+    for file_name, aggregates in file_aggregates:
+        if aggregates.total_records == 0:
+            continue
+        if rides:
+            ride_name, ride = rides[-1]
+            if (
+                ride.last_timestamp is not None and aggregates.first_timestamp is not None
+                and 0 <= aggregates.first_timestamp - ride.last_timestamp < RIDE_GAP
+            ):
+                rides[-1] = (ride_name, merge_aggregates(ride, aggregates))
+                continue
+        rides.append((file_name.removesuffix('.log'), aggregates))
+    return rides
+
+
+def get_week(day: str) -> str:
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f'{year}-W{week:02d}'
+
+
+def get_month(day: str) -> str:
+    return day[:7]
+
+
+def calculate_stats(storage: TelemetryStorage) -> dict[str, list[PeriodStats]]:
+    """
+        Per ride, per day, per week and per month summaries of all logs
+    """
+    log_days = get_log_day_agregates(storage)
+    file_aggregates = sorted(
+        (
+            (file_name, reduce(merge_aggregates, [days[day] for day in sorted(days)], AggregatedLogData()))
+            for file_name, days in log_days.items()
+        ),
+        key=lambda item: item[1].first_timestamp or 0
+    )
+    day_aggregates = sorted(
+        ((day, aggregates) for days in log_days.values() for day, aggregates in days.items()),
+        key=lambda item: item[1].first_timestamp or 0
+    )
+    periods: dict[str, dict[str, AggregatedLogData]] = {'day': {}, 'week': {}, 'month': {}}
+    for day, aggregates in day_aggregates:
+        for period_type, period in (('day', day), ('week', get_week(day)), ('month', get_month(day))):
+            previous = periods[period_type].get(period, AggregatedLogData())
+            periods[period_type][period] = merge_aggregates(previous, aggregates)
+    result = {'ride': [get_period_stats(name, ride) for name, ride in group_rides(file_aggregates)]}
+    for period_type, period_aggregates in periods.items():
+        result[period_type] = [
+            get_period_stats(period, aggregates) for period, aggregates in sorted(period_aggregates.items())
+        ]
+    return result
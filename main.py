@@ -1,9 +1,13 @@
 from pathlib import Path
-from dataclasses import asdict
+from dataclasses import replace
+import asyncio
+import multiprocessing
 import os
+import signal
+import sys
+import time
 import psutil
 import logging
-import logging.config
 
 from aiohttp import web
 
@@ -16,47 +20,66 @@ from data_sources.ads import (
     electric_record_from_ads, get_ads_interface, get_i2c_interface, electric_record_from_random
 )
 from data_sources.gnss import gnss_from_serial, gnss_from_random, get_gnss_serial
+from data_sources.gpsd import gnss_from_gpsd
+from data_sources.replay import records_from_replay
+from data_sources.system import SystemSampler
 from constants import (
-    TELEMETRY_LOG_DIRECTORY, LOGGING_CONFIG, DEV_MODE, SPA_HTML_FILE,
+    TELEMETRY_LOG_DIRECTORY, DEV_MODE, SPA_HTML_FILE, LOG_COUNTERS_INTERVAL,
     CA_TELEMETRY_READ_INTERVAL, CA_TELEMETRY_LOG_INTERVAL, CA_TELEMETRY_SEND_INTERVAL,
     ELECTRIC_RECORD_READ_INTERVAL, ELECTRIC_RECORD_SEND_INTERVAL,
-    GNSS_READ_INTERVAL, GNSS_SEND_INTERVAL,
-    SYSTEM_PARAMS_READ_INTERVAL, SYSTEM_PARAMS_SEND_INTERVAL, 
-    APP_LOG_DIRECTORY, PING_INTERVAL, SERVER_PORT, MANIFEST_FILE
+    GNSS_READ_INTERVAL, GNSS_SEND_INTERVAL, GNSS_SOURCE, GPSD_HOST, GPSD_PORT,
+    SYSTEM_PARAMS_READ_INTERVAL, SYSTEM_PARAMS_SEND_INTERVAL, ROLLING_STATS_SEND_INTERVAL,
+    TRIP_SEND_INTERVAL, TRIP_CHECKPOINT_INTERVAL, CHART_SEND_INTERVAL, LOG_FLUSH_INTERVAL,
+    ROUTE_SEND_INTERVAL, GEO_INDEX_SAVE_INTERVAL, LOOP_LAG_INTERVAL, MULTIPROCESS_MODE,
+    TELEMETRY_BUS_READ_INTERVAL, TELEMETRY_BUS_SLOTS, TELEMETRY_BUS_SLOT_SIZE, ACQUISITION_STOP_TIMEOUT,
+    APP_LOG_DIRECTORY, PING_INTERVAL, SERVER_PORT, MANIFEST_FILE, MEMORY_PROFILING, ACQUISITION_MEMORY_REPORT_FILE
 )
-from utils import check_running_on_pi, get_last_record, send_ws_message
+from utils import get_last_record, send_ws_message, write_json_atomic
 from handlers import (
     websocket_handler, spa_asset_handler, icons_handler,
-    reset_log_handler, get_file_serve_handler
+    reset_log_handler, reset_trip_handler, get_file_serve_handler, log_aggregates_handler, rides_in_area_handler,
+    log_route_handler, log_segments_handler, log_export_handler, memory_handler, range_chart_handler
 )
-from data_types import AppState, CATelemetryRecord, MessageType, SystemTelemetryRecord
-from tasks import create_periodic_task
-from telemetry_logs import write_to_log, reset_log
+from data_types import AppState, CATelemetryRecord, MessageType, get_current_timestamp
+from tasks import create_periodic_task, create_background_task
+from load_governor import TaskPriority
+from telemetry_logs import (
+    write_to_log, reset_log, close_log, log_flush_task, get_storage
+)
+from storage import open_storage
+from ingest import ingest_record, telemetry_bus_read_task
+from serializers import record_to_dict
+from telemetry_bus import TelemetryBus
+from geo_query import load_geo_index, save_geo_index, update_geo_index
+from log_query import get_query_executor, shutdown_query_executor
+from charts import chart_send_task
+from route import route_send_task
+from trip import load_trip_checkpoint, write_trip_checkpoint, trip_checkpoint_task
 from wifi import ping_router
+from startup_profile import StartupProfile, startup_phase
+from memory_profile import MemoryProfiler
+from app_logging import configure_logging, start_log_listener, log_event_counters
 
 
-if check_running_on_pi():
-    from gpiozero import CPUTemperature # type: ignore
-else:
-    CPUTemperature = None
+configure_logging()
 
 
-logging.config.dictConfig(LOGGING_CONFIG)
+async def read_system_params(state: AppState):
+    if state.system_sampler is not None:
+        record = state.system_sampler.sample()
+        load_level = state.load_governor.update(record.loop_lag, record.cpu_temp, record.timestamp)
+        ingest_record(state, MessageType.SYSTEM, replace(record, load_level=load_level))
 
 
-async def read_system_params(state: AppState):
-    record = SystemTelemetryRecord(
-        cpu_temp=None if CPUTemperature is None else CPUTemperature().temperature,
-        cpu_usage=psutil.cpu_percent(),
-        memory_usage=psutil.virtual_memory().percent
-    )
-    state.system_telemetry_records.append(record)
+async def loop_lag_task(state: AppState):
+    if state.system_sampler is not None:
+        state.system_sampler.add_loop_wakeup(asyncio.get_running_loop().time(), LOOP_LAG_INTERVAL)
 
 
 async def send_system_params(state: AppState):
     last_record = get_last_record(state.system_telemetry_records, SYSTEM_PARAMS_READ_INTERVAL)
     if last_record is not None:
-        await send_ws_message(state, MessageType.SYSTEM, asdict(last_record))
+        await send_ws_message(state, MessageType.SYSTEM, record_to_dict(last_record))
 
 
 def read_ca_telemetry_record(state: AppState) -> CATelemetryRecord | None:
@@ -74,7 +97,7 @@ def read_ca_telemetry_record(state: AppState) -> CATelemetryRecord | None:
 async def ca_telemetry_read_task(state: AppState):
     telemetry = read_ca_telemetry_record(state)
     if telemetry is not None:
-        state.ca_telemetry_records.append(telemetry)
+        ingest_record(state, MessageType.CA, telemetry)
 
 
 async def ca_telemetry_log_task(state: AppState):
@@ -87,7 +110,7 @@ async def ca_telemetry_log_task(state: AppState):
 async def ca_telemetry_websocket_task(state: AppState):
     last_record = get_last_record(state.ca_telemetry_records, CA_TELEMETRY_READ_INTERVAL)
     if last_record is not None:
-        await send_ws_message(state, MessageType.CA, asdict(last_record))
+        await send_ws_message(state, MessageType.CA, record_to_dict(last_record))
 
 
 async def gnss_read_task(state: AppState):
@@ -98,13 +121,30 @@ async def gnss_read_task(state: AppState):
         if state.gnss_serial is not None:
             gnss_record = gnss_from_serial(state.gnss_serial)
     if gnss_record is not None:
-        state.gnss_records.append(gnss_record)
+        ingest_record(state, MessageType.GNSS, gnss_record)
+
+
+async def gpsd_read_task(state: AppState):
+    logger = logging.getLogger('greybike')
+    async for gnss_record in gnss_from_gpsd(GPSD_HOST, GPSD_PORT):
+        # Background task is not restarted like periodic tasks, so one failed record must not end the stream
+        try:
+            ingest_record(state, MessageType.GNSS, gnss_record)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error('Error ingesting gpsd record: %r', e)
+
+
+async def replay_read_task(state: AppState):
+    if state.replay_log_file is None:
+        return
+    async for message_type, record in records_from_replay(state.replay_log_file):
+        ingest_record(state, message_type, record)
 
 
 async def gnss_send_task(state: AppState):
     last_record = get_last_record(state.gnss_records, GNSS_READ_INTERVAL)
     if last_record is not None:
-        await send_ws_message(state, MessageType.GNSS, asdict(last_record))
+        await send_ws_message(state, MessageType.GNSS, record_to_dict(last_record))
 
 
 async def electric_telemetry_read_task(state: AppState):
@@ -115,55 +155,217 @@ async def electric_telemetry_read_task(state: AppState):
     if state.ads is not None:
         record = electric_record_from_ads(state.ads)
     if record is not None:
-        state.electric_records.append(record)
+        ingest_record(state, MessageType.ELECTRIC, record)
 
 
 async def electric_telemetry_send_task(state: AppState):
     last_record = get_last_record(state.electric_records, ELECTRIC_RECORD_READ_INTERVAL)
     if last_record is not None:
-        await send_ws_message(state, MessageType.ELECTRIC, asdict(last_record))
+        await send_ws_message(state, MessageType.ELECTRIC, record_to_dict(last_record))
 
 
-async def on_shutdown(app: web.Application):
-    state: AppState = app['state']
+async def rolling_stats_send_task(state: AppState):
+    await send_ws_message(state, MessageType.STATS, state.rolling_stats.to_dict(get_current_timestamp()))
+
+
+async def trip_send_task(state: AppState):
+    await send_ws_message(state, MessageType.TRIP, record_to_dict(state.trip))
+
+
+async def geo_index_save_task(state: AppState):
+    save_geo_index(get_storage(state), state.geo_index)
+
+
+async def geo_index_reload_task(state: AppState):
+    # Index is updated and saved by acquisition process in multi-process mode
+    state.geo_index = load_geo_index()
+
+
+async def event_counters_task(state: AppState):
+    log_event_counters()
+
+
+async def log_reset_task(state: AppState):
+    if state.bus_writer is not None and state.bus_writer.take_log_reset_request():
+        reset_log(state)
+
+
+async def memory_report_task(state: AppState):
+    """
+        Acquisition process has no web server. Report requested through bus is written to file for web process
+    """
+    if state.bus_writer is None or state.memory_profiler is None:
+        return
+    request = state.bus_writer.take_memory_report_request()
+    if request is not None:
+        report = await asyncio.to_thread(state.memory_profiler.report)
+        await asyncio.to_thread(
+            write_json_atomic, ACQUISITION_MEMORY_REPORT_FILE, {'request': request, 'report': report}
+        )
+
+
+def open_data_sources(state: AppState, profile: StartupProfile):
+    # Driver modules are imported by these calls, only for enabled sources
+    with startup_phase(profile, 'cycle analyst'):
+        state.ca_hardware_serial = get_ca_hardware_serial()
+        state.ca_software_serial = get_ca_software_serial()
+    with startup_phase(profile, 'ads'):
+        state.i2c = get_i2c_interface()
+        if state.i2c is not None:
+            state.ads = get_ads_interface(state.i2c)
+    if GNSS_SOURCE == 'serial':
+        with startup_phase(profile, 'gnss serial'):
+            state.gnss_serial = get_gnss_serial()
+
+
+def close_data_sources(state: AppState):
     if state.ca_hardware_serial is not None:
         state.ca_hardware_serial.close()
     if state.ca_software_serial is not None:
         close_software_serial(state.ca_software_serial)
     if state.gnss_serial is not None:
         state.gnss_serial.close()
-    if state.log_file is not None:
-        state.log_file.close()
+
+
+def create_read_tasks(state: AppState):
+    if state.replay_log_file is not None:
+        create_background_task(replay_read_task, state, name="Replay Log")
+        return
+    if GNSS_SOURCE == 'gpsd' and not DEV_MODE:
+        create_background_task(gpsd_read_task, state, name="Read GNSS from gpsd")
+    else:
+        create_periodic_task(gnss_read_task, state, name="Read GNSS", interval=GNSS_READ_INTERVAL)
+    create_periodic_task(ca_telemetry_read_task, state, name="Cycle Analyst Telemetry", interval=CA_TELEMETRY_READ_INTERVAL)
+    create_periodic_task(electric_telemetry_read_task, state, name="Read Electric Telemetry", interval=ELECTRIC_RECORD_READ_INTERVAL)
+
+
+def create_acquisition_tasks(state: AppState):
+    create_read_tasks(state)
+    create_periodic_task(ca_telemetry_log_task, state, name="Cycle Analyst Log", interval=CA_TELEMETRY_LOG_INTERVAL)
+    create_periodic_task(log_flush_task, state, name="Flush Log", interval=LOG_FLUSH_INTERVAL)
+    create_periodic_task(geo_index_save_task, state, name="Save GNSS Index", interval=GEO_INDEX_SAVE_INTERVAL, priority=TaskPriority.OPTIONAL)
+    create_periodic_task(event_counters_task, state, name="Log Event Counters", interval=LOG_COUNTERS_INTERVAL, priority=TaskPriority.OPTIONAL)
+
+
+async def run_acquisition(state: AppState):
+    logger = logging.getLogger('greybike')
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+    create_acquisition_tasks(state)
+    create_periodic_task(log_reset_task, state, name="Log Reset Requests", interval=TELEMETRY_BUS_READ_INTERVAL)
+    if state.memory_profiler is not None:
+        create_periodic_task(memory_report_task, state, name="Memory Report Requests", interval=TELEMETRY_BUS_READ_INTERVAL)
+    await stop.wait()
+    for task_data in state.tasks:
+        task_data.task.cancel()
+    close_data_sources(state)
+    close_log(state)
+    save_geo_index(get_storage(state), state.geo_index)
+    logger.info('Acquisition process stopped')
+
+
+def acquisition_process_main(bus: TelemetryBus, log_files: list[str]):
+    """
+        Owns sensors and telemetry logs. Records are published to web process through shared memory bus,
+        so websocket clients and log queries never delay sensor reads
+    """
+    listener = start_log_listener() # Web process starts its listener after fork
+    logger = logging.getLogger('greybike')
+    bus.is_owner = False
+    profile = StartupProfile(process_start=time.time())
+    state = AppState(log_files=log_files, geo_index=load_geo_index(), bus_writer=bus, storage=open_storage())
+    # Tracing started by web process continues after fork, child keeps its own snapshots
+    state.memory_profiler = MemoryProfiler() if MEMORY_PROFILING else None
+    if not DEV_MODE:
+        open_data_sources(state, profile)
+    reset_log(state)
+    logger.info('Acquisition process %d started %s', os.getpid(), profile.phases)
+    try:
+        asyncio.run(run_acquisition(state))
+    finally:
+        # multiprocessing ends child with os._exit, so atexit handlers do not flush the queue
+        listener.stop()
+
+
+def start_acquisition_process(state: AppState):
+    # Fork is used before event loop is started, so process starts without importing modules again
+    bus = TelemetryBus(TELEMETRY_BUS_SLOTS, TELEMETRY_BUS_SLOT_SIZE)
+    process = multiprocessing.get_context('fork').Process(
+        target=acquisition_process_main, args=(bus, list(state.log_files)), name='greybike-acquisition'
+    )
+    process.start()
+    state.bus_reader = bus
+    state.acquisition_process = process
+
+
+async def stop_acquisition_process(state: AppState):
+    logger = logging.getLogger('greybike')
+    process = state.acquisition_process
+    if process is None:
+        return
+    process.terminate()
+    await asyncio.to_thread(process.join, ACQUISITION_STOP_TIMEOUT)
+    if process.is_alive():
+        logger.error('Acquisition process did not stop, killing it')
+        process.kill()
+    state.acquisition_process = None
+
+
+async def on_shutdown(app: web.Application):
+    state: AppState = app['state']
+    await stop_acquisition_process(state)
+    close_data_sources(state)
+    if state.system_sampler is not None:
+        state.system_sampler.close()
+    if state.bus_reader is not None:
+        state.bus_reader.close()
+    else:
+        close_log(state)
+        save_geo_index(get_storage(state), state.geo_index)
+    write_trip_checkpoint(state.trip)
+    shutdown_query_executor()
     for ws in state.websockets:
         await ws.close(code=999, message=b'Server shutdown')
 
 
-async def start_background_tasks(app: web.Application):
-    state: AppState = app['state']
+def create_service_tasks(state: AppState):
+    """
+        All periodic work of web process. Also used by simulation, which runs it without web server
+    """
     if not DEV_MODE:
-        create_periodic_task(ping_router, state, name="Router Ping", interval=PING_INTERVAL)
-    create_periodic_task(gnss_read_task, state, name="Read GNSS", interval=GNSS_READ_INTERVAL)
-    create_periodic_task(gnss_send_task, state, name="Send GNSS", interval=GNSS_SEND_INTERVAL)
-    create_periodic_task(ca_telemetry_read_task, state, name="Cycle Analyst Telemetry", interval=CA_TELEMETRY_READ_INTERVAL)
-    create_periodic_task(ca_telemetry_log_task, state, name="Cycle Analyst Log", interval=CA_TELEMETRY_LOG_INTERVAL)
+        create_periodic_task(ping_router, state, name="Router Ping", interval=PING_INTERVAL, priority=TaskPriority.OPTIONAL)
+    if state.bus_reader is not None:
+        create_periodic_task(telemetry_bus_read_task, state, name="Read Telemetry Bus", interval=TELEMETRY_BUS_READ_INTERVAL)
+        create_periodic_task(geo_index_reload_task, state, name="Reload GNSS Index", interval=GEO_INDEX_SAVE_INTERVAL, priority=TaskPriority.OPTIONAL)
+    else:
+        create_acquisition_tasks(state)
+    create_periodic_task(gnss_send_task, state, name="Send GNSS", interval=GNSS_SEND_INTERVAL, priority=TaskPriority.REDUCIBLE)
     create_periodic_task(ca_telemetry_websocket_task, state, name="Send CA Telemetry", interval=CA_TELEMETRY_SEND_INTERVAL)
-    create_periodic_task(electric_telemetry_read_task, state, name="Read Electric Telemetry", interval=ELECTRIC_RECORD_READ_INTERVAL)
     create_periodic_task(electric_telemetry_send_task, state, name="Send Electric Telemetry", interval=ELECTRIC_RECORD_SEND_INTERVAL)
     create_periodic_task(read_system_params, state, name="Read System Params", interval=SYSTEM_PARAMS_READ_INTERVAL)
-    create_periodic_task(send_system_params, state, name="Send System Params", interval=SYSTEM_PARAMS_SEND_INTERVAL)
+    create_periodic_task(loop_lag_task, state, name="Measure Loop Lag", interval=LOOP_LAG_INTERVAL)
+    create_periodic_task(send_system_params, state, name="Send System Params", interval=SYSTEM_PARAMS_SEND_INTERVAL, priority=TaskPriority.REDUCIBLE)
+    create_periodic_task(rolling_stats_send_task, state, name="Send Rolling Stats", interval=ROLLING_STATS_SEND_INTERVAL, priority=TaskPriority.OPTIONAL)
+    create_periodic_task(trip_send_task, state, name="Send Trip", interval=TRIP_SEND_INTERVAL)
+    create_periodic_task(trip_checkpoint_task, state, name="Trip Checkpoint", interval=TRIP_CHECKPOINT_INTERVAL)
+    create_periodic_task(chart_send_task, state, name="Send Charts", interval=CHART_SEND_INTERVAL, priority=TaskPriority.OPTIONAL)
+    create_periodic_task(route_send_task, state, name="Send Route", interval=ROUTE_SEND_INTERVAL, priority=TaskPriority.OPTIONAL)
+
+
+async def start_background_tasks(app: web.Application):
+    create_service_tasks(app['state'])
 
 
 async def cleanup_background_tasks(app: web.Application):
     logger = logging.getLogger('greybike')
     state: AppState = app['state']
     for task_data in state.tasks:
-        logger.info(f'Cancelling task {task_data.name}')
+        logger.info('Cancelling task %s', task_data.name)
         task_data.task.cancel()
 
 
-def get_all_log_files():
-    return os.listdir(TELEMETRY_LOG_DIRECTORY)
-
 def setup_routes(app: web.Application):
     app.add_routes([
         web.get('/', get_file_serve_handler(SPA_HTML_FILE)),
@@ -171,26 +373,56 @@ def setup_routes(app: web.Application):
         web.get('/manifest.json', get_file_serve_handler(MANIFEST_FILE)),
         web.get('/assets/{file}', spa_asset_handler),
         web.get('/icons/{file}', icons_handler),
-        web.post('/reset_log', reset_log_handler)
+        web.post('/reset_log', reset_log_handler),
+        web.post('/reset_trip', reset_trip_handler),
+        web.get('/api/aggregates', log_aggregates_handler),
+        web.get('/api/chart', range_chart_handler),
+        web.get('/api/rides', rides_in_area_handler),
+        web.get('/api/logs/{name}/route', log_route_handler),
+        web.get('/api/logs/{name}/segments', log_segments_handler),
+        web.get('/api/logs/{name}/export', log_export_handler)
     ])
+    if MEMORY_PROFILING:
+        app.add_routes([web.get('/debug/memory', memory_handler)])
 
 def create_dirs():
     Path(TELEMETRY_LOG_DIRECTORY).mkdir(parents=True, exist_ok=True)
     Path(APP_LOG_DIRECTORY).mkdir(parents=True, exist_ok=True)
 
 def init():
+    profile = StartupProfile(process_start=psutil.Process().create_time())
+    profile.add_phase('interpreter and imports', profile.process_start, time.time())
     create_dirs()
+    # Started before state restore, so buffers and indexes loaded from disk are traced too
+    memory_profiler = MemoryProfiler() if MEMORY_PROFILING else None
     app = web.Application()
-    state = AppState(log_files=get_all_log_files())
+    with startup_phase(profile, 'state restore'):
+        storage = open_storage()
+        state = AppState(
+            log_files=storage.list_logs(),
+            trip=load_trip_checkpoint(),
+            geo_index=load_geo_index(),
+            startup_profile=profile,
+            memory_profiler=memory_profiler,
+            storage=storage
+        )
+        state.trip_checkpoint_records = state.trip.total_records
     app['state'] = state
-    if not DEV_MODE:
-        state.ca_hardware_serial = get_ca_hardware_serial()
-        state.ca_software_serial = get_ca_software_serial()
-        state.i2c = get_i2c_interface()
-        if state.i2c is not None:
-            state.ads = get_ads_interface(state.i2c)
-        state.gnss_serial = get_gnss_serial()
-    reset_log(state)
+    with startup_phase(profile, 'log recovery'):
+        if state.log_files:
+            # Last log could be cut by power loss
+            get_storage(state).recover(state.log_files[-1])
+        update_geo_index(get_storage(state), state.geo_index, state.log_files)
+    if MULTIPROCESS_MODE:
+        with startup_phase(profile, 'acquisition process'):
+            start_acquisition_process(state)
+    else:
+        if not DEV_MODE:
+            open_data_sources(state, profile)
+        reset_log(state)
+    start_log_listener() # After fork, so acquisition process does not copy locks held by listener thread
+    state.system_sampler = SystemSampler()
+    get_query_executor() # Worker processes are started on first query
     setup_routes(app)
     app.on_startup.append(start_background_tasks)
     app.on_cleanup.append(cleanup_background_tasks)
@@ -201,6 +433,9 @@ def init():
 def start_server():
     app = init()
     web.run_app(app=app, host='0.0.0.0', port=SERVER_PORT) # type: ignore
+    state: AppState = app['state']
+    if state.exit_code:
+        sys.exit(state.exit_code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+from dataclasses import dataclass, asdict
+from typing import Any
+import os
+import threading
+import tracemalloc
+from constants import SOURCE_DIR, MEMORY_TRACE_FRAMES, MEMORY_TOP_ALLOCATIONS
+
+SITE_PACKAGES = f'{os.sep}site-packages{os.sep}'
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+]
+
+
+@dataclass
+class GroupUsage:
+    """
+        Memory allocated by one part of the app and still alive.
+
+        Attributes:
+            name (str): Top level module or package of greybike, or library for allocations without greybike frames.
+            size (int): Allocated bytes.
+            count (int): Number of allocated blocks.
+            growth (int): Size change since previous snapshot in bytes.
+            total_growth (int): Size change since the first snapshot in bytes.
+    """
+    name: str
+    size: int
+    count: int
+    growth: int = 0
+    total_growth: int = 0
+
+
+def get_location(frame: tracemalloc.Frame) -> str:
+    if frame.filename.startswith(SOURCE_DIR + os.sep):
+        return f'{os.path.relpath(frame.filename, SOURCE_DIR)}:{frame.lineno}'
+    if SITE_PACKAGES in frame.filename:
+        return f'{frame.filename.split(SITE_PACKAGES, 1)[1]}:{frame.lineno}'
+    return f'{os.path.basename(frame.filename)}:{frame.lineno}'
+
+
+def get_group(traceback: tracemalloc.Traceback) -> str:
+    """
+        Allocation is counted for the most recent greybike frame, so memory allocated by libraries
+        on behalf of greybike code belongs to the calling module (for example aiohttp buffers of handlers).
+        Allocations without greybike frames are counted for library package of the most recent frame
+    """
+    for frame in reversed(traceback):
+        if frame.filename.startswith(SOURCE_DIR + os.sep):
+            return os.path.relpath(frame.filename, SOURCE_DIR).split(os.sep)[0].removesuffix('.py')
+    filename = traceback[-1].filename
+    if SITE_PACKAGES in filename:
+        return filename.split(SITE_PACKAGES, 1)[1].split(os.sep)[0].removesuffix('.py')
+    return f'python:{os.path.basename(filename).removesuffix(".py")}'
+
+
+def get_group_usage(snapshot: tracemalloc.Snapshot) -> dict[str, GroupUsage]:
+    groups: dict[str, GroupUsage] = {}
+    for statistic in snapshot.statistics('traceback'):
+        name = get_group(statistic.traceback)
+        usage = groups.setdefault(name, GroupUsage(name=name, size=0, count=0))
+        usage.size += statistic.size
+        usage.count += statistic.count
+    return groups
+
+
+class MemoryProfiler:
+    """
+        tracemalloc snapshots grouped by greybike modules.
+        Only the previous snapshot is kept for line level growth, the first one is kept as group totals.
+        Tracing slows allocations down and uses memory itself, so it is enabled only on demand.
+        Reports are taken in executor threads, lock keeps concurrent requests from mixing previous snapshots
+    """
+
+    def __init__(self, frames: int = MEMORY_TRACE_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.previous: tracemalloc.Snapshot | None = None
+        self.previous_groups: dict[str, GroupUsage] = {}
+        self.first_groups: dict[str, GroupUsage] | None = None
+        self.lock = threading.Lock()
+
+    def report(self, top: int = MEMORY_TOP_ALLOCATIONS) -> dict[str, Any]:
+        with self.lock:
+            return self._report(top)
+
+    def _report(self, top: int) -> dict[str, Any]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        groups = get_group_usage(snapshot)
+        if self.first_groups is None:
+            self.first_groups = self.previous_groups = groups
+        for name, usage in groups.items():
+            previous = self.previous_groups.get(name)
+            first = self.first_groups.get(name)
+            usage.growth = usage.size - (previous.size if previous is not None else 0)
+            usage.total_growth = usage.size - (first.size if first is not None else 0)
+        traced, peak = tracemalloc.get_traced_memory()
+        result: dict[str, Any] = {
+            'traced': traced,
+            'peak': peak,
+            'groups': [asdict(usage) for usage in sorted(groups.values(), key=lambda usage: usage.size, reverse=True)],
+            'top': [
+                {'location': get_location(statistic.traceback[0]), 'size': statistic.size, 'count': statistic.count}
+                for statistic in snapshot.statistics('lineno')[:top]
+            ],
+            'top_growth': [],
+        }
+        if self.previous is not None:
+            result['top_growth'] = [
+                {'location': get_location(diff.traceback[0]), 'size_diff': diff.size_diff, 'count_diff': diff.count_diff}
+                for diff in snapshot.compare_to(self.previous, 'lineno')[:top]
+            ]
+        self.previous = snapshot
+        self.previous_groups = groups
+        return result
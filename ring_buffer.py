@@ -0,0 +1,148 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import fields
+from types import UnionType
+from typing import Any, Generic, Iterator, TypeVar
+import math
+
+RecordType = TypeVar('RecordType')
+
+NUMERIC_TYPES = (float, int, bool)
+
+
+def _numeric_type(field_type: Any) -> type | None:
+    """
+        Returns python type for numeric fields (float, int, bool and their optional versions)
+        None is returned for fields which can not be stored in array('d')
+    """
+    if field_type in NUMERIC_TYPES:
+        return field_type
+    if isinstance(field_type, UnionType):
+        args = [arg for arg in field_type.__args__ if arg is not type(None)]
+        if len(args) == 1 and args[0] in NUMERIC_TYPES:
+            return args[0]
+    return None
+
+
+class RecordRingBuffer(Generic[RecordType]):
+    """
+        Fixed size columnar buffer for records of one dataclass type.
+        Every numeric field has its own preallocated array('d'), None values are stored as NaN.
+        Other fields (like CA flags) are kept in a preallocated list.
+        Each numeric value is written twice (at position and position + capacity),
+        so any time window is contiguous and returned as memoryview without copying
+    """
+
+    def __init__(self, record_type: type[RecordType], capacity: int):
+        self.record_type = record_type
+        self.capacity = capacity
+        self.fields = [field.name for field in fields(record_type)] # type: ignore
+        self.field_types: dict[str, type] = {}
+        self.optional_fields: set[str] = set()
+        self.columns: dict[str, array[float]] = {}
+        self.object_columns: dict[str, list[Any]] = {}
+        for field in fields(record_type): # type: ignore
+            numeric_type = _numeric_type(field.type)
+            if numeric_type is None:
+                self.object_columns[field.name] = [None] * capacity
+                continue
+            self.field_types[field.name] = numeric_type
+            if numeric_type is not field.type:
+                self.optional_fields.add(field.name)
+            self.columns[field.name] = array('d', [math.nan]) * (capacity * 2)
+        self.count = 0 # Total number of appended records
+        self.last_record: RecordType | None = None
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def _start_position(self) -> int:
+        return (self.count - len(self)) % self.capacity
+
+    def append(self, record: RecordType):
+        position = self.count % self.capacity
+        for name, column in self.columns.items():
+            value = getattr(record, name)
+            value = math.nan if value is None else float(value)
+            column[position] = value
+            column[position + self.capacity] = value
+        for name, column in self.object_columns.items():
+            column[position] = getattr(record, name)
+        self.count += 1
+        self.last_record = record
+
+    def clear(self):
+        self.count = 0
+        self.last_record = None
+
+    def latest(self, name: str) -> float | None:
+        """
+            Latest value of numeric field without record construction
+        """
+        if self.count == 0:
+            return None
+        value = self.columns[name][(self.count - 1) % self.capacity]
+        return None if math.isnan(value) else value
+
+    def _value(self, name: str, position: int) -> Any:
+        if name in self.object_columns:
+            return self.object_columns[name][position % self.capacity]
+        value = self.columns[name][position]
+        if math.isnan(value) and name in self.optional_fields:
+            return None
+        return self.field_types[name](value)
+
+    def _physical_position(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError('RecordRingBuffer index out of range')
+        return self._start_position() + index
+
+    def __getitem__(self, index: int) -> RecordType:
+        if index == -1 and self.last_record is not None:
+            return self.last_record
+        position = self._physical_position(index)
+        return self.record_type(**{name: self._value(name, position) for name in self.fields})
+
+    def __iter__(self) -> Iterator[RecordType]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def window(self, start: float | None = None, end: float | None = None) -> slice:
+        """
+            Index range of records with start <= timestamp <= end.
+            Timestamps are expected to be non decreasing
+        """
+        timestamps = self.column('timestamp')
+        start_index = 0 if start is None else bisect_left(timestamps, start)
+        end_index = len(timestamps) if end is None else bisect_right(timestamps, end)
+        return slice(start_index, max(start_index, end_index))
+
+    def column(self, name: str, index_range: slice | None = None) -> memoryview:
+        """
+            Contiguous view of numeric column values ordered from oldest to newest
+        """
+        start_position = self._start_position()
+        view = memoryview(self.columns[name])[start_position:start_position + len(self)]
+        if index_range is not None:
+            return view[index_range]
+        return view
+
+    def last_seconds(self, name: str, seconds: float) -> memoryview:
+        latest_timestamp = self.latest('timestamp')
+        if latest_timestamp is None:
+            return self.column(name)
+        return self.column(name, self.window(latest_timestamp - seconds))
+
+    def rows(self, index_range: slice | None = None) -> list[list[Any]]:
+        """
+            Records as lists of values in self.fields order. NaN values are replaced with None
+        """
+        start_position = self._start_position()
+        start, stop, _ = (index_range or slice(None)).indices(len(self))
+        return [
+            [self._value(name, start_position + index) for name in self.fields]
+            for index in range(start, stop)
+        ]
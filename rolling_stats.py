@@ -0,0 +1,139 @@
+from collections import deque
+from dataclasses import fields
+from typing import Any
+from constants import ROLLING_STATS_WINDOWS, MAX_SAMPLE_DURATION
+
+SKIPPED_FIELDS = {'timestamp', 'mode'}
+
+
+class SlidingWindow:
+    """
+        Time based sliding window with O(1) amortized mean, min and max.
+        Min and max are tracked with monotonic queues
+    """
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.values: deque[tuple[float, float]] = deque()
+        self.min_values: deque[tuple[float, float]] = deque()
+        self.max_values: deque[tuple[float, float]] = deque()
+        self.total = 0.0
+
+    def add(self, timestamp: float, value: float):
+        self.values.append((timestamp, value))
+        self.total += value
+        while self.min_values and self.min_values[-1][1] >= value:
+            self.min_values.pop()
+        self.min_values.append((timestamp, value))
+        while self.max_values and self.max_values[-1][1] <= value:
+            self.max_values.pop()
+        self.max_values.append((timestamp, value))
+        self.evict(timestamp)
+
+    def evict(self, now: float):
+        threshold = now - self.duration
+        while self.values and self.values[0][0] <= threshold:
+            _, value = self.values.popleft()
+            self.total -= value
+        while self.min_values and self.min_values[0][0] <= threshold:
+            self.min_values.popleft()
+        while self.max_values and self.max_values[0][0] <= threshold:
+            self.max_values.popleft()
+        if not self.values:
+            self.total = 0.0 # Drop accumulated float error when window is empty
+
+    def to_dict(self) -> dict[str, float] | None:
+        if not self.values:
+            return None
+        return {
+            'mean': self.total / len(self.values),
+            'min': self.min_values[0][1],
+            'max': self.max_values[0][1],
+        }
+
+
+class ChannelStats:
+    """
+        Sliding windows of all configured durations for one numeric channel
+    """
+
+    def __init__(self):
+        self.windows = [SlidingWindow(duration) for duration in ROLLING_STATS_WINDOWS]
+
+    def add(self, timestamp: float, value: float):
+        for window in self.windows:
+            window.add(timestamp, value)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {str(window.duration): window.to_dict() for window in self.windows}
+
+
+class EnergyStats:
+    """
+        Energy in watt hours integrated over every sliding window
+    """
+
+    def __init__(self):
+        self.windows = [SlidingWindow(duration) for duration in ROLLING_STATS_WINDOWS]
+
+    def add(self, timestamp: float, watts: float, duration: float):
+        watt_hours = watts * duration / 3600
+        for window in self.windows:
+            window.add(timestamp, watt_hours)
+
+    def to_dict(self) -> dict[str, float]:
+        return {str(window.duration): window.total for window in self.windows}
+
+
+class RollingStats:
+    """
+        Rolling window statistics for every numeric channel of every stream, updated on record ingest
+    """
+
+    def __init__(self, energy_channels: tuple[str, ...]):
+        self.channels: dict[str, dict[str, ChannelStats]] = {}
+        self.energy = {name: EnergyStats() for name in energy_channels}
+        self.last_timestamps: dict[str, float] = {}
+
+    def add_value(self, stream_name: str, name: str, timestamp: float, value: float):
+        stream = self.channels.setdefault(stream_name, {})
+        if name not in stream:
+            stream[name] = ChannelStats()
+        stream[name].add(timestamp, value)
+
+    def add_energy(self, name: str, timestamp: float, watts: float, duration: float):
+        self.energy[name].add(timestamp, watts, duration)
+
+    def add_record(self, stream_name: str, record: Any) -> float:
+        """
+            Adds all numeric fields of record.
+            Returns duration since previous record of the stream for energy calculation
+        """
+        timestamp = record.timestamp
+        previous_timestamp = self.last_timestamps.get(stream_name)
+        self.last_timestamps[stream_name] = timestamp
+        for field in fields(record):
+            name = field.name
+            value = getattr(record, name)
+            if name in SKIPPED_FIELDS or isinstance(value, (bool, str)) or value is None:
+                continue
+            self.add_value(stream_name, name, timestamp, value)
+        duration = timestamp - previous_timestamp if previous_timestamp is not None else 0
+        if duration < 0 or duration > MAX_SAMPLE_DURATION:
+            duration = 0
+        return duration
+
+    def to_dict(self, now: float) -> dict[str, Any]:
+        for stream in self.channels.values():
+            for channel in stream.values():
+                for window in channel.windows:
+                    window.evict(now)
+        for energy in self.energy.values():
+            for window in energy.windows:
+                window.evict(now)
+        result: dict[str, Any] = {
+            stream_name: {name: channel.to_dict() for name, channel in stream.items()}
+            for stream_name, stream in self.channels.items()
+        }
+        result['energy'] = {name: energy.to_dict() for name, energy in self.energy.items()}
+        return result
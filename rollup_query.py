@@ -0,0 +1,101 @@
+from typing import Any, Iterable, Iterator
+import os
+import threading
+from constants import ROLLUP_LEVELS, TELEMETRY_LOG_DIRECTORY
+from data_types import MessageType
+from log_query import select_range
+from rollups import ROLLUP_CHANNELS, ROLLUP_STATS, get_channel_values
+from storage import TelemetryStorage
+from telemetry_logs import build_rollups, get_rollup_log_name, parse_log_values, read_companion_log_file
+
+RAW_LEVEL = 0
+build_locks: dict[str, threading.Lock] = {}
+build_locks_lock = threading.Lock()
+
+
+def has_rollups(log_file_name: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(TELEMETRY_LOG_DIRECTORY, get_rollup_log_name(log_file_name, message_type, level)))
+        for message_type in ROLLUP_CHANNELS for level in ROLLUP_LEVELS
+    )
+
+
+def ensure_rollups(log_file_name: str):
+    """
+        Chart requests run in executor threads. Concurrent requests wait for one build of the same log
+    """
+    with build_locks_lock:
+        lock = build_locks.setdefault(log_file_name, threading.Lock())
+    with lock:
+        if not has_rollups(log_file_name):
+            build_rollups(log_file_name)
+
+
+def select_rollup_level(duration: float, width: int) -> int:
+    """
+        Coarsest level which still has at least one bucket per pixel. Raw records are used for short ranges
+    """
+    levels = [level for level in ROLLUP_LEVELS if duration / level >= width]
+    return max(levels, default=RAW_LEVEL)
+
+
+def parse_rollup_line(line: bytes, fields: list[str]) -> dict[str, float | None] | None:
+    return parse_log_values(line, fields, set(fields))
+
+
+def read_rollup_file(log_file_name: str, message_type: MessageType, level: int) -> Iterator[dict[str, float | None]]:
+    return read_companion_log_file(get_rollup_log_name(log_file_name, message_type, level), parse_rollup_line)
+
+
+def select_buckets(
+    buckets: Iterable[dict[str, float | None]], level: int, start: float, end: float
+) -> Iterator[dict[str, float | None]]:
+    for bucket in buckets:
+        timestamp: float = bucket['timestamp'] # type: ignore Timestamp is checked by parser
+        if timestamp > end:
+            return
+        if timestamp + level > start:
+            yield bucket
+
+
+def get_raw_buckets(message_type: MessageType, records: Iterable[Any]) -> Iterator[dict[str, float | None]]:
+    """
+        Raw records in rollup bucket format, minimum, maximum and mean are equal
+    """
+    channels = ROLLUP_CHANNELS[message_type]
+    for record in records:
+        bucket: dict[str, float | None] = {'timestamp': record.timestamp, 'count': 1}
+        for channel, value in zip(channels, get_channel_values(message_type, record)):
+            for stat in ROLLUP_STATS:
+                bucket[f'{channel}_{stat}'] = value
+        yield bucket
+
+
+def get_range_chart(
+    storage: TelemetryStorage, start: float, end: float, width: int, channels: list[tuple[MessageType, str]]
+) -> dict[str, Any]:
+    """
+        Chart of logged data for any time range. Every channel has timestamps and min, max and mean lists.
+        Logs written before rollups existed get their rollups built on first request
+    """
+    level = select_rollup_level(end - start, width)
+    result: dict[str, Any] = {'level': level, 'channels': {}}
+    for message_type, channel in channels:
+        if channel not in ROLLUP_CHANNELS.get(message_type, []):
+            raise ValueError(f'No rollups for {message_type} {channel}')
+        result['channels'].setdefault(message_type, {})[channel] = {
+            'timestamp': [], **{stat: [] for stat in ROLLUP_STATS}
+        }
+    for log_name in storage.find_logs(start, end):
+        for message_type, stream_channels in result['channels'].items():
+            if level == RAW_LEVEL:
+                records = select_range(storage.read_log(message_type, log_name), start, end)
+                buckets = get_raw_buckets(message_type, records)
+            else:
+                buckets = select_buckets(storage.read_rollups(message_type, log_name, level), level, start, end)
+            for bucket in buckets:
+                for channel, series in stream_channels.items():
+                    series['timestamp'].append(bucket['timestamp'])
+                    for stat in ROLLUP_STATS:
+                        series[stat].append(bucket.get(f'{channel}_{stat}'))
+    return result
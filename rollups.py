@@ -0,0 +1,173 @@
+from typing import Any, Iterable, Iterator, Sequence
+import math
+from log_blocks import LogBlockWriter
+from data_types import MessageType
+from utils import split_power
+
+# Derived power channels are rolled up from raw samples, mean of product is not product of means
+ROLLUP_CHANNELS: dict[MessageType, list[str]] = {
+    MessageType.CA: [
+        'speed', 'voltage', 'current', 'power', 'regen', 'trip_distance', 'amper_hours', 'motor_temp',
+        'pedal_rpm', 'human_torque', 'human_watts', 'throttle_input', 'throttle_output',
+    ],
+    MessageType.ELECTRIC: ['voltage', 'current', 'power', 'temp'],
+}
+ROLLUP_STATS = ('min', 'max', 'mean')
+
+
+def get_rollup_fields(channels: list[str]) -> list[str]:
+    return ['timestamp', 'count'] + [f'{channel}_{stat}' for channel in channels for stat in ROLLUP_STATS]
+
+
+def get_channel_values(message_type: MessageType, record: Any) -> list[float | None]:
+    """
+        Rollup channel values of CA (CATelemetryRecord or LogRecord) or electrical record
+    """
+    voltage = record.voltage
+    current = record.current
+    power: float | None = None
+    regen: float | None = None
+    if voltage is not None and current is not None:
+        if message_type == MessageType.CA:
+            power, regen = split_power(voltage, current)
+        else:
+            power = voltage * current
+    values: list[float | None] = []
+    for channel in ROLLUP_CHANNELS[message_type]:
+        if channel == 'power':
+            values.append(power)
+        elif channel == 'regen':
+            values.append(regen)
+        else:
+            values.append(getattr(record, channel))
+    return values
+
+
+class RollupLevel:
+    """
+        Open bucket of one level. Minimum, maximum, sum and count are kept per channel
+    """
+
+    def __init__(self, seconds: int, channel_count: int):
+        self.seconds = seconds
+        self.start: float | None = None
+        self.count = 0
+        self.mins = [math.inf] * channel_count
+        self.maxs = [-math.inf] * channel_count
+        self.sums = [0.0] * channel_count
+        self.counts = [0] * channel_count
+
+    def bucket_start(self, timestamp: float) -> float:
+        return math.floor(timestamp / self.seconds) * self.seconds
+
+    def reset(self, start: float):
+        self.start = start
+        self.count = 0
+        for index in range(len(self.counts)):
+            self.mins[index] = math.inf
+            self.maxs[index] = -math.inf
+            self.sums[index] = 0.0
+            self.counts[index] = 0
+
+    def add(self, values: Sequence[float | None]):
+        self.count += 1
+        for index, value in enumerate(values):
+            if value is None or math.isnan(value):
+                continue
+            if value < self.mins[index]:
+                self.mins[index] = value
+            if value > self.maxs[index]:
+                self.maxs[index] = value
+            self.sums[index] += value
+            self.counts[index] += 1
+
+    def to_bucket(self, channels: list[str]) -> dict[str, float | None]:
+        bucket: dict[str, float | None] = {'timestamp': self.start, 'count': self.count}
+        for index, channel in enumerate(channels):
+            count = self.counts[index]
+            bucket[f'{channel}_min'] = self.mins[index] if count > 0 else None
+            bucket[f'{channel}_max'] = self.maxs[index] if count > 0 else None
+            bucket[f'{channel}_mean'] = self.sums[index] / count if count > 0 else None
+        return bucket
+
+    def format_line(self) -> bytes:
+        values = [f'{self.start:.2f}', str(self.count)]
+        for index, count in enumerate(self.counts):
+            if count == 0:
+                values.extend(('None', 'None', 'None'))
+            else:
+                values.extend((f'{self.mins[index]:.6g}', f'{self.maxs[index]:.6g}', f'{self.sums[index] / count:.6g}'))
+        return f'{",".join(values)}\n'.encode()
+
+
+class RollupPyramid:
+    """
+        Min, max and mean of every channel in buckets of each level (for example 1, 10, 60 and 600 seconds).
+        Raw samples are added to the finest level only. Closed bucket is merged into the next level,
+        so every sample costs the same regardless of number of levels.
+        Closed buckets are written to per level writers
+    """
+
+    def __init__(self, channel_count: int, writers: dict[int, LogBlockWriter]):
+        self.writers = writers
+        self.levels = [RollupLevel(seconds, channel_count) for seconds in sorted(writers)]
+
+    def add(self, timestamp: float, values: Sequence[float | None]):
+        level = self.levels[0]
+        start = level.bucket_start(timestamp)
+        if level.start != start:
+            self._close_bucket(0)
+            level.reset(start)
+        level.add(values)
+
+    def _close_bucket(self, level_index: int):
+        level = self.levels[level_index]
+        if level.start is None or level.count == 0:
+            return
+        self.writers[level.seconds].write(level.format_line())
+        if level_index + 1 == len(self.levels):
+            return
+        parent = self.levels[level_index + 1]
+        parent_start = parent.bucket_start(level.start)
+        if parent.start != parent_start:
+            self._close_bucket(level_index + 1)
+            parent.reset(parent_start)
+        parent.count += level.count
+        for index, count in enumerate(level.counts):
+            if count == 0:
+                continue
+            parent.mins[index] = min(parent.mins[index], level.mins[index])
+            parent.maxs[index] = max(parent.maxs[index], level.maxs[index])
+            parent.sums[index] += level.sums[index]
+            parent.counts[index] += count
+
+    def flush_expired(self, max_age: float):
+        for writer in self.writers.values():
+            writer.flush_expired(max_age)
+
+    def close(self):
+        """
+            Writes partially filled buckets of all levels
+        """
+        for level_index, level in enumerate(self.levels):
+            self._close_bucket(level_index)
+            level.start = None
+        for writer in self.writers.values():
+            writer.close()
+
+
+def rollup_records(message_type: MessageType, records: Iterable[Any], seconds: int) -> Iterator[dict[str, float | None]]:
+    """
+        Buckets of one level calculated from time sorted records, same as buckets written by RollupPyramid
+    """
+    channels = ROLLUP_CHANNELS[message_type]
+    level = RollupLevel(seconds, len(channels))
+    for record in records:
+        start = level.bucket_start(record.timestamp)
+        if level.start != start:
+            if level.count > 0:
+                yield level.to_bucket(channels)
+            level.reset(start)
+        level.add(get_channel_values(message_type, record))
+    if level.count > 0:
+        yield level.to_bucket(channels)
@@ -0,0 +1,48 @@
+from typing import Any, Iterable
+from data_types import AppState, GNSSRecord, MessageType
+from route_simplify import RoutePoint, douglas_peucker
+from storage import TelemetryStorage
+from utils import send_ws_message
+
+
+def add_route_point(state: AppState, record: GNSSRecord):
+    state.route.add((record.timestamp, record.latitude, record.longitude))
+
+
+def get_route_message(state: AppState, start: int) -> dict[str, Any]:
+    """
+        Kept route points starting from index start.
+        Tail is the latest fix which can still be dropped by simplification
+    """
+    route = state.route
+    return {
+        'start': start,
+        'points': route.points[start:],
+        'tail': route.window[-1] if route.window else None,
+    }
+
+
+async def route_send_task(state: AppState):
+    """
+        Only points kept since previous send are sent. Full route is sent on client connect
+    """
+    start = min(state.route_sent_count, len(state.route.points))
+    await send_ws_message(state, MessageType.ROUTE, get_route_message(state, start))
+    state.route_sent_count = len(state.route.points)
+
+
+def reset_route(state: AppState):
+    state.route.clear()
+    state.route_sent_count = 0
+
+
+def simplify_track(records: Iterable[GNSSRecord], tolerance: float) -> list[RoutePoint]:
+    points = [(record.timestamp, record.latitude, record.longitude) for record in records]
+    return [points[index] for index in douglas_peucker(points, tolerance)]
+
+
+def get_log_route(storage: TelemetryStorage, log_name: str, tolerance: float) -> list[RoutePoint]:
+    """
+        Simplified GNSS track of one telemetry log
+    """
+    return simplify_track(storage.read_log(MessageType.GNSS, log_name), tolerance)
@@ -0,0 +1,102 @@
+from typing import Sequence
+import math
+
+EARTH_RADIUS = 6371000 # In meters
+
+RoutePoint = tuple[float, float, float] # Timestamp, latitude, longitude
+
+
+def get_offset_meters(origin: RoutePoint, point: RoutePoint) -> tuple[float, float]:
+    """
+        Equirectangular projection around origin. Precise enough for distances of a few kilometers
+    """
+    x = math.radians(point[2] - origin[2]) * math.cos(math.radians(origin[1])) * EARTH_RADIUS
+    y = math.radians(point[1] - origin[1]) * EARTH_RADIUS
+    return x, y
+
+
+def get_segment_distance(point: RoutePoint, start: RoutePoint, end: RoutePoint) -> float:
+    """
+        Distance in meters from point to segment between start and end.
+        Segment is used instead of infinite line, so turns back on the same road are not dropped
+    """
+    point_x, point_y = get_offset_meters(start, point)
+    end_x, end_y = get_offset_meters(start, end)
+    length_squared = end_x * end_x + end_y * end_y
+    if length_squared == 0:
+        return math.hypot(point_x, point_y)
+    position = max(0, min(1, (point_x * end_x + point_y * end_y) / length_squared))
+    return math.hypot(point_x - position * end_x, point_y - position * end_y)
+
+
+def douglas_peucker(points: Sequence[RoutePoint], tolerance: float) -> list[int]:
+    """
+        Batch Douglas-Peucker simplification. Returns indexes of kept points.
+        Stack is used instead of recursion, long tracks do not hit recursion limit
+    """
+    length = len(points)
+    if length < 3:
+        return list(range(length))
+    kept = [False] * length
+    kept[0] = kept[-1] = True
+    stack = [(0, length - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_distance = 0.0
+        max_index = start
+        for index in range(start + 1, end):
+            distance = get_segment_distance(points[index], points[start], points[end])
+            if distance > max_distance:
+                max_distance = distance
+                max_index = index
+        if max_distance > tolerance:
+            kept[max_index] = True
+            stack.append((start, max_index))
+            stack.append((max_index, end))
+    return [index for index in range(length) if kept[index]]
+
+
+class StreamingSimplifier:
+    """
+        Online opening window variant of Douglas-Peucker.
+        Points after the last kept point are buffered while all of them are within tolerance
+        of the segment from the last kept point to the newest one. When the newest point breaks
+        tolerance, the previous point is kept and becomes the new segment start.
+        Window length is limited, so every point is processed in bounded time
+    """
+
+    def __init__(self, tolerance: float, max_window: int):
+        self.tolerance = tolerance
+        self.max_window = max_window
+        self.points: list[RoutePoint] = []
+        self.window: list[RoutePoint] = []
+
+    def is_within_tolerance(self, end: RoutePoint) -> bool:
+        start = self.points[-1]
+        return all(get_segment_distance(point, start, end) <= self.tolerance for point in self.window)
+
+    def add(self, point: RoutePoint) -> bool:
+        """
+            Returns True when simplified route got a new kept point
+        """
+        if not self.points:
+            self.points.append(point)
+            return True
+        if self.window and (len(self.window) >= self.max_window or not self.is_within_tolerance(point)):
+            self.points.append(self.window[-1])
+            self.window = [point]
+            return True
+        self.window.append(point)
+        return False
+
+    def get_route(self) -> list[RoutePoint]:
+        """
+            Kept points and the latest point, which is not final yet
+        """
+        if self.window:
+            return self.points + [self.window[-1]]
+        return list(self.points)
+
+    def clear(self):
+        self.points = []
+        self.window = []
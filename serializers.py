@@ -0,0 +1,134 @@
+from dataclasses import fields
+from operator import attrgetter
+from types import UnionType
+from typing import Any, Callable, Generic, TypeVar
+import json
+import math
+import struct
+from data_types import (
+    AggregatedLogData, CATelemetryRecord, ElectricalRecord, GNSSRecord, SystemTelemetryRecord
+)
+
+RecordType = TypeVar('RecordType')
+
+STRING_SIZE = 32 # Packed strings are stored in fixed size, longer strings are truncated
+# Packed format per field kind. Optional numbers are packed as double with NaN for None
+STRUCT_CODES = {
+    'float': 'd', 'optional_float': 'd', 'int': 'q', 'optional_int': 'd', 'bool': '?', 'str': f'{STRING_SIZE}p',
+}
+json_encode = json.JSONEncoder().encode
+
+
+def get_field_kind(field_type: Any) -> str:
+    optional = False
+    if isinstance(field_type, UnionType):
+        args = [arg for arg in field_type.__args__ if arg is not type(None)]
+        if len(args) != 1:
+            raise TypeError(f'Field type {field_type} can not be serialized')
+        optional = len(args) < len(field_type.__args__)
+        field_type = args[0]
+    if field_type is bool or field_type is str:
+        if optional:
+            raise TypeError(f'Optional {field_type.__name__} field can not be serialized')
+        return field_type.__name__
+    if field_type is float or field_type is int:
+        return f'optional_{field_type.__name__}' if optional else field_type.__name__
+    raise TypeError(f'Field type {field_type} can not be serialized')
+
+
+def compile_function(name: str, source: str, namespace: dict[str, Any]) -> Callable[..., Any]:
+    exec(source, namespace)
+    return namespace[name]
+
+
+class RecordSerializer(Generic[RecordType]):
+    """
+        Encoders of one flat record type, generated from its fields like namedtuple generates its methods.
+        Generated code reads slots directly, without recursion and deep copy of dataclasses.asdict
+    """
+
+    def __init__(self, record_type: type[RecordType]):
+        self.record_type = record_type
+        record_fields = fields(record_type) # type: ignore
+        self.fields = [field.name for field in record_fields]
+        self.kinds = [get_field_kind(field.type) for field in record_fields]
+        self.struct = struct.Struct('<' + ''.join(STRUCT_CODES[kind] for kind in self.kinds))
+        self.to_tuple: Callable[[RecordType], tuple[Any, ...]] = attrgetter(*self.fields) # type: ignore
+        self.to_dict: Callable[[RecordType], dict[str, Any]] = compile_function(
+            'to_dict',
+            'def to_dict(record):\n    return {' + ', '.join(f'{name!r}: record.{name}' for name in self.fields) + '}',
+            {},
+        )
+        self.pack: Callable[[RecordType], bytes] = compile_function(
+            'pack',
+            'def pack(record):\n    return pack_struct(' + ', '.join(
+                self._pack_expression(name, kind) for name, kind in zip(self.fields, self.kinds)
+            ) + ')',
+            {'pack_struct': self.struct.pack, 'nan': math.nan},
+        )
+        self.unpack: Callable[[bytes], RecordType] = compile_function(
+            'unpack',
+            'def unpack(data):\n    values = unpack_struct(data)\n    return record_type(' + ', '.join(
+                f'{name}={self._unpack_expression(index, kind)}'
+                for index, (name, kind) in enumerate(zip(self.fields, self.kinds))
+            ) + ')',
+            {'unpack_struct': self.struct.unpack, 'record_type': record_type},
+        )
+        self.csv_encoders: dict[tuple[str, ...], Callable[[RecordType], bytes]] = {}
+
+    @staticmethod
+    def _pack_expression(name: str, kind: str) -> str:
+        if kind.startswith('optional_'):
+            return f'nan if record.{name} is None else record.{name}'
+        if kind == 'str':
+            return f'record.{name}.encode()'
+        return f'record.{name}'
+
+    @staticmethod
+    def _unpack_expression(index: int, kind: str) -> str:
+        value = f'values[{index}]'
+        if kind == 'optional_float':
+            return f'None if {value} != {value} else {value}'
+        if kind == 'optional_int':
+            return f'None if {value} != {value} else int({value})'
+        if kind == 'str':
+            return f'{value}.decode()'
+        return value
+
+    def to_json(self, record: RecordType) -> bytes:
+        return json_encode(self.to_dict(record)).encode()
+
+    def get_csv_encoder(
+        self, csv_fields: list[str], formats: dict[str, str] | None = None
+    ) -> Callable[[RecordType], bytes]:
+        """
+            Log line of given fields. Values are formatted like str(), unless format spec is given for field
+        """
+        formats = formats or {}
+        key = tuple(f'{name}:{formats.get(name, "")}' for name in csv_fields)
+        encoder = self.csv_encoders.get(key)
+        if encoder is None:
+            line = ','.join(
+                f'{{record.{name}:{formats[name]}}}' if name in formats else f'{{record.{name}}}' for name in csv_fields
+            )
+            encoder = compile_function('to_csv_row', f'def to_csv_row(record):\n    return f"{line}\\n".encode()', {})
+            self.csv_encoders[key] = encoder
+        return encoder
+
+
+SERIALIZERS: dict[type, RecordSerializer[Any]] = {}
+
+
+def get_serializer(record_type: type[RecordType]) -> RecordSerializer[RecordType]:
+    serializer = SERIALIZERS.get(record_type)
+    if serializer is None:
+        serializer = SERIALIZERS[record_type] = RecordSerializer(record_type)
+    return serializer
+
+
+def record_to_dict(record: Any) -> dict[str, Any]:
+    return get_serializer(type(record)).to_dict(record)
+
+
+for registered_type in (CATelemetryRecord, GNSSRecord, ElectricalRecord, SystemTelemetryRecord, AggregatedLogData):
+    get_serializer(registered_type)
@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+from typing import Any
+import asyncio
+import logging
+import selectors
+import time
+
+from clock import Clock, VirtualClock, set_clock
+from data_types import AggregatedLogData, AppState
+from data_sources.system import SystemSampler
+from geo_query import load_geo_index, save_geo_index
+from main import create_service_tasks
+from storage import open_storage
+from telemetry_logs import close_log, reset_log, get_storage
+from trip import write_trip_checkpoint
+
+LOG_TIMESTAMP_ROUNDING = 0.005 # CA log timestamps are written with two decimals, so they can move out of the range
+
+
+class VirtualTimeSelector:
+    """
+        Selector of virtual time loop. Sockets and pipes are polled without waiting, and when nothing is ready
+        loop time jumps by select timeout, so the next timer is due at once.
+        While executor jobs (like log fsync) run, selector waits for them in real time and virtual time stands still
+    """
+
+    def __init__(self, selector: selectors.BaseSelector, loop: 'VirtualTimeEventLoop'):
+        self.selector = selector
+        self.loop = loop
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.selector, name)
+
+    def select(self, timeout: float | None = None) -> list[tuple[selectors.SelectorKey, int]]:
+        if self.loop.executor_jobs or timeout is None:
+            return self.selector.select(timeout)
+        events = self.selector.select(0)
+        if not events:
+            self.loop.virtual_time += timeout
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+        Event loop which skips idle time between timers. Scheduler, sleeps and timeouts work as usual,
+        so periodic tasks run in the same order as in real time, only without waiting
+    """
+
+    def __init__(self):
+        self.virtual_time = 0.0
+        self.executor_jobs = 0
+        super().__init__(VirtualTimeSelector(selectors.DefaultSelector(), self)) # type: ignore Selector is proxied
+
+    def time(self) -> float:
+        return self.virtual_time
+
+    def run_in_executor(self, executor: Any, func: Any, *args: Any) -> asyncio.Future[Any]:
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+        future.add_done_callback(self.on_executor_job_done)
+        return future
+
+    def on_executor_job_done(self, future: asyncio.Future[Any]):
+        self.executor_jobs -= 1
+
+
+@dataclass
+class SimulationSample:
+    """
+        State of simulated service at one moment.
+
+        Attributes:
+            time (float): Simulated seconds since start.
+            real_time (float): Real seconds since start.
+            rss (float): Resident memory of process in MB.
+            log_files (int): Log files written by simulation.
+            log_record_count (int): Records in current log file.
+            buffered_records (int): Records in all stream buffers.
+            trip_records (int): Records counted by trip aggregates.
+    """
+    time: float
+    real_time: float
+    rss: float
+    log_files: int
+    log_record_count: int
+    buffered_records: int
+    trip_records: int
+
+
+@dataclass
+class SimulationReport:
+    """
+        Trip aggregates are updated live from ingested records, logged aggregates are calculated
+        from written log files. Difference between them is aggregate drift
+    """
+    duration: float
+    real_duration: float
+    log_files: list[str]
+    trip: AggregatedLogData
+    logged: AggregatedLogData
+    samples: list[SimulationSample] = field(default_factory=lambda: [])
+
+
+def take_sample(state: AppState, sampler: SystemSampler, start: float, real_start: float, log_files: int) -> SimulationSample:
+    loop = asyncio.get_running_loop()
+    return SimulationSample(
+        time=loop.time() - start,
+        real_time=time.perf_counter() - real_start,
+        rss=sampler.get_rss(),
+        log_files=len(state.log_files) - log_files,
+        log_record_count=state.log_record_count,
+        buffered_records=sum(len(buffer) for buffer in (
+            state.ca_telemetry_records, state.gnss_records, state.electric_records,
+            state.system_telemetry_records, state.fused_records
+        )),
+        trip_records=state.trip.total_records,
+    )
+
+
+async def simulate(state: AppState, duration: float, sample_interval: float, log_files: int) -> list[SimulationSample]:
+    loop = asyncio.get_running_loop()
+    sampler = state.system_sampler or SystemSampler()
+    start = loop.time()
+    real_start = time.perf_counter()
+    create_service_tasks(state)
+    samples = [take_sample(state, sampler, start, real_start, log_files)]
+    elapsed = 0.0
+    while elapsed < duration:
+        elapsed = min(elapsed + sample_interval, duration)
+        await asyncio.sleep(start + elapsed - loop.time())
+        samples.append(take_sample(state, sampler, start, real_start, log_files))
+    for task_data in state.tasks:
+        task_data.task.cancel()
+    await asyncio.gather(*(task_data.task for task_data in state.tasks), return_exceptions=True)
+    return samples
+
+
+def run_simulation(duration: float, sample_interval: float, replay_log_file: str | None = None) -> SimulationReport:
+    """
+        Runs tasks of web process on virtual time loop with fake sensors or replayed log.
+        Telemetry logs are written to TELEMETRY_LOG_DIRECTORY, which should be set to separate directory.
+        Trip starts empty, so it can be compared with logs written by simulation
+    """
+    logger = logging.getLogger('greybike')
+    start = time.time()
+    real_start = time.perf_counter()
+    with asyncio.Runner(loop_factory=VirtualTimeEventLoop) as runner:
+        set_clock(VirtualClock(runner.get_loop(), start))
+        try:
+            storage = open_storage()
+            state = AppState(
+                log_files=storage.list_logs(), geo_index=load_geo_index(), replay_log_file=replay_log_file,
+                storage=storage
+            )
+            log_files = len(state.log_files)
+            state.system_sampler = SystemSampler()
+            reset_log(state)
+            samples = runner.run(simulate(state, duration, sample_interval, log_files))
+            close_log(state)
+            save_geo_index(get_storage(state), state.geo_index)
+            write_trip_checkpoint(state.trip)
+            state.system_sampler.close()
+        finally:
+            set_clock(Clock())
+    real_duration = time.perf_counter() - real_start
+    logger.info('Simulated %.0f seconds in %.1f seconds', duration, real_duration)
+    return SimulationReport(
+        duration=duration,
+        real_duration=real_duration,
+        log_files=state.log_files[log_files:],
+        trip=state.trip,
+        logged=get_storage(state).aggregate(start - LOG_TIMESTAMP_ROUNDING, start + duration + LOG_TIMESTAMP_ROUNDING),
+        samples=samples,
+    )
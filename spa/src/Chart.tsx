@@ -1,6 +1,6 @@
-import { PARAM_OPTIONS, ChartTypeMapping, ChartType, ChartSettings, WebSocketData, TelemetryType } from './types';
+import { PARAM_OPTIONS, ChartTypeMapping, ChartType, ChartSettings, WebSocketData, TelemetryType, ChartData } from './types';
 import { LineChart } from '@mui/x-charts/LineChart';
-import { useContext } from 'react';
+import { useContext, useEffect } from 'react';
 import { WebSocketContext } from './WebSocketContext';
 import { Stack, Box } from '@mui/material';
 
@@ -41,11 +41,55 @@ function getDataSeries(data: WebSocketData, chartSettings: ChartSettings[]): { x
     }
 }
 
+const CHART_POINTS = 200;
+const CHART_DURATION = 400; // In seconds
+
+function getDecimatedSeries(data: ChartData, chartSettings: ChartSettings[]): { xAxis: any[], series: any[] } {
+    // Server selects different points for every channel, so x axis is union of all timestamps
+    const timestamps = new Set<number>();
+    for (const chartConf of chartSettings) {
+        const channel = data[chartConf.type]?.[chartConf.field];
+        channel?.[0].forEach((timestamp) => timestamps.add(timestamp));
+    }
+    const xAxis = Array.from(timestamps).sort((a, b) => a - b);
+    const lastTimestamp = xAxis[xAxis.length - 1];
+    const dataSeries = chartSettings.map((chartConf) => {
+        const channel = data[chartConf.type]?.[chartConf.field];
+        const values = new Map<number, number | null>();
+        channel?.[0].forEach((timestamp, i) => values.set(timestamp, channel[1][i]));
+        return {
+            label: PARAM_OPTIONS[chartConf.field].name,
+            data: xAxis.map((timestamp) => values.get(timestamp) ?? null),
+            connectNulls: true,
+            showMark: false,
+            color: chartConf.color
+        }
+    });
+    return {
+        xAxis: [{
+            data: xAxis.map((timestamp) => Math.round(lastTimestamp - timestamp)),
+            scaleType: 'point',
+        }],
+        series: dataSeries
+    }
+}
+
 export function Chart({ chartType }: { chartType: ChartType }) {
     let chartData: { xAxis: any[], series: any[] } = { xAxis: [], series: [] };
     const bikeData = useContext(WebSocketContext);
     const chartSettings = ChartTypeMapping[chartType].lines;
-    if (bikeData !== null) {
+    const requestChart = bikeData?.requestChart;
+    useEffect(() => {
+        requestChart?.({
+            points: CHART_POINTS,
+            duration: CHART_DURATION,
+            method: 'lttb',
+            channels: chartSettings.map((chartConf) => [chartConf.type, chartConf.field]),
+        });
+    }, [requestChart, chartSettings]);
+    if (bikeData?.chartData) {
+        chartData = getDecimatedSeries(bikeData.chartData, chartSettings);
+    } else if (bikeData !== null) {
         chartData = getDataSeries(bikeData, chartSettings);
     }
     return (
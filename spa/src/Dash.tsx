@@ -1,7 +1,7 @@
 import './dash.css';
-import { useContext, useState } from 'react';
+import { useContext, useEffect, useState } from 'react';
 import { WebSocketContext } from './WebSocketContext';
-import { PARAM_OPTIONS, DashMode, DashModeConfigs, ChartType } from './types';
+import { PARAM_OPTIONS, DashMode, DashModeConfigs, ChartType, CARecordFields, Subscription, TelemetryType } from './types';
 import { Button, Stack, Unstable_Grid2 as Grid } from '@mui/material';
 import { enumKeys } from './utils';
 import { useWakeLock } from './use-wake-lock';
@@ -24,6 +24,25 @@ function ParamContainer({ name, value, unit }: { name: string, value: number, un
 }
 
 
+// Power and regen are calculated in client from voltage and current
+const DERIVED_FIELD_SOURCES: { [key in CARecordFields]?: CARecordFields[] } = {
+    [CARecordFields.power]: [CARecordFields.voltage, CARecordFields.current],
+    [CARecordFields.regen]: [CARecordFields.voltage, CARecordFields.current],
+}
+
+// Dash shows only fields of current mode, so other streams and fields are not sent.
+// Charts are requested separately
+function getDashSubscription(mode: DashMode): Subscription {
+    const fields = new Set<CARecordFields>([CARecordFields.timestamp]);
+    for (const field of DashModeConfigs[mode].fields) {
+        for (const source of DERIVED_FIELD_SOURCES[field] ?? [field]) {
+            fields.add(source);
+        }
+    }
+    return { [TelemetryType.CA]: { fields: Array.from(fields), delta: true } };
+}
+
+
 function DashParams({ mode }: { mode: DashMode }){
     const socketData = useContext(WebSocketContext);
     const lastTelemetry = socketData?.caRecords[socketData.caRecords.length - 1];
@@ -50,6 +69,10 @@ export default function Dash() {
     const [mode, setMode] = useState<DashMode>(DashMode.SPEED);
     const [chartType, setChartType] = useState<ChartType>(ChartType.motor);
     const { type: lockType } = useWakeLock();
+    const subscribe = useContext(WebSocketContext)?.subscribe;
+    useEffect(() => {
+        subscribe?.(getDashSubscription(mode));
+    }, [subscribe, mode]);
     const chartButtons = [];
     for (const chartType of enumKeys(ChartType)) {
         const cType = ChartType[chartType];
@@ -1,5 +1,5 @@
-import { createContext, useState, useRef, useEffect, PropsWithChildren } from "react"
-import { TelemetryRecord, SystemRecord, TelemetryType, GNSSRecord, ElectricRecord, Timestamped, WebSocketData } from "./types"
+import { createContext, useState, useRef, useEffect, useCallback, PropsWithChildren } from "react"
+import { TelemetryRecord, SystemRecord, TelemetryType, GNSSRecord, ElectricRecord, Timestamped, WebSocketData, HistoryStream, HistorySnapshot, StatsSnapshot, TripRecord, ChartData, ChartRequest, RoutePoint, RouteMessage, Subscription } from "./types"
 import { SetStateAction } from "react"
 
 
@@ -27,38 +27,102 @@ function rotateElems<T extends Timestamped>(elems: T[], newElem: T): T[] {
     return [...elems, newElem];
 }
 
+function addTelemetryPower(record: TelemetryRecord): TelemetryRecord {
+    const power = record.current * record.voltage;
+    if (record.current < 0) {
+        record.regen = -power;
+        record.power = 0;
+    } else {
+        record.regen = 0;
+        record.power = power;
+    }
+    return record;
+}
+
+function addElectricPower(record: ElectricRecord): ElectricRecord {
+    record.power = record.current * record.voltage;
+    return record;
+}
+
 function proccessTelemetryMessage(messageData: any, setTelemetry: (value: SetStateAction<TelemetryRecord[]>) => void) {
     setTelemetry((prevTelemetry: TelemetryRecord[]) => {
-        const newRecord = messageData.data as TelemetryRecord;
-        const power = newRecord.current * newRecord.voltage;
-        if (newRecord.current < 0) {
-            newRecord.regen = -power;
-            newRecord.power = 0;
-        } else {
-            newRecord.regen = 0;
-            newRecord.power = power;
-        }
+        const newRecord = addTelemetryPower(messageData.data as TelemetryRecord);
         return rotateElems(prevTelemetry, newRecord);
     });
 }
 
 function processElectricMessage(messageData: any, setElectricRecords: (value: SetStateAction<ElectricRecord[]>) => void) {
     setElectricRecords((prevElectricState: ElectricRecord[]) => {
-        const newRecord = messageData.data as ElectricRecord;
-        newRecord.power = newRecord.current * newRecord.voltage;
+        const newRecord = addElectricPower(messageData.data as ElectricRecord);
         return rotateElems(prevElectricState, newRecord);
     });
 }
 
+function historyRecords<T>(stream: HistoryStream | undefined): T[] {
+    if (!stream) {
+        return [];
+    }
+    return stream.records.slice(-LOGS_DURATION).map((values) => {
+        const record: any = {};
+        stream.fields.forEach((field, i) => {
+            record[field] = values[i];
+        });
+        return record as T;
+    });
+}
+
 export const WebSocketProvider = (props: PropsWithChildren<WebSocketProviderProps>) => {
     const [isConnected, setIsConnected] = useState(false)
     const [caRecords, setCARecords] = useState<TelemetryRecord[]>([])
     const [systemRecords, setSystemRecords] = useState<SystemRecord[]>([]);
     const [gnssRecords, setGnssRecords] = useState<GNSSRecord[]>([]);
     const [electricRecords, setElectricRecords] = useState<ElectricRecord[]>([]);
+    const [stats, setStats] = useState<StatsSnapshot | null>(null);
+    const [trip, setTrip] = useState<TripRecord | null>(null);
+    const [chartData, setChartData] = useState<ChartData | null>(null);
+    const [routePoints, setRoutePoints] = useState<RoutePoint[]>([]);
+    const [routeTail, setRouteTail] = useState<RoutePoint | null>(null);
     const { wsUrl } = props;
 
     const connection = useRef<WebSocket | null>(null);
+    const chartRequest = useRef<ChartRequest | null>(null);
+    const subscription = useRef<Subscription>(null);
+    // Last full record of each stream, delta messages only carry changed fields
+    const lastRecords = useRef<{ [key: string]: any }>({});
+
+    const sendChartRequest = () => {
+        const ws = connection.current;
+        if (ws && ws.readyState === WebSocket.OPEN && chartRequest.current) {
+            ws.send(JSON.stringify({ type: TelemetryType.CHART, data: chartRequest.current }));
+        }
+    }
+
+    const requestChart = useCallback((request: ChartRequest) => {
+        chartRequest.current = request;
+        setChartData(null);
+        sendChartRequest();
+    }, []);
+
+    const sendSubscription = (streams: Subscription) => {
+        const ws = connection.current;
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({ type: TelemetryType.SUBSCRIBE, data: { streams: streams } }));
+        }
+    }
+
+    const subscribe = useCallback((streams: Subscription) => {
+        subscription.current = streams;
+        sendSubscription(streams);
+    }, []);
+
+    useEffect(() => {
+        // Hidden dashboard does not need live data
+        const onVisibilityChange = () => {
+            sendSubscription(document.hidden ? {} : subscription.current);
+        }
+        document.addEventListener("visibilitychange", onVisibilityChange);
+        return () => document.removeEventListener("visibilitychange", onVisibilityChange);
+    }, []);
 
     useEffect(() => {
         if (!connection.current) {
@@ -68,9 +132,24 @@ export const WebSocketProvider = (props: PropsWithChildren<WebSocketProviderProp
   
         ws.addEventListener("open", () => {
             setIsConnected(true);
+            sendChartRequest();
+            if (subscription.current) {
+                sendSubscription(subscription.current);
+            }
         })
         ws.addEventListener("message", (event) => {
             const messageData = JSON.parse(event.data);
+            if (messageData.delta) {
+                messageData.data = { ...lastRecords.current[messageData.type], ...messageData.data };
+            }
+            lastRecords.current[messageData.type] = { ...messageData.data };
+            if (messageData.type === TelemetryType.HISTORY) {
+                const snapshot = messageData.data as HistorySnapshot;
+                setCARecords(historyRecords<TelemetryRecord>(snapshot[TelemetryType.CA]).map(addTelemetryPower));
+                setSystemRecords(historyRecords<SystemRecord>(snapshot[TelemetryType.SYSTEM]));
+                setGnssRecords(historyRecords<GNSSRecord>(snapshot[TelemetryType.GNSS]));
+                setElectricRecords(historyRecords<ElectricRecord>(snapshot[TelemetryType.ELECTRIC]).map(addElectricPower));
+            }
             if (messageData.type === TelemetryType.CA) {
                 proccessTelemetryMessage(messageData, setCARecords);
             }
@@ -87,6 +166,20 @@ export const WebSocketProvider = (props: PropsWithChildren<WebSocketProviderProp
             if (messageData.type === TelemetryType.ELECTRIC) {
                 processElectricMessage(messageData, setElectricRecords);
             }
+            if (messageData.type === TelemetryType.STATS) {
+                setStats(messageData.data as StatsSnapshot);
+            }
+            if (messageData.type === TelemetryType.TRIP) {
+                setTrip(messageData.data as TripRecord);
+            }
+            if (messageData.type === TelemetryType.CHART) {
+                setChartData(messageData.data as ChartData);
+            }
+            if (messageData.type === TelemetryType.ROUTE) {
+                const routeMessage = messageData.data as RouteMessage;
+                setRoutePoints((prevPoints) => prevPoints.slice(0, routeMessage.start).concat(routeMessage.points));
+                setRouteTail(routeMessage.tail);
+            }
         })
         ws.addEventListener("error", (error) => {
             console.error('Socket encountered error. Closing socket', error);
@@ -104,7 +197,13 @@ export const WebSocketProvider = (props: PropsWithChildren<WebSocketProviderProp
         caRecords: caRecords,
         systemRecords: systemRecords,
         gnssRecords: gnssRecords,
-        electricRecords: electricRecords
+        electricRecords: electricRecords,
+        stats: stats,
+        trip: trip,
+        chartData: chartData,
+        route: routeTail ? routePoints.concat([routeTail]) : routePoints,
+        requestChart: requestChart,
+        subscribe: subscribe
     }
 
     return (
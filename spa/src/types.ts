@@ -5,7 +5,14 @@ export enum TelemetryType {
     SYSTEM = 'system',
     STATUS = 'status',
     GNSS = 'gnss',
-    ELECTRIC = 'electric'
+    ELECTRIC = 'electric',
+    HISTORY = 'history',
+    STATS = 'stats',
+    TRIP = 'trip',
+    CHART = 'chart',
+    ROUTE = 'route',
+    FUSED = 'fused',
+    SUBSCRIBE = 'subscribe'
 }
 
 export enum DashMode {
@@ -54,6 +61,12 @@ export type TelemetryRecord = { [key in CARecordFields]: number }
 export type SystemRecord = {
     cpu_temp: number,
     cpu_usage: number,
+    rss: number,
+    open_fds: number,
+    loop_lag: number,
+    gc_collections: number,
+    gc_pause: number,
+    load_level: number,
 }
 
 export type GNSSRecord = {
@@ -71,7 +84,7 @@ export type ElectricRecord = {
     temp: number,
 }
 
-type TelemetryFields = CARecordFields | keyof ElectricRecord | keyof SystemRecord | keyof GNSSRecord
+export type TelemetryFields = CARecordFields | keyof ElectricRecord | keyof SystemRecord | keyof GNSSRecord
 
 export const PARAM_OPTIONS: { [key in TelemetryFields]: ParamData} = {
     'amper_hours': {'name': 'Amper Hours', 'unit': 'Ah'},
@@ -87,6 +100,12 @@ export const PARAM_OPTIONS: { [key in TelemetryFields]: ParamData} = {
     'motor_temp': {'name': 'Motor Temp', 'unit': '°C'},
     'cpu_temp': {'name': 'CPU Temp', 'unit': '°C'},
     'cpu_usage': {'name': 'CPU Usage', 'unit': '%'},
+    'rss': {'name': 'Process Memory', 'unit': 'MB'},
+    'open_fds': {'name': 'Open Files', 'unit': ''},
+    'loop_lag': {'name': 'Loop Lag', 'unit': 'ms'},
+    'gc_collections': {'name': 'GC Collections', 'unit': ''},
+    'gc_pause': {'name': 'GC Pause', 'unit': 'ms'},
+    'load_level': {'name': 'Load Level', 'unit': ''},
     'temp': {'name': 'Controller Temp', 'unit': '°C'},
     'altitude': {'name': 'Altitude', 'unit': 'm'},
     'latitude': {'name': 'Latitude', 'unit': '°'},
@@ -140,10 +159,75 @@ export const ChartTypeMapping: ChartMapping = {
     }
 }
 
+export type HistoryStream = {
+    fields: string[],
+    records: any[][]
+}
+
+export type HistorySnapshot = { [key in TelemetryType]?: HistoryStream }
+
+export type WindowStats = { mean: number, min: number, max: number } | null
+
+// Keys are window durations in seconds
+export type ChannelStats = { [window: string]: WindowStats }
+
+export type StatsSnapshot = {
+    energy: { [channel in 'motor' | 'regen' | 'human']: { [window: string]: number } },
+} & { [key in TelemetryType]?: { [field: string]: ChannelStats } }
+
+export type TripRecord = {
+    max_speed: number,
+    max_regen_watts: number,
+    max_motor_watts: number,
+    max_human_watts: number,
+    total_human_watt_hours: number,
+    total_regen_watt_hours: number,
+    total_motor_watt_hours: number,
+    total_distance: number,
+    total_records: number,
+}
+
+export type ChartRequest = {
+    points: number,
+    duration: number,
+    method: 'lttb' | 'minmax',
+    channels: [TelemetryType, TelemetryFields][]
+}
+
+// Decimated chart channels. Each channel is pair of timestamps and values
+export type ChartData = { [key in TelemetryType]?: { [field: string]: [number[], (number | null)[]] } }
+
+// Record fields and maximum messages per second for each stream. Missing fields or rate mean all fields at full rate.
+// Delta streams send only changed fields between periodic full keyframes
+export type StreamSubscription = {
+    fields?: string[],
+    rate?: number,
+    delta?: boolean
+}
+
+// Streams which are not listed are not sent. Null restores full default stream
+export type Subscription = { [key in TelemetryType]?: StreamSubscription } | null
+
+// Timestamp, latitude, longitude
+export type RoutePoint = [number, number, number]
+
+// Kept points starting from index start. Tail is the latest fix which is not final yet
+export type RouteMessage = {
+    start: number,
+    points: RoutePoint[],
+    tail: RoutePoint | null
+}
+
 export type WebSocketData = {
     isConnected: boolean,
     caRecords: TelemetryRecord[],
     systemRecords: SystemRecord[],
     electricRecords: ElectricRecord[],
-    gnssRecords: GNSSRecord[]
+    gnssRecords: GNSSRecord[],
+    stats: StatsSnapshot | null,
+    trip: TripRecord | null,
+    chartData: ChartData | null,
+    route: RoutePoint[],
+    requestChart: (request: ChartRequest) => void,
+    subscribe: (subscription: Subscription) => void
 }
\ No newline at end of file
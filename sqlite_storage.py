@@ -0,0 +1,282 @@
+from collections import deque
+from functools import reduce
+from itertools import groupby
+from operator import attrgetter
+from typing import Any, Callable, Iterator
+import logging
+import os
+import sqlite3
+import threading
+from clock import get_monotonic
+from constants import SQLITE_RETRY_BATCH_LIMIT
+from data_types import (
+    AggregatedLogData, BaseRecord, ElectricalRecord, GNSSRecord, MessageType, SystemTelemetryRecord
+)
+from log_query import get_log_start_time
+from rollups import rollup_records
+from serializers import get_serializer
+from storage import TelemetryStorage
+from telemetry_logs import LogRecord, merge_aggregates, update_aggregates
+
+COLUMN_TYPES = {
+    'float': 'REAL NOT NULL', 'optional_float': 'REAL', 'int': 'INTEGER NOT NULL', 'optional_int': 'INTEGER',
+    'bool': 'INTEGER NOT NULL', 'str': 'TEXT NOT NULL',
+}
+LOG_INSERT = 'INSERT INTO logs VALUES (?, ?, ?)'
+# CA records are stored with logged fields, like in text logs
+STREAM_RECORD_TYPES: dict[MessageType, type] = {
+    MessageType.CA: LogRecord,
+    MessageType.GNSS: GNSSRecord,
+    MessageType.ELECTRIC: ElectricalRecord,
+    MessageType.SYSTEM: SystemTelemetryRecord,
+}
+
+
+class StreamTable:
+    """
+        Table of one stream. Rows are (log_id, *record fields), timestamp and log with timestamp are indexed
+    """
+
+    def __init__(self, message_type: MessageType):
+        serializer = get_serializer(STREAM_RECORD_TYPES[message_type])
+        self.name = str(message_type)
+        self.columns = serializer.fields
+        self.record_type = serializer.record_type
+        self.get_values: Callable[[Any], tuple[Any, ...]] = attrgetter(*self.columns) # type: ignore
+        self.schema = [
+            f'CREATE TABLE IF NOT EXISTS {self.name} (log_id INTEGER NOT NULL, ' + ', '.join(
+                f'{name} {COLUMN_TYPES[kind]}' for name, kind in zip(serializer.fields, serializer.kinds)
+            ) + ')',
+            f'CREATE INDEX IF NOT EXISTS {self.name}_timestamp ON {self.name} (timestamp)',
+            f'CREATE INDEX IF NOT EXISTS {self.name}_log ON {self.name} (log_id, timestamp)',
+        ]
+        self.insert = f'INSERT INTO {self.name} VALUES ({", ".join("?" * (len(self.columns) + 1))})'
+        self.select = (
+            f'SELECT {", ".join(self.columns)} FROM {self.name} WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp'
+        )
+        self.select_log = (
+            f'SELECT {", ".join(self.columns)} FROM {self.name} '
+            'WHERE log_id = (SELECT id FROM logs WHERE name = ?) ORDER BY timestamp'
+        )
+
+    def to_record(self, row: tuple[Any, ...]) -> Any:
+        return self.record_type(**dict(zip(self.columns, row)))
+
+
+STREAM_TABLES = {message_type: StreamTable(message_type) for message_type in STREAM_RECORD_TYPES}
+
+
+class SqliteStorage(TelemetryStorage):
+    """
+        All streams in one SQLite database in WAL mode, so readers do not block the writer.
+        Records are buffered in event loop and inserted by sync in one transaction per flush,
+        which is also the only fsync. Log rotation only starts new log id, all logs share tables
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection: sqlite3.Connection | None = None
+        self.lock = threading.Lock() # Guards connection between sync thread and close
+        self.log_id = 0
+        self.pending: dict[str, list[tuple[Any, ...]]] = {}
+        self.pending_start = get_monotonic()
+        self.batches: deque[tuple[str, list[tuple[Any, ...]]]] = deque()
+        self.dropped_batches = 0 # Batches lost after write failures
+
+    def open(self):
+        logger = logging.getLogger('greybike')
+        logger.info('Logging telemetry to %s', self.path)
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=FULL') # Commit is durable, like fsync of text log block
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY, name TEXT NOT NULL, start REAL NOT NULL)'
+        )
+        for table in STREAM_TABLES.values():
+            for statement in table.schema:
+                connection.execute(statement)
+        self.log_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM logs').fetchone()[0]
+        self.connection = connection
+
+    def add_row(self, sql: str, row: tuple[Any, ...]):
+        if not self.pending:
+            self.pending_start = get_monotonic()
+        self.pending.setdefault(sql, []).append(row)
+
+    def rotate(self, log_name: str):
+        if self.connection is None:
+            self.open()
+        self.log_id += 1
+        self.add_row(LOG_INSERT, (self.log_id, log_name, get_log_start_time(log_name)))
+
+    def append(self, message_type: MessageType, record: BaseRecord):
+        if self.connection is None:
+            raise ValueError('Telemetry database not open')
+        table = STREAM_TABLES[message_type]
+        self.add_row(table.insert, (self.log_id, *table.get_values(record)))
+
+    def flush_expired(self, max_age: float) -> bool:
+        if self.pending and get_monotonic() - self.pending_start >= max_age:
+            self.batches.extend(self.pending.items())
+            self.pending = {}
+        return bool(self.batches)
+
+    def sync(self):
+        logger = logging.getLogger('greybike')
+        with self.lock:
+            if self.connection is None:
+                return
+            batches: list[tuple[str, list[tuple[Any, ...]]]] = []
+            while self.batches:
+                batches.append(self.batches.popleft())
+            if not batches:
+                return
+            try:
+                self.connection.execute('BEGIN')
+                for sql, rows in batches:
+                    self.connection.executemany(sql, rows)
+                self.connection.execute('COMMIT')
+            except sqlite3.OperationalError as e:
+                # Locked database, full disk or I/O error. Batches are written again on next sync
+                if self.connection.in_transaction:
+                    self.connection.execute('ROLLBACK')
+                self.batches.extendleft(reversed(batches))
+                logger.warning('Log write failed, %d batches are kept for retry: %s', len(self.batches), e)
+                self.drop_old_batches()
+            except sqlite3.Error as e:
+                # Rows rejected by schema would fail every retry and block all later records
+                if self.connection.in_transaction:
+                    self.connection.execute('ROLLBACK')
+                self.dropped_batches += len(batches)
+                logger.error('Log write failed, %d batches are dropped: %s', len(batches), e)
+
+    def drop_old_batches(self):
+        """
+            Memory is limited while writes keep failing, so the oldest batches are dropped.
+            Rows of logs table are kept, records of later batches refer to them
+        """
+        logger = logging.getLogger('greybike')
+        kept: list[tuple[str, list[tuple[Any, ...]]]] = []
+        dropped = 0
+        while self.batches and len(self.batches) + len(kept) > SQLITE_RETRY_BATCH_LIMIT:
+            batch = self.batches.popleft()
+            if batch[0] == LOG_INSERT:
+                kept.append(batch)
+            else:
+                dropped += 1
+        self.batches.extendleft(reversed(kept))
+        if dropped:
+            self.dropped_batches += dropped
+            logger.error(
+                'Log write retry limit reached, %d oldest batches are dropped, %d since start',
+                dropped, self.dropped_batches
+            )
+
+    def close(self):
+        if self.connection is None:
+            return
+        logger = logging.getLogger('greybike')
+        logger.info('Closing telemetry database %s', self.path)
+        self.batches.extend(self.pending.items())
+        self.pending = {}
+        self.sync()
+        if self.batches:
+            logger.error('Closing telemetry database with %d unwritten batches', len(self.batches))
+        if self.dropped_batches:
+            logger.error('%d batches were dropped after write failures', self.dropped_batches)
+        with self.lock:
+            self.connection.close()
+            self.connection = None
+
+    def recover(self, log_name: str):
+        pass # Uncommitted transactions are rolled back by SQLite
+
+    def open_reader(self) -> sqlite3.Connection | None:
+        if not os.path.exists(self.path):
+            return None
+        # Streamed exports are advanced by next() in different executor threads, one call at a time
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+
+    def scan(self, message_type: MessageType, start: float, end: float) -> Iterator[Any]:
+        connection = self.open_reader()
+        if connection is None:
+            return
+        table = STREAM_TABLES[message_type]
+        try:
+            for row in connection.execute(table.select, (start, end)):
+                yield table.to_record(row)
+        finally:
+            connection.close()
+
+    def aggregate(self, start: float, end: float) -> AggregatedLogData:
+        """
+            Every log is aggregated separately and partial results are merged, like rotated text logs
+        """
+        connection = self.open_reader()
+        if connection is None:
+            return AggregatedLogData()
+        table = STREAM_TABLES[MessageType.CA]
+        partials: list[AggregatedLogData] = []
+        try:
+            rows = connection.execute(
+                f'SELECT log_id, {", ".join(table.columns)} FROM {table.name} '
+                'WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp, log_id',
+                (start, end),
+            )
+            for _, log_rows in groupby(rows, key=lambda row: row[0]):
+                result = AggregatedLogData()
+                for row in log_rows:
+                    update_aggregates(result, table.to_record(row[1:]))
+                partials.append(result)
+        finally:
+            connection.close()
+        return reduce(merge_aggregates, partials, AggregatedLogData())
+
+    def fetch_all(self, sql: str, parameters: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        connection = self.open_reader()
+        if connection is None:
+            return []
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def list_logs(self) -> list[str]:
+        return [name for name, in self.fetch_all('SELECT name FROM logs ORDER BY start', ())]
+
+    def find_logs(self, start: float, end: float) -> list[str]:
+        log_ids = ' UNION '.join(
+            f'SELECT log_id FROM {table.name} WHERE timestamp BETWEEN ? AND ?' for table in STREAM_TABLES.values()
+        )
+        rows = self.fetch_all(
+            f'SELECT name FROM logs WHERE id IN ({log_ids}) ORDER BY start', (start, end) * len(STREAM_TABLES)
+        )
+        return [name for name, in rows]
+
+    def read_log(self, message_type: MessageType, log_name: str) -> Iterator[Any]:
+        connection = self.open_reader()
+        if connection is None:
+            return
+        table = STREAM_TABLES[message_type]
+        try:
+            for row in connection.execute(table.select_log, (log_name,)):
+                yield table.to_record(row)
+        finally:
+            connection.close()
+
+    def read_rollups(self, message_type: MessageType, log_name: str, level: int) -> Iterator[dict[str, float | None]]:
+        """
+            Buckets are calculated from records on every request, database has no rollup tables
+        """
+        return rollup_records(message_type, self.read_log(message_type, log_name), level)
+
+    def get_log_revision(self, log_name: str) -> float:
+        """
+            Records are only added to logs, so record count changes with every write
+        """
+        counts = ' + '.join(
+            f'(SELECT COUNT(*) FROM {table.name} WHERE log_id = logs.id)' for table in STREAM_TABLES.values()
+        )
+        rows = self.fetch_all(f'SELECT {counts} FROM logs WHERE name = ?', (log_name,))
+        return float(rows[0][0]) if rows else 0.0
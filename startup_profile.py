@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Iterator
+import json
+import logging
+import os
+import time
+from constants import STARTUP_PROFILE_FILE
+
+
+@dataclass
+class StartupProfile:
+    """
+        Durations of service startup phases in seconds.
+        Saved when the first websocket frame is sent, so it shows real cold boot timings
+
+        Attributes:
+            process_start (float): Unix timestamp of process creation.
+            phases (dict): Phase durations in start order.
+            first_frame (float): Time from process creation to the first websocket frame.
+    """
+    process_start: float
+    phases: dict[str, float] = field(default_factory=lambda: {})
+    first_frame: float | None = None
+
+    def add_phase(self, name: str, start: float, end: float):
+        self.phases[name] = end - start
+
+
+@contextmanager
+def startup_phase(profile: StartupProfile, name: str) -> Iterator[None]:
+    start = time.time()
+    yield
+    profile.add_phase(name, start, time.time())
+
+
+def record_first_frame(profile: StartupProfile):
+    logger = logging.getLogger('greybike')
+    if profile.first_frame is not None:
+        return
+    profile.first_frame = time.time() - profile.process_start
+    logger.info('First websocket frame sent %.2fs after process start', profile.first_frame)
+    with open(STARTUP_PROFILE_FILE, 'w') as profile_file:
+        json.dump(asdict(profile), profile_file)
+
+
+def load_startup_profile() -> StartupProfile | None:
+    if not os.path.exists(STARTUP_PROFILE_FILE):
+        return None
+    try:
+        with open(STARTUP_PROFILE_FILE) as profile_file:
+            return StartupProfile(**json.load(profile_file))
+    except (ValueError, TypeError):
+        return None
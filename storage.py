@@ -0,0 +1,91 @@
+from typing import Any, Iterator
+from constants import STORAGE_BACKEND, SQLITE_DATABASE_FILE
+from data_types import AggregatedLogData, BaseRecord, MessageType
+
+
+class TelemetryStorage:
+    """
+        Storage backend of telemetry logs.
+        append, rotate and flush_expired are called from event loop and must not wait for disk.
+        sync is called in worker thread and makes flushed records durable.
+        CA records are stored with logged fields and scanned as LogRecord.
+        Logs are named after their start time, like text log files, and all queries read through storage
+    """
+    name = '' # Value of STORAGE_BACKEND
+
+    def rotate(self, log_name: str):
+        """
+            Starts new log. Records appended after rotation belong to it
+        """
+        raise NotImplementedError()
+
+    def append(self, message_type: MessageType, record: BaseRecord):
+        raise NotImplementedError()
+
+    def flush_expired(self, max_age: float) -> bool:
+        """
+            Passes buffered records older than max_age to disk. Returns True when sync is needed
+        """
+        raise NotImplementedError()
+
+    def sync(self):
+        raise NotImplementedError()
+
+    def close(self):
+        raise NotImplementedError()
+
+    def recover(self, log_name: str):
+        """
+            Called on startup for the last log, which could be cut by power loss
+        """
+        raise NotImplementedError()
+
+    def scan(self, message_type: MessageType, start: float, end: float) -> Iterator[Any]:
+        """
+            Records of one stream in time range, in timestamp order
+        """
+        raise NotImplementedError()
+
+    def aggregate(self, start: float, end: float) -> AggregatedLogData:
+        raise NotImplementedError()
+
+    def list_logs(self) -> list[str]:
+        """
+            Names of all logs sorted by start time
+        """
+        raise NotImplementedError()
+
+    def find_logs(self, start: float, end: float) -> list[str]:
+        """
+            Names of logs with records in time range
+        """
+        raise NotImplementedError()
+
+    def read_log(self, message_type: MessageType, log_name: str) -> Iterator[Any]:
+        """
+            Records of one stream of one log, in timestamp order
+        """
+        raise NotImplementedError()
+
+    def read_rollups(self, message_type: MessageType, log_name: str, level: int) -> Iterator[dict[str, float | None]]:
+        """
+            Min, max and mean buckets of one rollup level of one log, in timestamp order
+        """
+        raise NotImplementedError()
+
+    def get_log_revision(self, log_name: str) -> float:
+        """
+            Changes when records are added to log. Caches and indexes of logs are rebuilt when it changes
+        """
+        raise NotImplementedError()
+
+
+def open_storage(backend: str = STORAGE_BACKEND) -> TelemetryStorage:
+    # Backends import this module, so they are imported when storage is opened
+    if backend == 'sqlite':
+        from sqlite_storage import SqliteStorage
+        return SqliteStorage(SQLITE_DATABASE_FILE)
+    if backend == 'text':
+        from text_storage import TextLogStorage
+        return TextLogStorage()
+    raise ValueError(f'Unknown storage backend {backend}')
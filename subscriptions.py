@@ -0,0 +1,201 @@
+from typing import Any
+import json
+import logging
+from aiohttp import web
+from constants import SUBSCRIPTION_MAX_RATE, SUBSCRIPTION_RATE_TOLERANCE, DELTA_KEYFRAME_INTERVAL, DELTA_EPSILONS
+from data_types import AppState, MessageType, StreamSubscription
+
+# Messages which only carry changes since previous message. Dropping one would corrupt client state,
+# so requested rate is ignored for them
+INCREMENTAL_MESSAGE_TYPES = (MessageType.ROUTE,)
+SUBSCRIBABLE_MESSAGE_TYPES = (
+    MessageType.CA, MessageType.GNSS, MessageType.ELECTRIC, MessageType.SYSTEM,
+    MessageType.STATS, MessageType.TRIP, MessageType.ROUTE,
+)
+# Flat records which describe current state, so unchanged fields can be skipped
+DELTA_MESSAGE_TYPES = (MessageType.CA, MessageType.GNSS, MessageType.ELECTRIC, MessageType.SYSTEM)
+FULL_SUBSCRIPTION = StreamSubscription()
+
+
+def parse_stream_subscription(message_type: MessageType, data: dict[str, Any]) -> StreamSubscription:
+    if not isinstance(data, dict):
+        raise TypeError(f'Subscription of {message_type} must be object')
+    fields = data.get('fields')
+    if fields is not None and not isinstance(fields, list):
+        raise TypeError(f'Fields of {message_type} must be list')
+    rate = data.get('rate')
+    delta = bool(data.get('delta', False))
+    if rate is not None and not 0 < float(rate) <= SUBSCRIPTION_MAX_RATE:
+        raise ValueError(f'Rate must be between 0 and {SUBSCRIPTION_MAX_RATE}')
+    if delta and message_type not in DELTA_MESSAGE_TYPES:
+        raise ValueError(f'Delta encoding is not supported for {message_type}')
+    return StreamSubscription(
+        fields=None if fields is None else tuple(sorted(set(str(field) for field in fields))),
+        interval=0 if rate is None or message_type in INCREMENTAL_MESSAGE_TYPES else 1 / float(rate),
+        delta=delta,
+    )
+
+
+def parse_subscription(data: dict[str, Any]) -> dict[MessageType, StreamSubscription] | None:
+    """
+        Subscription from dashboard client. Streams which are not listed are not sent.
+        Fields and rate in messages per second are optional, all fields at full rate are sent without them.
+        Delta streams send keyframe with all fields every DELTA_KEYFRAME_INTERVAL
+        and only changed fields in between. Null streams restore default subscription to everything:
+        {"streams": {"ca": {"fields": ["speed", "current", "voltage"], "rate": 5, "delta": true}, "system": {"rate": 0.5}}}
+    """
+    streams = data['streams']
+    if streams is None:
+        return None
+    if not isinstance(streams, dict):
+        raise TypeError('Streams must be object')
+    subscription: dict[MessageType, StreamSubscription] = {}
+    for stream, stream_data in streams.items():
+        message_type = MessageType(stream)
+        if message_type not in SUBSCRIBABLE_MESSAGE_TYPES:
+            raise ValueError(f'Stream {stream} can not be subscribed to')
+        subscription[message_type] = parse_stream_subscription(message_type, stream_data or {})
+    return subscription
+
+
+def is_changed(value: Any, previous: Any, epsilon: float) -> bool:
+    if value == previous:
+        return False
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not isinstance(previous, (int, float)):
+        return True
+    return abs(value - previous) >= epsilon
+
+
+class StreamGroup:
+    """
+        Clients with equal subscription to one stream. They receive the same messages,
+        so message is encoded once per group and rate limit and delta state are kept per group.
+        Delta values are compared with the last sent values, so slow drift is sent once it exceeds epsilon
+    """
+
+    def __init__(self, message_type: MessageType, subscription: StreamSubscription):
+        self.message_type = message_type
+        self.subscription = subscription
+        self.epsilons = DELTA_EPSILONS.get(message_type, {})
+        self.last_sent: float | None = None
+        self.last_keyframe: float | None = None
+        self.sent_values: dict[str, Any] = {}
+        self.synced: set[web.WebSocketResponse] = set() # Clients which have received keyframe
+        self.data: dict[str, Any] | None = None
+        self.message: str | None = None
+        self.keyframe: str | None = None
+
+    def is_send_due(self, now: float) -> bool:
+        if self.last_sent is None or self.subscription.interval == 0:
+            return True
+        # Messages are produced by periodic tasks, so send times jitter around task interval
+        return now - self.last_sent >= self.subscription.interval - SUBSCRIPTION_RATE_TOLERANCE
+
+    def encode(self, data: dict[str, Any], delta: bool = False) -> str:
+        message: dict[str, Any] = {'type': self.message_type, 'data': data}
+        if delta:
+            message['delta'] = True
+        return json.dumps(message)
+
+    def get_changed_fields(self, data: dict[str, Any]) -> dict[str, Any]:
+        changed: dict[str, Any] = {}
+        for field, value in data.items():
+            if field not in self.sent_values or is_changed(value, self.sent_values[field], self.epsilons.get(field, 0)):
+                changed[field] = value
+        self.sent_values.update(changed)
+        return changed
+
+    def prepare(self, data: dict[str, Any], now: float):
+        """
+            Message for clients which are in sync. Keyframe is encoded on demand for new clients
+        """
+        self.data = None
+        self.message = None
+        self.keyframe = None
+        if not self.is_send_due(now):
+            return
+        self.last_sent = now
+        self.data = filter_fields(data, self.subscription.fields)
+        if not self.subscription.delta:
+            self.message = self.encode(self.data)
+        elif self.last_keyframe is None or now - self.last_keyframe >= DELTA_KEYFRAME_INTERVAL:
+            self.last_keyframe = now
+            self.sent_values = dict(self.data)
+            self.message = self.keyframe = self.encode(self.data)
+        else:
+            self.message = self.encode(self.get_changed_fields(self.data), delta=True)
+
+    def get_message(self, ws: web.WebSocketResponse) -> str | None:
+        if self.data is None or not self.subscription.delta or ws in self.synced:
+            return self.message
+        if self.keyframe is None:
+            self.keyframe = self.encode(self.data)
+        self.synced.add(ws)
+        return self.keyframe
+
+
+def discard_synced(state: AppState, ws: web.WebSocketResponse):
+    # Client can come back to delta group kept alive by other clients, it needs keyframe again
+    for group in state.stream_groups.values():
+        group.synced.discard(ws)
+
+
+async def set_subscription(
+    state: AppState, ws: web.WebSocketResponse, subscription: dict[MessageType, StreamSubscription] | None
+):
+    """
+        Route is sent as points added since previous send. Client which was not subscribed to it
+        missed some of them, so whole route is sent again, like keyframe of delta stream
+    """
+    # Route module sends messages through utils, which import this module
+    from route import get_route_message
+    logger = logging.getLogger('greybike')
+    had_route = get_stream_subscription(state, ws, MessageType.ROUTE) is not None
+    if subscription is None:
+        state.subscriptions.pop(ws, None)
+    else:
+        state.subscriptions[ws] = subscription
+    discard_synced(state, ws)
+    if had_route or get_stream_subscription(state, ws, MessageType.ROUTE) is None:
+        return
+    try:
+        await ws.send_str(json.dumps({'type': MessageType.ROUTE, 'data': get_route_message(state, 0)}))
+    except ConnectionResetError as e:
+        logger.error('Error sending websocket message: %s', e)
+
+
+def remove_client(state: AppState, ws: web.WebSocketResponse):
+    state.subscriptions.pop(ws, None)
+    discard_synced(state, ws)
+
+
+def get_stream_subscription(
+    state: AppState, ws: web.WebSocketResponse, message_type: MessageType
+) -> StreamSubscription | None:
+    """
+        None means client is not subscribed to the stream.
+        Clients which never sent subscription get every stream, so older dashboards keep working
+    """
+    subscription = state.subscriptions.get(ws)
+    if subscription is None:
+        return FULL_SUBSCRIPTION
+    return subscription.get(message_type)
+
+
+def get_stream_group(state: AppState, message_type: MessageType, subscription: StreamSubscription) -> StreamGroup:
+    key = (message_type, subscription)
+    if key not in state.stream_groups:
+        state.stream_groups[key] = StreamGroup(message_type, subscription)
+    return state.stream_groups[key]
+
+
+def filter_fields(data: dict[str, Any], fields: tuple[str, ...] | None) -> dict[str, Any]:
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields if field in data}
+
+
+def remove_unused_groups(state: AppState, message_type: MessageType, used: set[StreamSubscription]):
+    for key in list(state.stream_groups):
+        if key[0] == message_type and key[1] not in used:
+            del state.stream_groups[key]
@@ -1,5 +1,6 @@
 from typing import Any, Coroutine, TypeVar, Callable
 from data_types import TaskData, AppState
+from load_governor import TaskPriority
 import asyncio
 import logging
 
@@ -11,10 +12,10 @@ def _handle_task_result(task: asyncio.Task[Any]) -> None:
     try:
         task.result()
     except asyncio.CancelledError:
-        logger.info(f'Task "{task.get_name()}" was cancelled')
+        logger.info('Task "%s" was cancelled', task.get_name())
 
     except Exception:  # pylint: disable=broad-except
-        logger.error(f'Exception raised by task {task}')
+        logger.error('Exception raised by task %s', task)
 
 
 TaskResult = TypeVar('TaskResult')
@@ -32,17 +33,40 @@ def create_periodic_task(
     app_state: AppState,
     name: str,
     interval: float,
+    priority: TaskPriority = TaskPriority.CRITICAL,
 ) -> None:
+    """
+        Interval of non-critical tasks is scaled by load governor. Paused tasks check load level every interval
+    """
     logger = logging.getLogger('greybike')
     async def closure():
         while True:
+            factor = app_state.load_governor.get_interval_factor(priority)
+            if factor is None:
+                await asyncio.sleep(interval)
+                continue
             await async_function(app_state)
-            await asyncio.sleep(interval)
-    logger.info(f"Creating task {name} with interval {interval}")
+            await asyncio.sleep(interval * factor)
+    logger.info('Creating task %s with interval %s', name, interval)
     task = TaskData(
         name=name,
         task=create_task(closure(), name=name),
-        interval=interval
+        interval=interval,
+        priority=priority
+    )
+    app_state.tasks.append(task)
+
+def create_background_task(
+    async_function: Callable[[AppState], Coroutine[Any, Any, None]],
+    app_state: AppState,
+    name: str,
+) -> None:
+    logger = logging.getLogger('greybike')
+    logger.info('Creating background task %s', name)
+    task = TaskData(
+        name=name,
+        task=create_task(async_function(app_state), name=name),
+        interval=None
     )
     app_state.tasks.append(task)
 
@@ -0,0 +1,144 @@
+from multiprocessing.shared_memory import SharedMemory
+import struct
+import zlib
+from data_types import BaseRecord, CATelemetryRecord, ElectricalRecord, GNSSRecord, MessageType
+from serializers import get_serializer
+
+# Stream index in slot header is position in this tuple
+BUS_STREAMS: tuple[tuple[MessageType, type[BaseRecord]], ...] = (
+    (MessageType.CA, CATelemetryRecord),
+    (MessageType.GNSS, GNSSRecord),
+    (MessageType.ELECTRIC, ElectricalRecord),
+)
+BUS_HEADER = struct.Struct('<QQQ') # Write count, log reset requests, memory report requests
+SLOT_HEADER = struct.Struct('<QBHI') # Sequence, stream index, payload length, CRC32
+SLOT_CRC_PREFIX = struct.Struct('<QB') # Sequence and stream index are covered by slot CRC
+COUNTER = struct.Struct('<Q') # Slot sequence and header counters
+SLOT_PAYLOAD_OFFSET = 16
+LOG_RESET_OFFSET = 8
+MEMORY_REPORT_OFFSET = 16
+
+
+def get_slot_crc(sequence: int, stream: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(SLOT_CRC_PREFIX.pack(sequence, stream)))
+
+
+class TelemetryBus:
+    """
+        Shared memory ring of records from acquisition process to web process.
+        There is exactly one writer and one reader. Writer never waits for reader,
+        slow reader loses the oldest records instead.
+        Each slot is a seqlock: sequence is odd while slot is written and 2 * (index + 1) after.
+        Reader copies payload and checks that sequence did not change during copy.
+        Stores to shared memory are plain memory writes without barriers. On weakly ordered CPUs,
+        like Cortex-A53 of Pi Zero 2 W, reader can see final sequence before payload bytes.
+        Torn payload still unpacks without error, so slot also has CRC of its sequence, stream and payload,
+        which reader checks against the sequence it expects. Mixed old and new bytes are dropped like lapped slots.
+        Records are packed with precompiled struct of their record type
+    """
+
+    def __init__(self, slots: int, slot_size: int):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.memory = SharedMemory(create=True, size=BUS_HEADER.size + slots * slot_size)
+        BUS_HEADER.pack_into(self.memory.buf, 0, 0, 0, 0)
+        self.is_owner = True # Forked acquisition process must not unlink memory of web process
+        self.stream_index = {message_type: index for index, (message_type, _) in enumerate(BUS_STREAMS)}
+        self.stream_serializers = [get_serializer(record_type) for _, record_type in BUS_STREAMS]
+        self.write_count = 0
+        self.read_count = 0
+        self.dropped = 0 # Records overwritten before reader got them
+        self.log_resets_seen = 0
+        self.memory_reports_seen = 0
+
+    def _slot_offset(self, index: int) -> int:
+        return BUS_HEADER.size + (index % self.slots) * self.slot_size
+
+    def publish(self, message_type: MessageType, record: BaseRecord):
+        stream = self.stream_index[message_type]
+        payload = self.stream_serializers[stream].pack(record)
+        if len(payload) > self.slot_size - SLOT_PAYLOAD_OFFSET:
+            raise ValueError(f'{message_type} record does not fit into bus slot')
+        index = self.write_count
+        offset = self._slot_offset(index)
+        buf = self.memory.buf
+        SLOT_HEADER.pack_into(
+            buf, offset, 2 * index + 1, stream, len(payload), get_slot_crc(2 * index + 2, stream, payload)
+        )
+        buf[offset + SLOT_PAYLOAD_OFFSET:offset + SLOT_PAYLOAD_OFFSET + len(payload)] = payload
+        COUNTER.pack_into(buf, offset, 2 * index + 2)
+        self.write_count = index + 1
+        COUNTER.pack_into(buf, 0, self.write_count)
+
+    def _decode(self, stream: int, payload: bytes) -> tuple[MessageType, BaseRecord] | None:
+        if stream >= len(BUS_STREAMS):
+            return None
+        try:
+            return BUS_STREAMS[stream][0], self.stream_serializers[stream].unpack(payload)
+        except (struct.error, UnicodeDecodeError):
+            return None
+
+    def read(self) -> list[tuple[MessageType, BaseRecord]]:
+        """
+            Records published since previous call
+        """
+        buf = self.memory.buf
+        write_count = COUNTER.unpack_from(buf, 0)[0]
+        if write_count - self.read_count > self.slots:
+            self.dropped += write_count - self.read_count - self.slots
+            self.read_count = write_count - self.slots
+        records: list[tuple[MessageType, BaseRecord]] = []
+        while self.read_count < write_count:
+            index = self.read_count
+            self.read_count += 1
+            offset = self._slot_offset(index)
+            sequence, stream, length, crc = SLOT_HEADER.unpack_from(buf, offset)
+            payload = bytes(buf[offset + SLOT_PAYLOAD_OFFSET:offset + SLOT_PAYLOAD_OFFSET + length])
+            if sequence != 2 * index + 2 or COUNTER.unpack_from(buf, offset)[0] != sequence:
+                self.dropped += 1 # Slot was rewritten by next lap of writer
+                continue
+            if crc != get_slot_crc(sequence, stream, payload):
+                self.dropped += 1 # Payload stores were not visible yet or slot is torn
+                continue
+            record = self._decode(stream, payload)
+            if record is None:
+                self.dropped += 1
+                continue
+            records.append(record)
+        return records
+
+    def _add_request(self, offset: int) -> int:
+        """
+            Called by web process. Counters are written only by web process and read by acquisition process
+        """
+        requests = COUNTER.unpack_from(self.memory.buf, offset)[0] + 1
+        COUNTER.pack_into(self.memory.buf, offset, requests)
+        return requests
+
+    def request_log_reset(self):
+        self._add_request(LOG_RESET_OFFSET)
+
+    def take_log_reset_request(self) -> bool:
+        requests = COUNTER.unpack_from(self.memory.buf, LOG_RESET_OFFSET)[0]
+        if requests == self.log_resets_seen:
+            return False
+        self.log_resets_seen = requests
+        return True
+
+    def request_memory_report(self) -> int:
+        """
+            Returns request number, which acquisition process writes with its report
+        """
+        return self._add_request(MEMORY_REPORT_OFFSET)
+
+    def take_memory_report_request(self) -> int | None:
+        requests = COUNTER.unpack_from(self.memory.buf, MEMORY_REPORT_OFFSET)[0]
+        if requests == self.memory_reports_seen:
+            return None
+        self.memory_reports_seen = requests
+        return requests
+
+    def close(self):
+        self.memory.close()
+        if self.is_owner:
+            self.memory.unlink()
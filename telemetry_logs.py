@@ -1,10 +1,21 @@
-from constants import LOG_VERSION, TELEMETRY_LOG_DIRECTORY, LOG_RECORD_COUNT_LIMIT
-from datetime import datetime
-from data_types import AppState, CATelemetryRecord
-from dataclasses import dataclass, fields, asdict
-from typing import Generator
+from constants import (
+    LOG_VERSION, TELEMETRY_LOG_DIRECTORY, LOG_RECORD_COUNT_LIMIT, MAX_SAMPLE_DURATION,
+    LOG_BLOCK_RECORDS, LOG_BLOCK_INTERVAL, ROLLUP_LEVELS
+)
+from clock import get_now
+from data_types import (
+    AppState, CATelemetryRecord, ElectricalRecord, GNSSRecord, SystemTelemetryRecord, AggregatedLogData, MessageType
+)
+from dataclasses import dataclass, fields
+from typing import Callable, Generator, BinaryIO, Iterator, TypeVar
+from log_blocks import LogBlockWriter, iter_log_blocks, find_last_valid_block
+from rollups import ROLLUP_CHANNELS, RollupPyramid, get_rollup_fields, get_channel_values
+import asyncio
 import os
 import logging
+from utils import split_power
+from serializers import get_serializer
+from storage import TelemetryStorage
 
 LOG_HEADER_TEMPLATE = """GREYBIKE LOG
 VERSION v{version}
@@ -28,106 +39,382 @@ class LogRecord:
     throttle_output: float | None = None
     mode: float | None = None
 
-class AggregatedLogData:
-    max_speed: float = 0
-    max_regen_watts: float = 0
-    max_motor_watts: float = 0
-    max_human_watts: float = 0
-    total_human_watt_hours: float = 0
-    total_regen_watt_hours: float = 0
-    total_motor_watt_hours: float = 0
-    total_distance: float = 0
-    total_records: int = 0
-
 def get_log_fields():
     return [field.name for field in fields(LogRecord)]
 
+LOG_RECORD_FIELDS = set(get_log_fields())
+GNSS_LOG_FIELDS = [field.name for field in fields(GNSSRecord)]
+ELECTRIC_LOG_FIELDS = [field.name for field in fields(ElectricalRecord)]
+LAST_LINE_CHUNK_SIZE = 4096
+ROLLUP_BUILD_SUFFIX = '.tmp'
+encode_ca_log_line = get_serializer(CATelemetryRecord).get_csv_encoder(get_log_fields(), {'timestamp': '.2f'})
+encode_gnss_log_line = get_serializer(GNSSRecord).get_csv_encoder(GNSS_LOG_FIELDS)
+encode_electric_log_line = get_serializer(ElectricalRecord).get_csv_encoder(ELECTRIC_LOG_FIELDS)
+
+
+def get_storage(state: AppState) -> TelemetryStorage:
+    if state.storage is None:
+        raise ValueError('Telemetry storage not open')
+    return state.storage
+
 
 def write_to_log(state: AppState, telemetry: CATelemetryRecord | None):
     if telemetry is not None:
         if state.log_record_count >= LOG_RECORD_COUNT_LIMIT:
             reset_log(state)
-        data = asdict(telemetry)
-        data['timestamp'] = "%.2f" % telemetry.timestamp
-        log_record = ','.join(str(data[field]) for field in get_log_fields())
-        if state.log_file is None:
-            raise ValueError('Log file not open')
-        state.log_file.write(f'{log_record}\n')
+        get_storage(state).append(MessageType.CA, telemetry)
 
 
-def reset_log(state: AppState):
+def write_gnss_to_log(state: AppState, record: GNSSRecord):
+    """
+        GNSS fixes are logged with current telemetry log and added to spatial index
+    """
+    get_storage(state).append(MessageType.GNSS, record)
+    state.geo_index.add_fix(state.log_files[-1], record.timestamp, record.latitude, record.longitude)
+
+
+def write_electric_to_log(state: AppState, record: ElectricalRecord):
+    get_storage(state).append(MessageType.ELECTRIC, record)
+
+
+def write_system_to_log(state: AppState, record: SystemTelemetryRecord):
+    get_storage(state).append(MessageType.SYSTEM, record)
+
+
+def get_gnss_log_name(log_file_name: str) -> str:
+    return f'{log_file_name.removesuffix(".log")}.gnss'
+
+
+def get_electric_log_name(log_file_name: str) -> str:
+    return f'{log_file_name.removesuffix(".log")}.electric'
+
+
+def get_rollup_log_name(log_file_name: str, message_type: MessageType, level: int) -> str:
+    return f'{log_file_name.removesuffix(".log")}.{message_type}.r{level}'
+
+
+def open_log_writer(log_file_name: str, log_fields: list[str]) -> LogBlockWriter:
+    log_file = open(os.path.join(TELEMETRY_LOG_DIRECTORY, log_file_name), 'wb')
+    log_header = LOG_HEADER_TEMPLATE.format(
+        version=LOG_VERSION, fields=','.join(log_fields)
+    )
+    log_file.write(log_header.encode())
+    # Header is made durable at once, streams without records would otherwise leave empty file on power loss
+    log_file.flush()
+    os.fsync(log_file.fileno())
+    return LogBlockWriter(log_file, LOG_BLOCK_RECORDS)
+
+
+def open_rollups(log_file_name: str, message_type: MessageType, suffix: str = '') -> RollupPyramid:
+    channels = ROLLUP_CHANNELS[message_type]
+    return RollupPyramid(len(channels), {
+        level: open_log_writer(
+            get_rollup_log_name(log_file_name, message_type, level) + suffix, get_rollup_fields(channels)
+        )
+        for level in ROLLUP_LEVELS
+    })
+
+
+def build_rollups(log_file_name: str):
+    """
+        Rollups of log written before rollups existed or cut by power loss.
+        Rollups are built under temporary names and renamed when complete,
+        so interrupted build leaves no rollups and is started again on next request
+    """
     logger = logging.getLogger('greybike')
-    if state.log_file is not None:
-        logger.info(f'Closing log file {state.log_file.name}')
-        state.log_file.close()
-        state.log_file = None
+    logger.info('Building rollups of %s', log_file_name)
+    rollups = open_rollups(log_file_name, MessageType.CA, ROLLUP_BUILD_SUFFIX)
+    try:
+        for record in read_log_file(log_file_name):
+            rollups.add(record.timestamp, get_channel_values(MessageType.CA, record))
+    finally:
+        rollups.close()
+    rollups = open_rollups(log_file_name, MessageType.ELECTRIC, ROLLUP_BUILD_SUFFIX)
+    try:
+        for electric_record in read_electric_log_file(log_file_name):
+            rollups.add(electric_record.timestamp, get_channel_values(MessageType.ELECTRIC, electric_record))
+    finally:
+        rollups.close()
+    for message_type in ROLLUP_CHANNELS:
+        for level in ROLLUP_LEVELS:
+            file_path = os.path.join(TELEMETRY_LOG_DIRECTORY, get_rollup_log_name(log_file_name, message_type, level))
+            os.replace(file_path + ROLLUP_BUILD_SUFFIX, file_path)
+
+
+def remove_rollups(log_file_name: str):
+    """
+        Open buckets are lost on power cut, rollups are built again from raw log when needed
+    """
+    for message_type in ROLLUP_CHANNELS:
+        for level in ROLLUP_LEVELS:
+            file_path = os.path.join(TELEMETRY_LOG_DIRECTORY, get_rollup_log_name(log_file_name, message_type, level))
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+def close_log(state: AppState):
+    if state.storage is not None:
+        state.storage.close()
+
+
+def reset_log(state: AppState):
+    """
+        Starts new log named after its start time. Previous log is closed by storage
+    """
     state.log_record_count = 0
-    state.log_start_time = datetime.now()
+    state.log_start_time = get_now()
     log_file_name = f'{state.log_start_time.isoformat()}.log'
-    log_file_path = os.path.join(TELEMETRY_LOG_DIRECTORY, log_file_name)
-    logger.info(f'Logging telemetry to {log_file_path}')
-    log_file = open(log_file_path, 'w+')
-    log_header = LOG_HEADER_TEMPLATE.format(
-        version=LOG_VERSION, fields=','.join(get_log_fields())
-    )
-    log_file.write(log_header)
-    state.log_file = log_file
+    get_storage(state).rotate(log_file_name)
     state.log_files.append(log_file_name)
 
 
+async def log_flush_task(state: AppState):
+    """
+        Writes records buffered for LOG_BLOCK_INTERVAL and makes them durable outside of event loop
+    """
+    if state.storage is not None and state.storage.flush_expired(LOG_BLOCK_INTERVAL):
+        await asyncio.to_thread(state.storage.sync)
+
+
 def get_fields_from_log_header(header: str) -> list[str]:
-    return header.split('FIELDS ')[1].split(',')
+    return header.strip().split('FIELDS ')[1].split(',')
+
+
+def read_log_header(log_file: BinaryIO) -> tuple[str, list[str]] | None:
+    """
+        Returns log version and field names. File position is moved to the first record.
+        None for file without complete header, for example empty file created just before power loss
+    """
+    lines = [log_file.readline() for _ in range(3)]
+    if not all(line.endswith(b'\n') for line in lines):
+        return None
+    if not lines[0].startswith(b'GREYBIKE LOG'):
+        raise ValueError('Invalid log file')
+    version = lines[1].decode().split('v')[1].strip()
+    return version, get_fields_from_log_header(lines[2].decode())
+
+
+def parse_log_values(line: bytes, fields: list[str], record_fields: set[str]) -> dict[str, float | None] | None:
+    """
+        Lines cut by power loss or with missing values are skipped
+    """
+    values = line.split(b',')
+    if len(values) != len(fields):
+        return None
+    data: dict[str, float | None] = {}
+    try:
+        for field, value in zip(fields, values):
+            if field in record_fields:
+                data[field] = None if value.strip() == b'None' else float(value)
+    except ValueError:
+        return None
+    if data.get('timestamp') is None:
+        return None
+    return data
+
+
+def parse_log_line(line: bytes, fields: list[str]) -> LogRecord | None:
+    data = parse_log_values(line, fields, LOG_RECORD_FIELDS)
+    if data is None:
+        return None
+    return LogRecord(**data) # type: ignore
+
+
+def parse_gnss_log_line(line: bytes, fields: list[str]) -> GNSSRecord | None:
+    data = parse_log_values(line, fields, set(GNSS_LOG_FIELDS))
+    if data is None or data.get('latitude') is None or data.get('longitude') is None:
+        return None
+    if data.get('sat_num') is not None:
+        data['sat_num'] = int(data['sat_num']) # type: ignore
+    return GNSSRecord(**data) # type: ignore
+
+
+def parse_electric_log_line(line: bytes, fields: list[str]) -> ElectricalRecord | None:
+    data = parse_log_values(line, fields, set(ELECTRIC_LOG_FIELDS))
+    if data is None or data.get('current') is None or data.get('voltage') is None:
+        return None
+    return ElectricalRecord(**data) # type: ignore
+
+
+def iter_log_lines(log_file: BinaryIO, version: str) -> Iterator[bytes]:
+    if version == '1':
+        for line in log_file:
+            yield line
+        return
+    for block in iter_log_blocks(log_file, log_file.tell()):
+        yield from block.payload.splitlines()
 
 
 def read_log_file(file_name: str) -> Generator[LogRecord, None, None]:
     logger = logging.getLogger('greybike')
-    with open(os.path.join(TELEMETRY_LOG_DIRECTORY, file_name)) as log_file:
-        header = log_file.readline()
-        if not header.startswith('GREYBIKE LOG'):
-            raise ValueError('Invalid log file')
-        version = log_file.readline().split('v')[1].strip()
-        logger.debug(f'Log file version {version}')
-        fields_line = log_file.readline()
-        fields = get_fields_from_log_header(fields_line)
-        log_obj_fields = set(get_log_fields())
-        while True:
-            line = log_file.readline()
-            if not line:
-                break
-            values = line.split(',')
-            data = {field: float(values[i]) for i, field in enumerate(fields)}
-
-            yield LogRecord(**{k: v for k, v in data.items() if k in log_obj_fields})
+    with open(os.path.join(TELEMETRY_LOG_DIRECTORY, file_name), 'rb') as log_file:
+        header = read_log_header(log_file)
+        if header is None:
+            return
+        version, fields = header
+        logger.debug('Log file version %s', version)
+        for line in iter_log_lines(log_file, version):
+            record = parse_log_line(line, fields)
+            if record is not None:
+                yield record
+
+
+CompanionRecord = TypeVar('CompanionRecord')
+
+def read_companion_log_file(
+    companion_file_name: str, parse_line: Callable[[bytes, list[str]], CompanionRecord | None]
+) -> Generator[CompanionRecord, None, None]:
+    """
+        Records from companion log of other stream. Logs written before the stream was logged have no companion
+    """
+    file_path = os.path.join(TELEMETRY_LOG_DIRECTORY, companion_file_name)
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'rb') as log_file:
+        header = read_log_header(log_file)
+        if header is None:
+            return
+        version, fields = header
+        for line in iter_log_lines(log_file, version):
+            record = parse_line(line, fields)
+            if record is not None:
+                yield record
+
+
+def read_gnss_log_file(file_name: str) -> Generator[GNSSRecord, None, None]:
+    """
+        GNSS fixes logged together with telemetry log file_name
+    """
+    return read_companion_log_file(get_gnss_log_name(file_name), parse_gnss_log_line)
+
+
+def read_electric_log_file(file_name: str) -> Generator[ElectricalRecord, None, None]:
+    """
+        Electrical records logged together with telemetry log file_name
+    """
+    return read_companion_log_file(get_electric_log_name(file_name), parse_electric_log_line)
+
+
+def read_last_log_record(file_name: str) -> LogRecord | None:
+    """
+        Last valid record. Only the end of the file is read
+    """
+    with open(os.path.join(TELEMETRY_LOG_DIRECTORY, file_name), 'rb') as log_file:
+        header = read_log_header(log_file)
+        if header is None:
+            return None
+        version, fields = header
+        if version == '1':
+            data_offset = log_file.tell()
+            file_size = log_file.seek(0, os.SEEK_END)
+            log_file.seek(max(data_offset, file_size - LAST_LINE_CHUNK_SIZE))
+            lines = log_file.read().split(b'\n')
+        else:
+            block = find_last_valid_block(log_file, log_file.tell())
+            lines = block.payload.splitlines() if block is not None else []
+    for line in reversed(lines):
+        record = parse_log_line(line, fields)
+        if record is not None:
+            return record
+    return None
+
+
+def recover_log_file(file_name: str):
+    """
+        Truncates data written after the last valid block, for example block cut by power loss.
+        New blocks can be safely appended after recovery
+    """
+    logger = logging.getLogger('greybike')
+    file_path = os.path.join(TELEMETRY_LOG_DIRECTORY, file_name)
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, 'r+b') as log_file:
+        header = read_log_header(log_file)
+        if header is None:
+            logger.warning('Log file %s has no header. It is read as empty log', file_name)
+            return
+        version, _ = header
+        if version == '1':
+            return
+        data_offset = log_file.tell()
+        file_size = log_file.seek(0, os.SEEK_END)
+        last_block = find_last_valid_block(log_file, data_offset)
+        valid_end = last_block.end if last_block is not None else data_offset
+        if valid_end < file_size:
+            logger.warning('Log file %s recovered. %d bytes of broken data removed', file_name, file_size - valid_end)
+            log_file.truncate(valid_end)
+
+
+def update_aggregates(result: AggregatedLogData, record: LogRecord | CATelemetryRecord):
+    """
+        Updates aggregates with one record. Used both for live trip data and for log files
+    """
+    if result.last_timestamp is not None and record.timestamp <= result.last_timestamp:
+        return # Same record can be logged several times
+    result.total_records += 1
+    duration = record.timestamp - result.last_timestamp if result.last_timestamp is not None else 0.1
+    if duration > 1:
+        duration = 0.1
+    if record.current and record.voltage:
+        motor_watts, regen_watts = split_power(record.voltage, record.current)
+        result.max_regen_watts = max(result.max_regen_watts, regen_watts)
+        result.total_regen_watt_hours += (regen_watts / 3600) * duration
+        result.max_motor_watts = max(result.max_motor_watts, motor_watts)
+        result.total_motor_watt_hours += (motor_watts / 3600) * duration
+    if result.first_timestamp is None:
+        result.first_timestamp = record.timestamp
+    if result.first_distance is None:
+        result.first_distance = record.trip_distance
+    if record.trip_distance is not None:
+        if result.last_distance is not None and record.trip_distance > result.last_distance:
+            # Cycle Analyst trip distance can be reset during the ride. Only increments are counted
+            result.total_distance += record.trip_distance - result.last_distance
+        result.last_distance = record.trip_distance
+    result.last_timestamp = record.timestamp
+    if record.speed is not None:
+        result.max_speed = max(result.max_speed, record.speed)
+    if record.human_watts is not None:
+        result.max_human_watts = max(result.max_human_watts, record.human_watts)
+        result.total_human_watt_hours += (record.human_watts / 3600) * duration
+
+
+def merge_aggregates(first: AggregatedLogData, second: AggregatedLogData) -> AggregatedLogData:
+    """
+        Combines aggregates of two consecutive time ranges, for example two rotated log files
+    """
+    if first.total_records == 0:
+        return second
+    if second.total_records == 0:
+        return first
+    result = AggregatedLogData(
+        max_speed=max(first.max_speed, second.max_speed),
+        max_regen_watts=max(first.max_regen_watts, second.max_regen_watts),
+        max_motor_watts=max(first.max_motor_watts, second.max_motor_watts),
+        max_human_watts=max(first.max_human_watts, second.max_human_watts),
+        total_human_watt_hours=first.total_human_watt_hours + second.total_human_watt_hours,
+        total_regen_watt_hours=first.total_regen_watt_hours + second.total_regen_watt_hours,
+        total_motor_watt_hours=first.total_motor_watt_hours + second.total_motor_watt_hours,
+        total_distance=first.total_distance + second.total_distance,
+        total_records=first.total_records + second.total_records,
+        first_timestamp=first.first_timestamp,
+        first_distance=first.first_distance,
+        last_timestamp=second.last_timestamp,
+        last_distance=second.last_distance,
+    )
+    if (
+        first.last_timestamp is not None and second.first_timestamp is not None
+        and second.first_timestamp - first.last_timestamp <= MAX_SAMPLE_DURATION
+        and first.last_distance is not None and second.first_distance is not None
+        and second.first_distance > first.last_distance
+    ):
+        # Distance between last record of first range and first record of directly following one
+        result.total_distance += second.first_distance - first.last_distance
+    return result
 
 
 def calculate_log_agregates(file_name: str, start: float, end: float):
     result = AggregatedLogData()
-    prev_timestamp = None
-    start_distance = None
-    end_distance = None
     for record in read_log_file(file_name):
         if record.timestamp >= start and record.timestamp <= end:
-            result.total_records += 1
-            duration = record.timestamp - prev_timestamp if prev_timestamp is not None else 0.1
-            if duration > 1:
-                duration = 0.1
-            if record.current and record.voltage:
-                if record.current < 0:
-                    regen_watts = -(record.voltage * record.current)
-                    result.max_regen_watts = max(result.max_regen_watts, regen_watts)
-                    result.total_regen_watt_hours += (regen_watts / 3600) * duration
-                else:
-                    motor_watts = record.voltage * record.current
-                    result.max_motor_watts = max(result.max_motor_watts, motor_watts)
-                    result.total_motor_watt_hours += (motor_watts / 3600) * duration
-            if start_distance is None:
-                start_distance = record.trip_distance
-            end_distance = record.trip_distance
-            prev_timestamp = record.timestamp
-            if record.speed is not None:
-                result.max_speed = max(result.max_speed, record.speed)
-            if record.human_watts is not None:
-                result.max_human_watts = max(result.max_human_watts, record.human_watts)
-                result.total_human_watt_hours += (record.human_watts / 3600) * duration
-    result.total_distance = end_distance - start_distance if start_distance is not None and end_distance is not None else 0
-    return result
\ No newline at end of file
+            update_aggregates(result, record)
+    return result
@@ -0,0 +1,47 @@
+import logging
+import unittest
+from unittest import mock
+from app_logging import RateLimitFilter
+
+
+def make_record(message: str, level: int = logging.WARNING) -> logging.LogRecord:
+    return logging.LogRecord('greybike', level, __file__, 0, message, None, None)
+
+
+class RateLimitFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('app_logging.time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time.monotonic.return_value = 100.0
+        self.filter = RateLimitFilter(interval=10, burst=2)
+
+    def test_suppressed_count_is_added_to_next_window(self):
+        passed = [self.filter.filter(make_record('Read failed %s')) for _ in range(5)]
+        self.assertEqual(passed, [True, True, False, False, False])
+        self.time.monotonic.return_value = 110.0
+        record = make_record('Read failed %s')
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual(record.msg, 'Read failed %s (3 similar messages suppressed)')
+        self.assertEqual(self.filter.flush_expired(), (logging.NOTSET, {}))
+
+    def test_flush_expired(self):
+        for _ in range(4):
+            self.filter.filter(make_record('Port closed', logging.ERROR))
+        for value in range(3):
+            self.filter.filter(make_record(f'Value {value}'))
+        self.time.monotonic.return_value = 105.0
+        self.filter.filter(make_record('Late message'))
+        self.assertEqual(self.filter.flush_expired(), (logging.NOTSET, {}))
+        self.time.monotonic.return_value = 110.0
+        self.assertEqual(self.filter.flush_expired(), (logging.ERROR, {'Port closed': 2}))
+        self.assertEqual(list(self.filter.windows), [('greybike', logging.WARNING, 'Late message')])
+        # Count is reported once, next record of the message starts new window
+        record = make_record('Port closed', logging.ERROR)
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual(record.msg, 'Port closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
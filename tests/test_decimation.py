@@ -0,0 +1,67 @@
+import math
+import unittest
+from decimation import lttb, min_max_decimate
+
+LENGTH = 1000
+PEAK_INDEX = 537
+DIP_INDEX = 212
+
+
+def get_signal() -> tuple[list[float], list[float]]:
+    # Slow wave with one sample spike and one sample dip, like current of short hard acceleration and regen
+    timestamps = [index * 0.1 for index in range(LENGTH)]
+    values = [math.sin(index / 100) for index in range(LENGTH)]
+    values[PEAK_INDEX] = 10.0
+    values[DIP_INDEX] = -10.0
+    return timestamps, values
+
+
+class LttbTest(unittest.TestCase):
+
+    def test_peaks_are_kept(self):
+        timestamps, values = get_signal()
+        indexes = lttb(timestamps, values, 50)
+        self.assertEqual(len(indexes), 50)
+        self.assertEqual(indexes, sorted(set(indexes)))
+        self.assertEqual(indexes[0], 0)
+        self.assertEqual(indexes[-1], LENGTH - 1)
+        self.assertIn(PEAK_INDEX, indexes)
+        self.assertIn(DIP_INDEX, indexes)
+
+    def test_threshold_not_below_length(self):
+        timestamps, values = get_signal()
+        self.assertEqual(lttb(timestamps, values, LENGTH), list(range(LENGTH)))
+        self.assertEqual(lttb(timestamps, values, LENGTH + 1), list(range(LENGTH)))
+        self.assertEqual(lttb(timestamps[:2], values[:2], 3), [0, 1])
+        self.assertEqual(lttb([], [], 10), [])
+
+    def test_threshold_too_small(self):
+        timestamps, values = get_signal()
+        self.assertEqual(len(lttb(timestamps, values, 2)), LENGTH)
+        self.assertEqual(lttb(timestamps, values, 3)[1], PEAK_INDEX)
+
+
+class MinMaxDecimateTest(unittest.TestCase):
+
+    def test_peaks_are_kept(self):
+        _, values = get_signal()
+        indexes = min_max_decimate(values, 50)
+        self.assertLessEqual(len(indexes), 50)
+        self.assertEqual(indexes, sorted(set(indexes)))
+        self.assertIn(PEAK_INDEX, indexes)
+        self.assertIn(DIP_INDEX, indexes)
+        self.assertIn(values.index(min(values[DIP_INDEX + 1:])), indexes)
+
+    def test_constant_bucket(self):
+        self.assertEqual(min_max_decimate([1.0] * 10, 4), [0, 5])
+
+    def test_threshold_not_below_length(self):
+        _, values = get_signal()
+        self.assertEqual(min_max_decimate(values, LENGTH), list(range(LENGTH)))
+        self.assertEqual(min_max_decimate(values, LENGTH + 1), list(range(LENGTH)))
+        self.assertEqual(min_max_decimate(values, 1), list(range(LENGTH)))
+        self.assertEqual(min_max_decimate([], 10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
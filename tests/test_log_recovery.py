@@ -0,0 +1,133 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from log_blocks import BLOCK_HEADER, LogBlockWriter, find_last_valid_block, iter_log_blocks
+from telemetry_logs import LOG_HEADER_TEMPLATE, read_log_file, recover_log_file, parse_log_values
+
+FIELDS = ['timestamp', 'speed', 'current']
+HEADER = LOG_HEADER_TEMPLATE.format(version=2, fields=','.join(FIELDS)).encode()
+LOG_NAME = '2026-06-01T10:00:00.000000.log'
+
+
+def record_line(timestamp: float) -> bytes:
+    return f'{timestamp:.2f},25.0,None\n'.encode()
+
+
+def write_blocks(file: io.BytesIO, *blocks: list[float]):
+    writer = LogBlockWriter(file, block_records=1000) # type: ignore Only write and flush are used
+    for timestamps in blocks:
+        for timestamp in timestamps:
+            writer.write(record_line(timestamp))
+        writer.write_block()
+
+
+class LogBlocksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.file = io.BytesIO()
+        write_blocks(self.file, [1.0, 2.0], [3.0], [4.0, 5.0])
+        self.block_ends = [block.end for block in iter_log_blocks(self.file, 0)]
+
+    def test_block_cut_at_end_of_file(self):
+        data = self.file.getvalue()
+        cut = io.BytesIO(data[:self.block_ends[2] - 5])
+        self.assertEqual([block.sequence for block in iter_log_blocks(cut, 0)], [0, 1])
+        last_block = find_last_valid_block(cut, 0)
+        assert last_block is not None
+        self.assertEqual(last_block.end, self.block_ends[1])
+
+    def test_corrupted_block_is_skipped(self):
+        data = bytearray(self.file.getvalue())
+        data[self.block_ends[0] + BLOCK_HEADER.size] ^= 0xFF # Payload of the second block fails CRC
+        corrupted = io.BytesIO(bytes(data))
+        blocks = list(iter_log_blocks(corrupted, 0))
+        self.assertEqual([block.sequence for block in blocks], [0, 2])
+        self.assertEqual(blocks[1].payload, record_line(4.0) + record_line(5.0))
+        last_block = find_last_valid_block(corrupted, 0)
+        assert last_block is not None
+        self.assertEqual(last_block.sequence, 2)
+
+    def test_garbage_between_blocks_is_skipped(self):
+        data = self.file.getvalue()
+        garbage = io.BytesIO(data[:self.block_ends[0]] + b'\x00' * 100 + data[self.block_ends[0]:])
+        self.assertEqual([block.sequence for block in iter_log_blocks(garbage, 0)], [0, 1, 2])
+        last_block = find_last_valid_block(garbage, 0)
+        assert last_block is not None
+        self.assertEqual(last_block.sequence, 2)
+
+
+class ParseLogValuesTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_log_values(b'1.50,25.0,None\n', FIELDS, {'timestamp', 'current'}), {
+            'timestamp': 1.5, 'current': None
+        })
+
+    def test_broken_lines_are_skipped(self):
+        self.assertIsNone(parse_log_values(b'1.50,25.0', FIELDS, set(FIELDS)))
+        self.assertIsNone(parse_log_values(b'1.50,2\x005.0,None', FIELDS, set(FIELDS)))
+        self.assertIsNone(parse_log_values(b'None,25.0,None', FIELDS, set(FIELDS)))
+
+
+class RecoverLogFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch('telemetry_logs.TELEMETRY_LOG_DIRECTORY', self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, LOG_NAME)
+
+    def write_log(self, data: bytes):
+        with open(self.path, 'wb') as log_file:
+            log_file.write(data)
+
+    def read_timestamps(self) -> list[float]:
+        return [record.timestamp for record in read_log_file(LOG_NAME)]
+
+    def test_cut_block_is_truncated(self):
+        blocks = io.BytesIO()
+        write_blocks(blocks, [1.0, 2.0], [3.0])
+        self.write_log(HEADER + blocks.getvalue()[:-3])
+        with self.assertLogs('greybike', 'WARNING'):
+            recover_log_file(LOG_NAME)
+        self.assertEqual(os.path.getsize(self.path), len(HEADER) + BLOCK_HEADER.size + len(record_line(1.0)) * 2)
+        with open(self.path, 'ab') as log_file:
+            write_blocks(log_file, [4.0]) # type: ignore
+        self.assertEqual(self.read_timestamps(), [1.0, 2.0, 4.0])
+
+    def test_valid_log_is_not_changed(self):
+        blocks = io.BytesIO()
+        write_blocks(blocks, [1.0], [2.0])
+        self.write_log(HEADER + blocks.getvalue())
+        recover_log_file(LOG_NAME)
+        self.assertEqual(os.path.getsize(self.path), len(HEADER) + len(blocks.getvalue()))
+
+    def test_header_only_log(self):
+        self.write_log(HEADER)
+        recover_log_file(LOG_NAME)
+        self.assertEqual(os.path.getsize(self.path), len(HEADER))
+        self.assertEqual(self.read_timestamps(), [])
+
+    def test_header_cut_by_power_loss(self):
+        self.write_log(HEADER[:20])
+        with self.assertLogs('greybike', 'WARNING'):
+            recover_log_file(LOG_NAME)
+        self.assertEqual(os.path.getsize(self.path), 20)
+        self.assertEqual(self.read_timestamps(), [])
+
+    def test_text_log_fallback(self):
+        # Version 1 logs have no blocks, line cut by power loss is skipped when read
+        header = LOG_HEADER_TEMPLATE.format(version=1, fields=','.join(FIELDS)).encode()
+        data = header + record_line(1.0) + record_line(2.0) + b'3.0'
+        self.write_log(data)
+        recover_log_file(LOG_NAME)
+        self.assertEqual(os.path.getsize(self.path), len(data))
+        self.assertEqual(self.read_timestamps(), [1.0, 2.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from dataclasses import dataclass
+from data_types import ElectricalRecord
+from ring_buffer import RecordRingBuffer
+
+
+@dataclass
+class FlagRecord:
+    timestamp: float
+    count: int
+    flags: str
+
+
+def electric_record(timestamp: float, temp: float | None = None) -> ElectricalRecord:
+    return ElectricalRecord(timestamp=timestamp, current=timestamp / 10, voltage=48.0, temp=temp)
+
+
+class RecordRingBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = RecordRingBuffer(ElectricalRecord, 4)
+
+    def test_wraparound(self):
+        for timestamp in range(1, 7):
+            self.buffer.append(electric_record(float(timestamp)))
+        self.assertEqual(len(self.buffer), 4)
+        self.assertEqual([record.timestamp for record in self.buffer], [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(self.buffer[0], electric_record(3.0))
+        self.assertEqual(self.buffer[-2], electric_record(5.0))
+        self.assertEqual(list(self.buffer.column('current')), [0.3, 0.4, 0.5, 0.6])
+        self.assertEqual(self.buffer.latest('timestamp'), 6.0)
+        with self.assertRaises(IndexError):
+            self.buffer[4]
+
+    def test_window_bounds(self):
+        for timestamp in [1.0, 2.0, 2.0, 3.0, 4.0, 5.0]:
+            self.buffer.append(electric_record(timestamp))
+        # Buffer keeps 2.0, 3.0, 4.0, 5.0
+        self.assertEqual(self.buffer.window(3.0, 4.0), slice(1, 3))
+        self.assertEqual(self.buffer.window(2.5, 3.5), slice(1, 2))
+        self.assertEqual(self.buffer.window(0.0), slice(0, 4))
+        self.assertEqual(self.buffer.window(end=1.0), slice(0, 0))
+        self.assertEqual(self.buffer.window(6.0, 7.0), slice(4, 4))
+        self.assertEqual(list(self.buffer.last_seconds('timestamp', 2.0)), [3.0, 4.0, 5.0])
+        self.assertEqual(list(self.buffer.last_seconds('timestamp', 0.5)), [5.0])
+
+    def test_optional_fields(self):
+        self.buffer.append(electric_record(1.0, temp=30.0))
+        self.buffer.append(electric_record(2.0))
+        self.buffer.append(electric_record(3.0))
+        self.assertEqual(self.buffer[0].temp, 30.0)
+        self.assertIsNone(self.buffer[1].temp)
+        self.assertIsNone(self.buffer.latest('temp'))
+        self.assertEqual(self.buffer.rows(slice(0, 2)), [[1.0, 0.1, 48.0, 30.0], [2.0, 0.2, 48.0, None]])
+
+    def test_object_fields(self):
+        buffer = RecordRingBuffer(FlagRecord, 2)
+        for timestamp in range(3):
+            buffer.append(FlagRecord(timestamp=float(timestamp), count=timestamp, flags=f'F{timestamp}'))
+        self.assertEqual(list(buffer), [FlagRecord(1.0, 1, 'F1'), FlagRecord(2.0, 2, 'F2')])
+        self.assertIsInstance(buffer[0].count, int)
+
+    def test_clear(self):
+        self.buffer.append(electric_record(1.0))
+        self.buffer.clear()
+        self.assertEqual(len(self.buffer), 0)
+        self.assertIsNone(self.buffer.latest('timestamp'))
+        with self.assertRaises(IndexError):
+            self.buffer[-1]
+        self.buffer.append(electric_record(2.0))
+        self.assertEqual(list(self.buffer), [electric_record(2.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DURATION = 700
+LOG_RECORD_COUNT_LIMIT = 2000 # Log is rotated every 200 simulated seconds at 10 record/s rate
+LOG_FILES = 4
+ENERGY_FIELDS = ['total_motor_watt_hours', 'total_regen_watt_hours', 'total_human_watt_hours']
+
+
+class SimulationTest(unittest.TestCase):
+    """
+        Short virtual ride with random sensors. Simulation runs in separate process,
+        because constants are read from environment on import
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log_dir = tempfile.TemporaryDirectory(prefix='greybike-test-simulation-')
+        result = subprocess.run(
+            [
+                sys.executable, os.path.join(SOURCE_DIR, 'cli.py'), 'simulate', '--duration', str(DURATION),
+                '--sample-interval', '100', '--log-dir', cls.log_dir.name, '--json'
+            ],
+            env={**os.environ, 'LOG_RECORD_COUNT_LIMIT': str(LOG_RECORD_COUNT_LIMIT)},
+            capture_output=True, text=True, timeout=300, check=True
+        )
+        cls.report = json.loads(result.stdout)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.log_dir.cleanup()
+
+    def test_logs_are_rotated(self):
+        self.assertEqual(len(self.report['log_files']), LOG_FILES)
+        self.assertEqual(self.report['samples'][-1]['log_files'], LOG_FILES)
+        for log_file in self.report['log_files']:
+            self.assertTrue(os.path.exists(os.path.join(self.log_dir.name, log_file)))
+
+    def test_trip_matches_logs(self):
+        trip = self.report['trip']
+        logged = self.report['logged']
+        self.assertGreater(trip['total_records'], 0)
+        # Last record of rotated log is counted again as first record of the next one
+        self.assertLessEqual(abs(trip['total_records'] - logged['total_records']), LOG_FILES - 1)
+        self.assertAlmostEqual(trip['total_distance'], logged['total_distance'], places=3)
+        self.assertEqual(trip['max_speed'], logged['max_speed'])
+        for name in ENERGY_FIELDS:
+            self.assertLessEqual(abs(trip[name] - logged[name]), 0.01 * abs(logged[name]) + 0.01, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from data_types import ElectricalRecord, MessageType
+from sqlite_storage import SqliteStorage
+
+FIRST_LOG = '2026-06-01T10:00:00.000000.log'
+SECOND_LOG = '2026-06-01T11:00:00.000000.log'
+
+
+def electric_record(timestamp: float) -> ElectricalRecord:
+    return ElectricalRecord(timestamp=timestamp, current=2.0, voltage=48.0)
+
+
+class SqliteStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = SqliteStorage(os.path.join(self.directory.name, 'telemetry.sqlite3'))
+
+    def tearDown(self):
+        self.storage.close()
+        self.directory.cleanup()
+
+    def write(self, *timestamps: float):
+        for timestamp in timestamps:
+            self.storage.append(MessageType.ELECTRIC, electric_record(timestamp))
+        self.storage.flush_expired(0)
+        self.storage.sync()
+
+    def test_logs_are_read_separately(self):
+        self.storage.rotate(FIRST_LOG)
+        self.write(1.0, 2.0)
+        self.storage.rotate(SECOND_LOG)
+        self.write(3.0)
+        self.assertEqual(self.storage.list_logs(), [FIRST_LOG, SECOND_LOG])
+        self.assertEqual(list(self.storage.read_log(MessageType.ELECTRIC, FIRST_LOG)), [
+            electric_record(1.0), electric_record(2.0)
+        ])
+        self.assertEqual(self.storage.find_logs(2.5, 10.0), [SECOND_LOG])
+        self.assertEqual(self.storage.get_log_revision(SECOND_LOG), 1)
+
+    def test_batches_are_kept_while_database_is_locked(self):
+        self.storage.rotate(FIRST_LOG)
+        self.write(1.0)
+        assert self.storage.connection is not None
+        self.storage.connection.execute('PRAGMA busy_timeout = 0')
+        blocker = sqlite3.connect(self.storage.path, isolation_level=None)
+        blocker.execute('BEGIN EXCLUSIVE')
+        self.write(2.0)
+        self.assertEqual(len(self.storage.batches), 1)
+        blocker.execute('ROLLBACK')
+        blocker.close()
+        self.storage.sync()
+        self.assertEqual(len(self.storage.batches), 0)
+        self.assertEqual(len(list(self.storage.read_log(MessageType.ELECTRIC, FIRST_LOG))), 2)
+
+    @mock.patch('sqlite_storage.SQLITE_RETRY_BATCH_LIMIT', 3)
+    def test_oldest_batches_are_dropped_over_limit(self):
+        assert self.storage.connection is None
+        self.storage.rotate(FIRST_LOG)
+        blocker = sqlite3.connect(self.storage.path, isolation_level=None)
+        blocker.execute('BEGIN EXCLUSIVE')
+        assert self.storage.connection is not None
+        self.storage.connection.execute('PRAGMA busy_timeout = 0')
+        with self.assertLogs('greybike', 'WARNING') as logs:
+            for timestamp in range(1, 6):
+                self.write(float(timestamp))
+        self.assertIn('oldest batches are dropped', logs.output[-1])
+        self.assertEqual(self.storage.dropped_batches, 3)
+        blocker.execute('ROLLBACK')
+        blocker.close()
+        self.storage.sync()
+        # Log row is kept, so records written later are still found by log name
+        self.assertEqual(self.storage.list_logs(), [FIRST_LOG])
+        self.assertEqual(list(self.storage.read_log(MessageType.ELECTRIC, FIRST_LOG)), [
+            electric_record(4.0), electric_record(5.0)
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import unittest
+from clock import Clock, set_clock
+from constants import DELTA_KEYFRAME_INTERVAL
+from data_types import AppState, GNSSRecord, MessageType
+from route import add_route_point, route_send_task
+from subscriptions import parse_subscription, set_subscription
+from utils import send_ws_message
+
+
+class FakeWebSocket:
+
+    def __init__(self):
+        self.messages: list[dict] = []
+
+    async def send_str(self, message: str):
+        self.messages.append(json.loads(message))
+
+
+class ManualClock(Clock):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def add_fix(state: AppState, index: int):
+    # Points turn at every fix, so simplification keeps all of them
+    add_route_point(state, GNSSRecord(
+        timestamp=1000.0 + index, latitude=44.8 + 0.01 * index, longitude=20.4 + 0.01 * (index % 2)
+    ))
+
+
+class RouteSubscriptionTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.state = AppState()
+        self.ws = FakeWebSocket()
+        self.state.websockets.append(self.ws) # type: ignore Fake has the used part of interface
+
+    async def test_route_is_sent_again_after_resubscribe(self):
+        for index in range(5):
+            add_fix(self.state, index)
+        await route_send_task(self.state)
+        await set_subscription(self.state, self.ws, parse_subscription({'streams': {'ca': {}}})) # type: ignore
+        for index in range(5, 10):
+            add_fix(self.state, index)
+        await route_send_task(self.state)
+        self.assertEqual(len(self.ws.messages), 1)
+        await set_subscription(self.state, self.ws, parse_subscription({'streams': {'route': {}}})) # type: ignore
+        self.assertEqual(len(self.ws.messages), 2)
+        route = self.ws.messages[-1]
+        self.assertEqual(route['type'], MessageType.ROUTE)
+        self.assertEqual(route['data']['start'], 0)
+        self.assertGreater(len(route['data']['points']), 5)
+        self.assertEqual(route['data']['points'], [list(point) for point in self.state.route.points])
+
+    async def test_route_is_not_sent_again_while_subscribed(self):
+        await set_subscription(self.state, self.ws, parse_subscription({'streams': {'route': {}}})) # type: ignore
+        await set_subscription(self.state, self.ws, parse_subscription({'streams': None})) # type: ignore
+        self.assertEqual(self.ws.messages, [])
+
+
+class StreamGroupTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = ManualClock()
+        set_clock(self.clock)
+        self.addCleanup(set_clock, Clock())
+        self.state = AppState()
+
+    async def add_client(self, streams: dict | None) -> FakeWebSocket:
+        ws = FakeWebSocket()
+        self.state.websockets.append(ws) # type: ignore
+        if streams is not None:
+            await set_subscription(self.state, ws, parse_subscription({'streams': streams})) # type: ignore
+        return ws
+
+    async def send(self, data: dict, seconds: float = 0.1):
+        await send_ws_message(self.state, MessageType.CA, data)
+        self.clock.now += seconds
+
+    async def test_delta_sends_changed_fields(self):
+        ws = await self.add_client({'ca': {'delta': True}})
+        await self.send({'speed': 20.0, 'current': 1.0, 'mode': 1})
+        await self.send({'speed': 20.01, 'current': 1.0, 'mode': 2})
+        await self.send({'speed': 20.04, 'current': 1.5, 'mode': 2})
+        await self.send({'speed': 20.06, 'current': 1.5, 'mode': 2})
+        self.assertEqual(ws.messages, [
+            {'type': MessageType.CA, 'data': {'speed': 20.0, 'current': 1.0, 'mode': 1}},
+            {'type': MessageType.CA, 'data': {'mode': 2}, 'delta': True},
+            {'type': MessageType.CA, 'data': {'current': 1.5}, 'delta': True},
+            # Drift is compared with the last sent value, not with the previous record
+            {'type': MessageType.CA, 'data': {'speed': 20.06}, 'delta': True},
+        ])
+
+    async def test_delta_keyframe_interval(self):
+        ws = await self.add_client({'ca': {'delta': True}})
+        await self.send({'speed': 20.0}, DELTA_KEYFRAME_INTERVAL - 1)
+        await self.send({'speed': 20.0}, 1)
+        await self.send({'speed': 20.0})
+        self.assertEqual([message.get('delta', False) for message in ws.messages], [False, True, False])
+        self.assertEqual(ws.messages[2]['data'], {'speed': 20.0})
+
+    async def test_new_client_gets_keyframe(self):
+        first = await self.add_client({'ca': {'delta': True}})
+        await self.send({'speed': 20.0, 'current': 1.0})
+        second = await self.add_client({'ca': {'delta': True}})
+        await self.send({'speed': 25.0, 'current': 1.0})
+        self.assertEqual(first.messages[-1], {'type': MessageType.CA, 'data': {'speed': 25.0}, 'delta': True})
+        self.assertEqual(second.messages, [{'type': MessageType.CA, 'data': {'speed': 25.0, 'current': 1.0}}])
+
+    async def test_rate_limit(self):
+        ws = await self.add_client({'ca': {'rate': 2}})
+        for index in range(10):
+            await self.send({'speed': float(index)}, 0.1)
+        self.assertEqual([message['data']['speed'] for message in ws.messages], [0.0, 5.0])
+
+    async def test_rate_limit_tolerates_jitter(self):
+        # Task scheduled every 0.5 seconds is not throttled to every second message when it runs a bit early
+        ws = await self.add_client({'ca': {'rate': 2}})
+        for index in range(4):
+            await self.send({'speed': float(index)}, 0.48)
+        self.assertEqual(len(ws.messages), 4)
+
+    async def test_identical_subscriptions_share_group(self):
+        first = await self.add_client({'ca': {'fields': ['speed', 'current'], 'rate': 2}})
+        second = await self.add_client({'ca': {'rate': 2, 'fields': ['current', 'speed']}})
+        other = await self.add_client({'ca': {'fields': ['speed']}})
+        await self.add_client({'gnss': {}})
+        await self.send({'speed': 20.0, 'current': 1.0, 'voltage': 48.0})
+        self.assertEqual(len(self.state.stream_groups), 2)
+        self.assertEqual(first.messages, [{'type': MessageType.CA, 'data': {'current': 1.0, 'speed': 20.0}}])
+        self.assertEqual(second.messages, first.messages)
+        self.assertEqual(other.messages, [{'type': MessageType.CA, 'data': {'speed': 20.0}}])
+
+    async def test_unused_groups_are_removed(self):
+        ws = await self.add_client({'ca': {'rate': 2}})
+        await self.send({'speed': 20.0})
+        await set_subscription(self.state, ws, parse_subscription({'streams': {'ca': {}}})) # type: ignore
+        await self.send({'speed': 20.0})
+        self.assertEqual([key[1].interval for key in self.state.stream_groups], [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
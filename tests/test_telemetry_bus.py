@@ -0,0 +1,54 @@
+import unittest
+from data_types import ElectricalRecord, GNSSRecord, MessageType
+from telemetry_bus import SLOT_PAYLOAD_OFFSET, COUNTER, TelemetryBus
+
+SLOTS = 8
+
+
+def electric_record(index: int) -> ElectricalRecord:
+    return ElectricalRecord(timestamp=1000.0 + index, current=float(index), voltage=48.0)
+
+
+class TelemetryBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = TelemetryBus(SLOTS, 256)
+
+    def tearDown(self):
+        self.bus.close()
+
+    def test_records_are_read_in_publish_order(self):
+        gnss = GNSSRecord(timestamp=1000.5, latitude=44.8, longitude=20.4, sat_num=9)
+        self.bus.publish(MessageType.ELECTRIC, electric_record(0))
+        self.bus.publish(MessageType.GNSS, gnss)
+        self.assertEqual(self.bus.read(), [(MessageType.ELECTRIC, electric_record(0)), (MessageType.GNSS, gnss)])
+        self.assertEqual(self.bus.read(), [])
+        self.assertEqual(self.bus.dropped, 0)
+
+    def test_writer_lapping_slow_reader_drops_oldest_records(self):
+        for index in range(SLOTS + 5):
+            self.bus.publish(MessageType.ELECTRIC, electric_record(index))
+        records = self.bus.read()
+        self.assertEqual([record for _, record in records], [electric_record(index) for index in range(5, SLOTS + 5)])
+        self.assertEqual(self.bus.dropped, 5)
+
+    def test_slot_rewritten_during_read_is_dropped(self):
+        self.bus.publish(MessageType.ELECTRIC, electric_record(0))
+        self.bus.publish(MessageType.ELECTRIC, electric_record(1))
+        # Writer of the next lap has started to rewrite the first slot
+        COUNTER.pack_into(self.bus.memory.buf, self.bus._slot_offset(0), 2 * SLOTS + 1)
+        self.assertEqual(self.bus.read(), [(MessageType.ELECTRIC, electric_record(1))])
+        self.assertEqual(self.bus.dropped, 1)
+
+    def test_torn_payload_is_dropped(self):
+        self.bus.publish(MessageType.ELECTRIC, electric_record(0))
+        self.bus.publish(MessageType.ELECTRIC, electric_record(1))
+        # Final sequence is visible, but part of payload is still from the previous write
+        payload_offset = self.bus._slot_offset(0) + SLOT_PAYLOAD_OFFSET
+        self.bus.memory.buf[payload_offset + 8] ^= 0xFF
+        self.assertEqual(self.bus.read(), [(MessageType.ELECTRIC, electric_record(1))])
+        self.assertEqual(self.bus.dropped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from typing import Any, Iterator
+import logging
+import os
+from constants import TELEMETRY_LOG_DIRECTORY
+from data_types import AggregatedLogData, BaseRecord, MessageType
+from log_blocks import LogBlockWriter
+from log_query import (
+    calculate_range_agregates, find_logs_in_range, get_all_log_files, read_logs_in_range, select_range
+)
+from rollup_query import ensure_rollups, read_rollup_file
+from rollups import ROLLUP_CHANNELS, RollupPyramid, get_channel_values
+from storage import TelemetryStorage
+from telemetry_logs import (
+    ELECTRIC_LOG_FIELDS, GNSS_LOG_FIELDS, encode_ca_log_line, encode_electric_log_line, encode_gnss_log_line,
+    get_electric_log_name, get_gnss_log_name, get_log_fields, open_log_writer, open_rollups,
+    read_electric_log_file, read_gnss_log_file, read_log_file, recover_log_file, remove_rollups
+)
+
+
+class TextLogStorage(TelemetryStorage):
+    """
+        Block framed text logs. Every log has companion files of GNSS and electric streams and rollups.
+        System records are not logged
+    """
+    name = 'text'
+
+    def __init__(self):
+        self.writers: dict[MessageType, LogBlockWriter] = {}
+        self.rollups: dict[MessageType, RollupPyramid] = {}
+
+    def rotate(self, log_name: str):
+        logger = logging.getLogger('greybike')
+        self.close()
+        logger.info('Logging telemetry to %s', os.path.join(TELEMETRY_LOG_DIRECTORY, log_name))
+        self.writers = {
+            MessageType.CA: open_log_writer(log_name, get_log_fields()),
+            MessageType.GNSS: open_log_writer(get_gnss_log_name(log_name), GNSS_LOG_FIELDS),
+            MessageType.ELECTRIC: open_log_writer(get_electric_log_name(log_name), ELECTRIC_LOG_FIELDS),
+        }
+        self.rollups = {message_type: open_rollups(log_name, message_type) for message_type in ROLLUP_CHANNELS}
+
+    def append(self, message_type: MessageType, record: BaseRecord):
+        if message_type == MessageType.SYSTEM:
+            return
+        writer = self.writers.get(message_type)
+        if writer is None:
+            raise ValueError(f'{message_type} log file not open')
+        if message_type == MessageType.CA:
+            writer.write(encode_ca_log_line(record)) # type: ignore
+        elif message_type == MessageType.GNSS:
+            writer.write(encode_gnss_log_line(record)) # type: ignore
+        else:
+            writer.write(encode_electric_log_line(record)) # type: ignore
+        rollups = self.rollups.get(message_type)
+        if rollups is not None:
+            rollups.add(record.timestamp, get_channel_values(message_type, record))
+
+    def flush_expired(self, max_age: float) -> bool:
+        for rollups in self.rollups.values():
+            rollups.flush_expired(max_age) # Rollups can be rebuilt from log, so they are not synced
+        for writer in self.writers.values():
+            writer.flush_expired(max_age)
+        return any(writer.unsynced for writer in self.writers.values())
+
+    def sync(self):
+        logger = logging.getLogger('greybike')
+        for writer in list(self.writers.values()):
+            if not writer.unsynced:
+                continue
+            try:
+                writer.sync()
+            except (OSError, ValueError) as e:
+                logger.warning('Log fsync failed: %s', e) # File can be closed by log rotation
+
+    def close(self):
+        logger = logging.getLogger('greybike')
+        log_writer = self.writers.get(MessageType.CA)
+        if log_writer is not None:
+            logger.info('Closing log file %s', log_writer.name)
+        for writer in self.writers.values():
+            writer.close()
+        for rollups in self.rollups.values():
+            rollups.close()
+        self.writers = {}
+        self.rollups = {}
+
+    def recover(self, log_name: str):
+        recover_log_file(log_name)
+        recover_log_file(get_gnss_log_name(log_name))
+        recover_log_file(get_electric_log_name(log_name))
+        remove_rollups(log_name)
+
+    def scan(self, message_type: MessageType, start: float, end: float) -> Iterator[Any]:
+        if message_type == MessageType.CA:
+            yield from read_logs_in_range(start, end)
+            return
+        for log_name in find_logs_in_range(start, end):
+            yield from select_range(self.read_log(message_type, log_name), start, end)
+
+    def aggregate(self, start: float, end: float) -> AggregatedLogData:
+        return calculate_range_agregates(start, end)
+
+    def list_logs(self) -> list[str]:
+        return get_all_log_files()
+
+    def find_logs(self, start: float, end: float) -> list[str]:
+        return find_logs_in_range(start, end)
+
+    def read_log(self, message_type: MessageType, log_name: str) -> Iterator[Any]:
+        if message_type == MessageType.CA:
+            return read_log_file(log_name)
+        if message_type == MessageType.GNSS:
+            return read_gnss_log_file(log_name)
+        if message_type == MessageType.ELECTRIC:
+            return read_electric_log_file(log_name)
+        return iter(())
+
+    def read_rollups(self, message_type: MessageType, log_name: str, level: int) -> Iterator[dict[str, float | None]]:
+        ensure_rollups(log_name)
+        return read_rollup_file(log_name, message_type, level)
+
+    def get_log_revision(self, log_name: str) -> float:
+        """
+            Latest modification time of log and its GNSS and electric companions
+        """
+        file_paths = [
+            os.path.join(TELEMETRY_LOG_DIRECTORY, file_name)
+            for file_name in (log_name, get_gnss_log_name(log_name), get_electric_log_name(log_name))
+        ]
+        mtimes = [os.path.getmtime(file_path) for file_path in file_paths if os.path.exists(file_path)]
+        return max(mtimes, default=0.0)
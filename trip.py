@@ -0,0 +1,49 @@
+from dataclasses import asdict
+import json
+import logging
+import os
+from constants import TRIP_CHECKPOINT_FILE, RIDE_GAP
+from data_types import AppState, AggregatedLogData
+from utils import write_json_atomic
+
+
+def load_trip_checkpoint() -> AggregatedLogData:
+    """
+        Restores trip aggregates after restart or power loss
+    """
+    logger = logging.getLogger('greybike')
+    if not os.path.exists(TRIP_CHECKPOINT_FILE):
+        return AggregatedLogData()
+    try:
+        with open(TRIP_CHECKPOINT_FILE) as checkpoint_file:
+            trip = AggregatedLogData(**json.load(checkpoint_file))
+    except (ValueError, TypeError) as e:
+        logger.error('Could not read trip checkpoint: %s', e)
+        return AggregatedLogData()
+    logger.info('Trip restored from checkpoint. %d records', trip.total_records)
+    return trip
+
+
+def write_trip_checkpoint(trip: AggregatedLogData):
+    write_json_atomic(TRIP_CHECKPOINT_FILE, asdict(trip))
+
+
+def reset_trip(state: AppState):
+    logger = logging.getLogger('greybike')
+    logger.info('Starting new trip')
+    state.trip = AggregatedLogData()
+    write_trip_checkpoint(state.trip)
+    state.trip_checkpoint_records = 0
+
+
+def is_new_ride(trip: AggregatedLogData, timestamp: float) -> bool:
+    """
+        Pause of RIDE_GAP since the last trip record starts new trip, like rides are grouped in stats
+    """
+    return trip.last_timestamp is not None and timestamp - trip.last_timestamp >= RIDE_GAP
+
+
+async def trip_checkpoint_task(state: AppState):
+    if state.trip.total_records != state.trip_checkpoint_records:
+        write_trip_checkpoint(state.trip)
+        state.trip_checkpoint_records = state.trip.total_records
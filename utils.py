@@ -1,26 +1,39 @@
 from typing import TypeVar, Any
-from datetime import datetime
-from collections import deque
 import asyncio
 import os
 import random
 import json
 import logging
-from data_types import BaseRecord, AppState, MessageType
+from clock import get_monotonic
+from data_types import BaseRecord, AppState, MessageType, StreamSubscription, get_current_timestamp
+from ring_buffer import RecordRingBuffer
+from subscriptions import get_stream_group, get_stream_subscription, remove_unused_groups
 
 
 async def send_ws_message(state: AppState, message_type: MessageType, data: dict[str, Any]):
+    """
+        Sends message to clients subscribed to its type.
+        Clients with identical stream subscriptions share one encoded message
+    """
     logger = logging.getLogger('greybike')
-    message = {
-        'type': message_type,
-        'data': data
-    }
-    message_str = json.dumps(message)
+    now = get_monotonic()
+    prepared: set[StreamSubscription] = set()
     for ws in state.websockets:
+        subscription = get_stream_subscription(state, ws, message_type)
+        if subscription is None:
+            continue
+        group = get_stream_group(state, message_type, subscription)
+        if subscription not in prepared:
+            prepared.add(subscription)
+            group.prepare(data, now)
+        message_str = group.get_message(ws)
+        if message_str is None:
+            continue
         try:
             await ws.send_str(message_str)
         except ConnectionResetError as e:
-            logger.error(f'Error sending websocket message: {e}')
+            logger.error('Error sending websocket message: %s', e)
+    remove_unused_groups(state, message_type, prepared)
 
 
 
@@ -45,12 +58,33 @@ def get_random_value(from_: float, to_: float, step:float, previous: float | Non
 
 RecordType = TypeVar('RecordType', bound=BaseRecord)
 
-def get_last_record(records: deque[RecordType], interval: float | None = None) -> RecordType | None:
+def get_last_record(records: RecordRingBuffer[RecordType], interval: float | None = None) -> RecordType | None:
     if len(records) > 0:
         last_record = records[-1]
-        if interval is None or last_record.timestamp > datetime.now().timestamp() - interval * 2:
+        if interval is None or last_record.timestamp > get_current_timestamp() - interval * 2:
             return last_record
 
+def split_power(voltage: float, current: float) -> tuple[float, float]:
+    """
+        Returns motor and regen power in watts. Negative current means regenerative braking
+    """
+    watts = voltage * current
+    if current < 0:
+        return 0, -watts
+    return watts, 0
+
+def write_json_atomic(file_path: str, data: Any):
+    """
+        Data is written to temporary file and renamed,
+        so power loss leaves either old or new file on disk
+    """
+    tmp_file_path = f'{file_path}.tmp'
+    with open(tmp_file_path, 'w') as json_file:
+        json.dump(data, json_file)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+    os.replace(tmp_file_path, file_path)
+
 async def async_shell(command: str) -> int | None:
     process = await asyncio.create_subprocess_shell(
         command,
@@ -19,6 +19,6 @@ async def ping_router(state: AppState):
     command = f'ping -c 1 -W{PING_TIMEOUT} {ROUTER_HOSTNAME}'
     ping_result = await async_shell(command)
     if ping_result != 0:
-        logger.warning(f'{ROUTER_HOSTNAME} ping failed. Return code: {ping_result}')
+        logger.warning('%s ping failed. Return code: %s', ROUTER_HOSTNAME, ping_result)
         await restart_wifi()
 